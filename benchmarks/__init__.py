@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+""" Performance benchmarks of oculoenv.
+
+  $ python -m benchmarks --widths 64 128 256 --output result.json
+"""
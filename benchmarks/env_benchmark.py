@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+""" Environment throughput benchmark.
+
+Measures for each content and observation size:
+
+  steps_per_sec      Environment.step() throughput with random actions
+  reset_ms           Latency of Environment.reset()
+  content_render_ms  Content pass (BaseContent.render())
+  scene_render_ms    Scene pass (Environment._render_scene())
+  readback_ms        glReadPixels of the observation
+  rss_mb             Resident memory of the process after the run
+
+Each configuration is run with and without the content re-render in step(), to
+separate the content pass from the rest of the step cost. Results are written as JSON
+for regression tracking.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+import numpy as np
+import pyglet
+from pyglet.gl import glFinish, glGetString, GL_RENDERER, GL_VERSION
+from ctypes import cast, c_char_p
+
+from oculoenv import Environment
+from oculoenv.contents import CONTENT_CLASSES
+
+DEFAULT_WIDTHS = [64, 128, 256]
+
+# Max delta angle (radian) of random actions
+MAX_DELTA = 0.05
+
+
+def get_rss_bytes():
+    """ Returns current resident memory size of the process. (None if unavailable) """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        pass
+
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, and in kilobytes on Linux.
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+    except ImportError:
+        return None
+
+
+def summarize(times):
+    """ Returns mean, median and 95 percentile of the durations in milliseconds. """
+    times_ms = np.array(times) * 1000.0
+    return {
+        'mean': float(np.mean(times_ms)),
+        'p50': float(np.percentile(times_ms, 50)),
+        'p95': float(np.percentile(times_ms, 95)),
+    }
+
+
+def _get_gl_string(name):
+    value = glGetString(name)
+    if not value:
+        return None
+    return cast(value, c_char_p).value.decode('utf-8', 'replace')
+
+
+def get_system_info():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pyglet': pyglet.version,
+        'platform': platform.platform(),
+        'gl_renderer': _get_gl_string(GL_RENDERER),
+        'gl_version': _get_gl_string(GL_VERSION),
+    }
+
+
+def _no_render():
+    pass
+
+
+def measure_steps(env, steps, rng):
+    """ Returns steps per second of Environment.step() with random actions. """
+    actions = rng.uniform(low=-MAX_DELTA, high=MAX_DELTA, size=(steps, 2))
+
+    start = timeit.default_timer()
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    glFinish()
+    elapsed = timeit.default_timer() - start
+    return steps / elapsed
+
+
+def measure_resets(env, resets):
+    times = []
+    for _ in range(resets):
+        start = timeit.default_timer()
+        env.reset()
+        glFinish()
+        times.append(timeit.default_timer() - start)
+    return summarize(times)
+
+
+def measure_passes(env, repeats):
+    """ Returns durations of the content pass, scene pass and readback. """
+    frame_buffer = env.frame_buffer_off
+    content_times = []
+    scene_times = []
+    readback_times = []
+
+    for _ in range(repeats):
+        glFinish()
+        start = timeit.default_timer()
+        env.content.render()
+        glFinish()
+        content_times.append(timeit.default_timer() - start)
+
+        start = timeit.default_timer()
+        env._render_scene(frame_buffer)
+        glFinish()
+        scene_times.append(timeit.default_timer() - start)
+
+        start = timeit.default_timer()
+        frame_buffer.read()
+        readback_times.append(timeit.default_timer() - start)
+
+    return summarize(content_times), summarize(scene_times), summarize(readback_times)
+
+
+def run_config(env, content_render, steps, resets, warmup, seed):
+    """ Run one benchmark configuration.
+
+    Arguments:
+      env:            Environment object.
+      content_render: Bool, whether step() re-renders the content when needed.
+      steps:          Integer, number of measured steps.
+      resets:         Integer, number of measured resets.
+      warmup:         Integer, number of steps before the measurement.
+      seed:           Integer, seed of the content and the actions.
+    Returns:
+      Dictionary of the results.
+    """
+    content = env.content
+    if not content_render:
+        # Shadow the method with an instance attribute
+        render = content.__dict__.get('render')
+        content.render = _no_render
+
+    try:
+        env.seed(seed)
+        env.reset()
+        rng = np.random.RandomState(seed)
+        measure_steps(env, warmup, rng)
+
+        steps_per_sec = measure_steps(env, steps, rng)
+        reset_ms = measure_resets(env, resets)
+    finally:
+        if not content_render:
+            if render is None:
+                del content.render
+            else:
+                content.render = render
+
+    content_render_ms, scene_render_ms, readback_ms = measure_passes(env, resets)
+
+    rss = get_rss_bytes()
+    return {
+        'content': type(content).__name__,
+        'off_buffer_width': env.frame_buffer_off.width,
+        'content_render': content_render,
+        'steps': steps,
+        'steps_per_sec': steps_per_sec,
+        'reset_ms': reset_ms,
+        'content_render_ms': content_render_ms,
+        'scene_render_ms': scene_render_ms,
+        'readback_ms': readback_ms,
+        'rss_mb': rss / (1024.0 * 1024.0) if rss is not None else None,
+    }
+
+
+def run(content_indices=None, widths=DEFAULT_WIDTHS, steps=1000, resets=50, warmup=100,
+        seed=0, verbose=True):
+    """ Run the benchmark for the contents and observation sizes.
+
+    Arguments:
+      content_indices: List of integers, indices in CONTENT_CLASSES. (None for all)
+      widths:          List of integers, observation sizes (off_buffer_width).
+    Returns:
+      Dictionary with 'system' info and list of 'results'.
+    """
+    if content_indices is None:
+        content_indices = range(len(CONTENT_CLASSES))
+
+    results = []
+    system_info = None
+
+    for content_index in content_indices:
+        for width in widths:
+            rss_before = get_rss_bytes()
+            # Each environment has its own content, since the environment binds the
+            # profiler and the other instance attributes to the content.
+            content = CONTENT_CLASSES[content_index]()
+            env = Environment(content, off_buffer_width=width)
+            rss_after = get_rss_bytes()
+
+            if system_info is None:
+                system_info = get_system_info()
+
+            for content_render in [True, False]:
+                result = run_config(env, content_render, steps, resets, warmup, seed)
+                if rss_before is not None and rss_after is not None:
+                    result['env_init_mb'] = (rss_after - rss_before) / (1024.0 * 1024.0)
+                results.append(result)
+
+                if verbose:
+                    print("{:40s} width={:4d} content_render={:d}: {:8.1f} steps/s".format(
+                        result['content'], width, content_render,
+                        result['steps_per_sec']), file=sys.stderr)
+
+    return {
+        'system': system_info,
+        'config': {
+            'steps': steps,
+            'resets': resets,
+            'warmup': warmup,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark oculoenv environments.")
+    parser.add_argument("--contents", help="Content numbers (1-6) to run (default: all)",
+                        type=int, nargs='+', default=None)
+    parser.add_argument("--widths", help="Observation sizes",
+                        type=int, nargs='+', default=DEFAULT_WIDTHS)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--resets", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file path (default: stdout)",
+                        type=str, default=None)
+
+    args = parser.parse_args()
+
+    content_indices = None
+    if args.contents is not None:
+        for content in args.contents:
+            if content < 1 or content > len(CONTENT_CLASSES):
+                parser.error("Unknown content: {}".format(content))
+        content_indices = [content - 1 for content in args.contents]
+
+    result = run(content_indices, args.widths, steps=args.steps, resets=args.resets,
+                 warmup=args.warmup, seed=args.seed)
+
+    if args.output is None:
+        json.dump(result, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
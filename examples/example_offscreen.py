@@ -4,25 +4,16 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-from skimage import io
-from oculoenv import PointToTargetContent, Environment
-
-def save_numpy_img(file_name, img):
-    img = np.ascontiguousarray(img)
-    io.imsave(file_name, img)
-
-lastImgNo = 0
-
-def save_img(img):
-    global lastImgNo
-    save_numpy_img('out_%03d.png' % lastImgNo, img)
-    lastImgNo += 1
+from oculoenv import PointToTargetContent, Environment, FrameRecorder
 
 
 def check_offscreen():
     content = PointToTargetContent()
     env = Environment(content)
 
+    # Frames are written as out/frame_########.png on a background thread.
+    recorder = FrameRecorder('out', chunk_size=16, image_format='png')
+
     frame_size = 10
 
     for i in range(frame_size):
@@ -33,11 +24,13 @@ def check_offscreen():
 
         image = obs['screen']
 
-        save_img(image)
+        recorder.add(image)
 
         if done:
             print("Episode terminated")
             obs = env.reset()
 
+    recorder.close()
+
 
 check_offscreen()
@@ -5,3 +5,6 @@ from oculoenv.contents.odd_one_out_content import OddOneOutContent
 from oculoenv.contents.visual_search_content import VisualSearchContent
 from oculoenv.contents.multiple_object_tracking_content import MultipleObjectTrackingContent
 from oculoenv.contents.random_dot_content import RandomDotMotionDiscriminationContent
+from oculoenv.trial_bank import TrialBank
+from oculoenv.recorder import EpisodeRecorder, EpisodeReplayer, FrameRecorder
+from oculoenv.dataset import ShardDataset
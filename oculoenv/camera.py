@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+""" Batched camera geometry for many environments.
+
+Same geometry as Camera and Environment.get_local_focus_pos(), computed for N cameras
+at once with closed forms instead of Matrix4 objects.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from .constants import CAMERA_INITIAL_ANGLE_V, CAMERA_HORIZONTAL_ANGLE_MAX, \
+  CAMERA_VERTICAL_ANGLE_MAX, PLANE_DISTANCE
+from .geom import rot_yx_matrices
+
+
+class CameraBatch(object):
+    """ N cameras with (horizontal, vertical) angles.
+
+    Arguments:
+      count: Integer, number of cameras.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        # (horizontal, vertical) angles (radian)
+        self.angles = np.zeros((count, 2))
+        self.reset()
+
+    def reset(self, indices=None):
+        """ Reset the angles of the cameras. (All the cameras when indices is None) """
+        if indices is None:
+            indices = slice(None)
+        self.angles[indices, 0] = 0.0
+        self.angles[indices, 1] = CAMERA_INITIAL_ANGLE_V
+
+    def set_angles(self, angles):
+        """ Set absolute camera angles (N, 2) (radian). """
+        self.angles[:] = angles
+
+    def change_angles(self, d_angles):
+        """ Add delta angles (N, 2) (radian), and clamp the angles like Camera. """
+        self.angles += d_angles
+        np.clip(self.angles[:, 0], -CAMERA_HORIZONTAL_ANGLE_MAX, CAMERA_HORIZONTAL_ANGLE_MAX,
+                out=self.angles[:, 0])
+        np.clip(self.angles[:, 1], -CAMERA_VERTICAL_ANGLE_MAX, CAMERA_VERTICAL_ANGLE_MAX,
+                out=self.angles[:, 1])
+
+    def get_rotation_mats(self):
+        """ Returns rotation matrices (N, 3, 3) of the cameras. (Same as Camera.m) """
+        return rot_yx_matrices(self.angles[:, 0], self.angles[:, 1])
+
+    def get_view_mats(self):
+        """ Returns view matrices (N, 4, 4). (Same as Camera.get_inv_mat())
+
+        The camera matrix is a pure rotation, so the inverse is its transpose.
+        """
+        view_mats = np.zeros((self.count, 4, 4))
+        view_mats[:, :3, :3] = np.transpose(self.get_rotation_mats(), (0, 2, 1))
+        view_mats[:, 3, 3] = 1.0
+        return view_mats
+
+    def get_forward_vecs(self):
+        """ Returns forward vectors (N, 3), which are minus z-axis of the rotations. """
+        sin_h = np.sin(self.angles[:, 0])
+        cos_h = np.cos(self.angles[:, 0])
+        sin_v = np.sin(self.angles[:, 1])
+        cos_v = np.cos(self.angles[:, 1])
+        return np.stack([-sin_h * cos_v, sin_v, -cos_h * cos_v], axis=1)
+
+    def get_local_focus_pos(self):
+        """ Returns local coordinates (N, 2) of the view focus points on the content panel.
+        (Same as Environment.get_local_focus_pos())
+        """
+        forward_vecs = self.get_forward_vecs()
+        scale = PLANE_DISTANCE / -forward_vecs[:, 2]
+        return forward_vecs[:, :2] * scale[:, np.newaxis]
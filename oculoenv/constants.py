@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+""" Geometry constants of the environment scene.
+
+Kept free of OpenGL and gym imports, so that the CPU side geometry can use them.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from .utils import deg2rad
+
+# Camera vertical field of view angle (degree)
+CAMERA_FOV_Y = 50
+
+# Initial vertical angle of camera (radian)
+CAMERA_INITIAL_ANGLE_V = deg2rad(10.0)
+
+# Max vertical angle of camera (radian)
+CAMERA_VERTICAL_ANGLE_MAX = deg2rad(45.0)
+
+# Max horizontal angle of camera (radian)
+CAMERA_HORIZONTAL_ANGLE_MAX = deg2rad(45.0)
+
+PLANE_DISTANCE = 3.0  # Distance to content plane
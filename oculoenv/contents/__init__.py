@@ -1 +1,24 @@
+from oculoenv.contents.point_to_target_content import PointToTargetContent
+from oculoenv.contents.change_detection_content import ChangeDetectionContent
+from oculoenv.contents.odd_one_out_content import OddOneOutContent
+from oculoenv.contents.visual_search_content import VisualSearchContent
+from oculoenv.contents.multiple_object_tracking_content import MultipleObjectTrackingContent
+from oculoenv.contents.random_dot_content import RandomDotMotionDiscriminationContent
 
+# All the task contents in the order of the task numbers
+CONTENT_CLASSES = [
+    PointToTargetContent,
+    ChangeDetectionContent,
+    OddOneOutContent,
+    VisualSearchContent,
+    MultipleObjectTrackingContent,
+    RandomDotMotionDiscriminationContent
+]
+
+
+def get_content_class(name):
+    """ Get content class from its class name. """
+    for content_class in CONTENT_CLASSES:
+        if content_class.__name__ == name:
+            return content_class
+    raise ValueError("Unknown content: {}".format(name))
@@ -9,13 +9,25 @@ import pyglet
 from pyglet.gl import *
 from ctypes import POINTER
 
-from ..graphics import MultiSampleFrameBuffer, FrameBuffer, load_texture
+from ..graphics import MultiSampleFrameBuffer, FrameBuffer, FrameBufferCache, \
+  SharedFrameStore, load_texture
+from ..graphics import create_renderer, ortho_matrix, RENDERER_FIXED
 from ..geom import Matrix4
-from ..graphics import load_texture
 from ..utils import get_file_path
+from ..profiler import STAGE_GPU_CONTENT_RENDER
 
 WHITE_COLOR = np.array([1.0, 1.0, 1.0])
 
+# Projection matrix of the content panel
+PROJECTION_MAT = ortho_matrix(-1.0, 1.0, -1.0, 1.0, -10, 10)
+
+# Keys of the frames which are same in all the instances of a content class
+SHARED_FRAME_START = 'start'
+SHARED_FRAME_BLANK = 'blank'
+
+# Frames shared by all the contents in the process
+_shared_frames = SharedFrameStore()
+
 
 class ContentSprite(object):
     """ A sprite object class that is located in the content panel.
@@ -44,16 +56,9 @@ class ContentSprite(object):
         self.rot_index = rot_index
         self.color = color
 
-    def render(self, common_quad_vlist):
-        glColor3f(*self.color)
-
-        glPushMatrix()
-        glTranslatef(self.pos_x, self.pos_y, 0.0)
-        glScalef(self.width, self.width, self.width)
-        glRotatef(self.rot_index * 90.0, 0.0, 0.0, 1.0)
-        glBindTexture(self.tex.target, self.tex.id)
-        common_quad_vlist.draw(GL_QUADS)
-        glPopMatrix()
+    def render(self, renderer):
+        renderer.draw_sprite(self.tex, self.pos_x, self.pos_y, 0.0, self.width,
+                             self.rot_index, self.color)
 
     def set_pos(self, pos):
         self.pos_x = pos[0]
@@ -79,34 +84,208 @@ class ContentSprite(object):
           (py >= self.pos_y - self.width) and \
           (py <= self.pos_y + self.width)
 
+    def get_rect(self):
+        """ Returns (min_x, min_y, max_x, max_y) of the rect tested by contains(). """
+        return (self.pos_x - self.width, self.pos_y - self.width,
+                self.pos_x + self.width, self.pos_y + self.width)
+
+
+class SpriteRects(object):
+    """ Rects of sprites for vectorized hit-testing.
+
+    Same result as testing contains() of each sprite in order, but with one NumPy
+    test over all the sprites. NumPy overhead makes it slower than a contains() loop
+    for a single position over a few sprites (below about 50), so it is meant for
+    hit_test_batch() with many positions. Rects are taken when created, so it should
+    be created again when the sprites move.
+
+    Arguments:
+      sprites: List of sprites with get_rect().
+    """
+
+    def __init__(self, sprites):
+        rects = np.array([sprite.get_rect() for sprite in sprites],
+                         dtype=np.float64).reshape(-1, 4)
+        self.mins = rects[:, :2]
+        self.maxs = rects[:, 2:]
+
+    def __len__(self):
+        return len(self.mins)
+
+    def hit_test(self, pos):
+        """ Returns index of the first sprite containing the position. (-1 if none)
+
+        Arguments:
+          pos:  Float Array, [X,Y] position
+        """
+        pos = np.asarray(pos, dtype=np.float64)
+        inside = np.all((self.mins <= pos) & (pos <= self.maxs), axis=1)
+        if not inside.any():
+            return -1
+        return int(np.argmax(inside))
+
+    def hit_test_batch(self, positions):
+        """ Batched hit_test() for many positions.
+
+        Arguments:
+          positions: Float array (N, 2), [X,Y] positions.
+        Returns:
+          Integer array (N,), index of the first sprite containing each position.
+          (-1 if none)
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 1, 2)
+        # (N, sprites)
+        inside = np.all((self.mins <= positions) & (positions <= self.maxs), axis=2)
+        if inside.shape[1] == 0:
+            return np.full(len(positions), -1, dtype=np.int64)
+        indices = np.argmax(inside, axis=1)
+        return np.where(inside[np.arange(len(indices)), indices], indices, -1)
+
+
+class SpriteGrid(object):
+    """ Uniform grid index of sprites placed on the cells of a regular grid.
+
+    The cell containing a position is found with arithmetic in O(1), and the position
+    is tested only against the rect of the sprite registered on that cell. The rect of
+    each sprite should be inside its cell.
+
+    Arguments:
+      division: Integer, number of cells in each axis.
+      extent:   Float, half size of the grid area centered at the origin.
+    """
+
+    def __init__(self, division, extent=1.0):
+        self.division = division
+        self.extent = extent
+        self.cell_scale = division / (2.0 * extent)
+        self.sprites = []
+        self.rects = []
+        # Index of the sprite registered on each cell, row by row. (-1 if empty)
+        self.cells = [-1] * (division * division)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def register(self, sprite, x_index, y_index):
+        """ Register a sprite with get_rect() on a cell.
+
+        Arguments:
+          sprite:  Sprite object.
+          x_index: Integer, column of the cell from the left.
+          y_index: Integer, row of the cell from the bottom.
+        Returns:
+          Integer, index of the sprite in the grid.
+        """
+        index = len(self.sprites)
+        self.sprites.append(sprite)
+        self.rects.append(sprite.get_rect())
+        self.cells[y_index * self.division + x_index] = index
+        return index
+
+    def get_cell(self, pos):
+        """ Returns index of the cell containing the position. (-1 if outside the grid)
+
+        Arguments:
+          pos:  Float Array, [X,Y] position
+        """
+        division = self.division
+        x = (pos[0] + self.extent) * self.cell_scale
+        y = (pos[1] + self.extent) * self.cell_scale
+        if not (0.0 <= x <= division and 0.0 <= y <= division):
+            return -1
+        return min(int(y), division - 1) * division + min(int(x), division - 1)
+
+    def hit_test(self, pos):
+        """ Returns index of the sprite containing the position. (-1 if none)
+
+        Arguments:
+          pos:  Float Array, [X,Y] position
+        """
+        cell = self.get_cell(pos)
+        if cell < 0:
+            return -1
+        index = self.cells[cell]
+        if index < 0:
+            return -1
+        min_x, min_y, max_x, max_y = self.rects[index]
+        if min_x <= pos[0] <= max_x and min_y <= pos[1] <= max_y:
+            return index
+        return -1
+
+    def get_sprite(self, pos):
+        """ Returns the sprite containing the position. (None if none) """
+        index = self.hit_test(pos)
+        if index < 0:
+            return None
+        return self.sprites[index]
+
+    def hit_test_batch(self, positions):
+        """ Batched hit_test() for many positions.
+
+        Arguments:
+          positions: Float array (N, 2), [X,Y] positions.
+        Returns:
+          Integer array (N,), index of the sprite containing each position. (-1 if none)
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        division = self.division
+        grid_pos = (positions + self.extent) * self.cell_scale
+        inside_grid = np.all((grid_pos >= 0.0) & (grid_pos <= division), axis=1)
+        cell_pos = np.clip(grid_pos, 0, division - 1).astype(np.int64)
+
+        cells = np.array(self.cells, dtype=np.int64)
+        indices = np.where(inside_grid, cells[cell_pos[:, 1] * division + cell_pos[:, 0]],
+                           -1)
+        if len(self.rects) == 0:
+            return indices
+
+        rects = np.array(self.rects, dtype=np.float64)[np.maximum(indices, 0)]
+        inside = np.all((rects[:, :2] <= positions) & (positions <= rects[:, 2:]), axis=1)
+        return np.where(inside, indices, -1)
+
 
 class BaseContent(object):
+    # Numpy dtype of a trial record. (None if the content doesn't support trial bank)
+    trial_dtype = None
+    # Value of self.phase while the start frame, which is the same in all the instances,
+    # is shown. (None if the content has no such phase)
+    shared_start_phase = None
+
     def __init__(self, bg_color=[1.0, 1.0, 1.0, 1.0], width=512, height=512):
         self.bg_color = np.array(bg_color)
+        self.trial_bank = None
+        # Random state owned by this content, which all randomization is drawn from.
+        self.rng = np.random.RandomState()
         self.width = width
         self.height = height
+        # TimerQueryRing to measure GPU time of the content pass (None if disabled)
+        self.gpu_timer = None
+        # Content image read back from the frame buffer (None until requested)
+        self.image = None
+        self.image_array = np.zeros((height, width, 4), dtype=np.uint8)
+        # Regions (min_x, min_y, max_x, max_y) to redraw in the next render(). The whole
+        # content is redrawn when empty or when dirty_all is set.
+        self.dirty_rects = []
+        self.dirty_all = False
+        # FrameBufferCache of the rendered frames keyed by _get_frame_key() (None if disabled)
+        self.frame_cache = None
+        # SpriteGrid of the sprites placed on a grid (None if the content has no grid)
+        self.sprite_grid = None
+        # SpriteRects of the sprites answered with the focus in the current trial
+        # (None if the content has no such sprites)
+        self.hit_rects = None
 
         self.shadow_window = pyglet.window.Window(
             width=1, height=1, visible=False)
 
         self.frame_buffer_off = FrameBuffer(width, height)
+        # Whether to generate mipmaps of the content texture after each render
+        self.mipmap = False
+
+        # Renderer of the sprites
+        self.renderer_type = RENDERER_FIXED
+        self.renderer = create_renderer(RENDERER_FIXED)
 
-        # Create the vertex list for the quad
-        verts = [
-            -1,  1, 0,
-            -1, -1, 0,
-             1, -1, 0,
-             1,  1, 0,
-        ]
-        texcs = [
-            0, 1,
-            0, 0,
-            1, 0,
-            1, 1,
-        ]
-
-        self.common_quad_vlist = pyglet.graphics.vertex_list(
-            4, ('v3f', verts), ('t2f', texcs))
         self._init()
         self.reset()
 
@@ -124,9 +303,147 @@ class BaseContent(object):
 
         return textures
 
+    def set_renderer(self, renderer_type):
+        """ Switch the rendering pipeline, and re-render the content.
+
+        Arguments:
+          renderer_type: String, RENDERER_FIXED or RENDERER_SHADER.
+        """
+        if renderer_type == self.renderer_type:
+            return
+
+        self.shadow_window.switch_to()
+        if hasattr(self.renderer, 'delete'):
+            self.renderer.delete()
+        self.renderer = create_renderer(renderer_type)
+        self.renderer_type = renderer_type
+        if self.frame_cache is not None:
+            # Frames of the other pipeline can differ in the last bit.
+            self.frame_cache.clear()
+        self._invalidate()
+        self.render()
+
+    def set_texture_size(self, width, height=None, mipmap=False):
+        """ Change the resolution of the content texture, and re-render the content.
+
+        Arguments:
+          width:  Integer, width of the content texture.
+          height: Integer, height of the content texture. (None for same as width)
+          mipmap: Bool, whether to generate mipmaps of the texture after each render,
+                  so that the texture minified in the scene is sampled without aliasing.
+        """
+        if height is None:
+            height = width
+
+        self.shadow_window.switch_to()
+        self.frame_buffer_off.resize(width, height)
+        self.width = width
+        self.height = height
+        self.image = None
+        self.image_array = np.zeros((height, width, 4), dtype=np.uint8)
+        self.mipmap = mipmap
+
+        if self.frame_cache is not None:
+            # Entries have the size of the texture.
+            self.set_frame_cache(self.frame_cache.max_bytes)
+        self._invalidate()
+        self.render()
+
+    def set_frame_cache(self, max_bytes):
+        """ Enable the cache of the rendered frames.
+
+        Frames with the same key returned by _get_frame_key() are copied from the cache
+        on the GPU instead of being drawn again. Frames with _get_shared_frame_key() are
+        kept once for all the instances in the process. The shared frames are used only
+        by the instances with the frame cache enabled.
+
+        Arguments:
+          max_bytes: Integer, max GPU memory size of the cache. (0 to disable)
+        """
+        self.shadow_window.switch_to()
+        if self.frame_cache is not None:
+            self.frame_cache.clear()
+            self.frame_cache = None
+        if max_bytes > 0:
+            self.frame_cache = FrameBufferCache(self.width, self.height, max_bytes)
+
+    def seed(self, seed=None):
+        """ Seed random state of this content.
+
+        Arguments:
+          seed: Integer, random seed. (None to seed from OS entropy)
+        """
+        self.rng.seed(seed)
+
+    def set_trial_bank(self, trial_bank):
+        """ Use pre-generated trials instead of randomizing them at phase transitions.
+
+        The bank is rewound and the content is reset, so that the following trials
+        are consumed from the first record of the bank.
+
+        Arguments:
+          trial_bank: TrialBank object, or None to go back to online randomization.
+                      It should be generated by the same content class with the same
+                      difficulty.
+        """
+        if trial_bank is not None:
+            self._check_trial_bank(trial_bank)
+            trial_bank.rewind()
+        self.trial_bank = trial_bank
+        self.reset()
+
+    def _check_trial_bank(self, trial_bank):
+        content_name = type(self).__name__
+        if trial_bank.trials.dtype != self.trial_dtype:
+            raise ValueError("Trial bank records don't match {}".format(content_name))
+        # Settings which are unknown to the bank are not checked.
+        if trial_bank.content_name and trial_bank.content_name != content_name:
+            raise ValueError("Trial bank of {} can't be used by {}".format(
+                trial_bank.content_name, content_name))
+        if trial_bank.difficulty is not None and trial_bank.difficulty != self.difficulty:
+            raise ValueError("Trial bank of difficulty {} can't be used with difficulty {}".format(
+                trial_bank.difficulty, self.difficulty))
+
+    def _next_trial(self):
+        """ Get next trial record from the trial bank, or sample a new one. """
+        if self.trial_bank is not None:
+            return self.trial_bank.next()
+        return self._sample_trial()
+
+    def get_phase(self):
+        """ Returns current phase index of the content. (0 is the start phase) """
+        return self.phase
+
+    def get_state(self):
+        """ Get snapshot of the content state.
+
+        Returns:
+          Dictionary of python scalars and numpy arrays (no GL objects), which can be
+          restored with set_state().
+        """
+        state = {
+            'step_count': self.step_count,
+            'rng_state': self.rng.get_state(),
+            'trial_bank_index': self.trial_bank.index if self.trial_bank is not None else 0,
+        }
+        state.update(self._get_state())
+        return state
+
+    def set_state(self, state):
+        """ Restore the content state taken with get_state(), and re-render the content. """
+        self.step_count = state['step_count']
+        self.rng.set_state(state['rng_state'])
+        if self.trial_bank is not None:
+            self.trial_bank.index = state['trial_bank_index']
+        self._set_state(state)
+        self._invalidate()
+        # Update offscreen image
+        self.render()
+
     def reset(self):
         self._reset()
         self.step_count = 0
+        self._invalidate()
         # Update offscreen image
         self.render()
 
@@ -145,47 +462,191 @@ class BaseContent(object):
         # This is necessary on Linux nvidia drivers
         self.shadow_window.switch_to()
 
+        self.image = None
+
         # Bind the frame buffer
         self.frame_buffer_off.bind()
 
-        # Clear the color and depth buffers
-        glClearColor(*self.bg_color)
-        glClearDepth(1.0)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        gpu_timer = self.gpu_timer
+        if gpu_timer is not None:
+            gpu_timer.poll()
+            gpu_timer.begin(STAGE_GPU_CONTENT_RENDER)
 
-        # Set the projection matrix
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
+        cache, key = self._get_frame_cache_key()
+        if key is not None and cache.restore(key, self.frame_buffer_off):
+            self.dirty_rects = []
+            self.dirty_all = False
+        else:
+            self._draw()
+            if key is not None:
+                cache.store(key, self.frame_buffer_off)
+
+        # TODO: 最終的にマルチサンプルを使わないことにすればこのblitは消える
+        self.frame_buffer_off.blit()
+
+        if self.mipmap:
+            glBindTexture(GL_TEXTURE_2D, self.frame_buffer_off.tex)
+            glGenerateMipmap(GL_TEXTURE_2D)
+
+        if gpu_timer is not None:
+            gpu_timer.end()
+
+        glFlush()
 
-        glOrtho(-1.0, 1.0, -1.0, 1.0, -10, 10)
+    def _draw(self):
+        # Draw the sprites into the bound frame buffer.
+        dirty_rects = self.dirty_rects
+        if self.dirty_all:
+            dirty_rects = []
+        self.dirty_rects = []
+        self.dirty_all = False
 
-        # Set camera rotation and translatoin
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
+        glClearColor(*self.bg_color)
+        glClearDepth(1.0)
 
-        glEnable(GL_TEXTURE_2D)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        # The sprite renderer sets the sampling parameters of the bound texture, which
+        # can be the content texture in the context shared with the environment.
+        glBindTexture(GL_TEXTURE_2D, 0)
 
-        glColor3f(*WHITE_COLOR)
+        # Set the projection matrix
+        self.renderer.begin(PROJECTION_MAT)
 
         # Enable alpha blend
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
-        self._render()
+        if not dirty_rects:
+            # Clear the color and depth buffers
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            self._render()
+        else:
+            # Clear and redraw only the changed regions. Pixels outside the sprites
+            # aren't touched by the drawing, so the result is same as the full render.
+            glEnable(GL_SCISSOR_TEST)
+            for rect in dirty_rects:
+                glScissor(*self._get_pixel_rect(rect))
+                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+                self._render_rect(rect)
+            glDisable(GL_SCISSOR_TEST)
 
         # Disable alpha blend
         glDisable(GL_BLEND)
 
-        # TODO: 最終的にマルチサンプルを使わないことにすればこのblitは消える
-        self.frame_buffer_off.blit()
-
-        glFlush()
+        self.renderer.end()
 
     def bind(self):
         glBindTexture(GL_TEXTURE_2D, self.frame_buffer_off.tex)
 
+    def get_image(self):
+        """ Get the rendered content image.
+
+        The image is read back from the frame buffer only once after each render().
+
+        Returns:
+          numpy ndarray (uint8): size=(height, width, 4) RGBA, bottom row first.
+        """
+        if self.image is None:
+            self.shadow_window.switch_to()
+            # RGBA is read, so that a pixel can be handled as a 32bit value.
+            image = self.image_array
+            glBindFramebuffer(GL_FRAMEBUFFER, self.frame_buffer_off.fbo)
+            glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE,
+                         image.ctypes.data_as(POINTER(GLubyte)))
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+            self.image = image
+        return self.image
+
+    def _add_dirty_rect(self, rect):
+        """ Add a region to redraw in the next render().
+
+        Arguments:
+          rect: Float Array, (min_x, min_y, max_x, max_y) in the content coordinates.
+        """
+        self.dirty_rects.append(rect)
+
+    def _invalidate(self):
+        """ Redraw the whole content in the next render(). """
+        self.dirty_all = True
+
+    def _get_pixel_rect(self, rect):
+        """ Returns (x, y, width, height) of the pixels covering the rect. """
+        min_x, min_y, max_x, max_y = rect
+        # One pixel margin for the rasterization of the sprite edges
+        x0 = max(int(np.floor((min_x + 1.0) * 0.5 * self.width)) - 1, 0)
+        y0 = max(int(np.floor((min_y + 1.0) * 0.5 * self.height)) - 1, 0)
+        x1 = min(int(np.ceil((max_x + 1.0) * 0.5 * self.width)) + 1, self.width)
+        y1 = min(int(np.ceil((max_y + 1.0) * 0.5 * self.height)) + 1, self.height)
+        return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+    def _get_frame_cache_key(self):
+        """ Returns (cache, key) of the current frame. (key is None if not cached) """
+        if self.frame_cache is None:
+            return None, None
+
+        shared_key = self._get_shared_frame_key()
+        if shared_key is not None:
+            # Constant frames are shared by the instances with the same settings.
+            return _shared_frames, (type(self), tuple(self.bg_color), self.width,
+                                    self.height, self.renderer_type, shared_key)
+        return self.frame_cache, self._get_frame_key()
+
+    def _get_shared_frame_key(self):
+        """ Returns key of the current frame if it is same in all the instances of the
+        class, such as SHARED_FRAME_START. (None otherwise)
+
+        SHARED_FRAME_START is returned in the shared_start_phase by default.
+        """
+        if self.shared_start_phase is not None and \
+           getattr(self, 'phase', None) == self.shared_start_phase:
+            return SHARED_FRAME_START
+        return None
+
+    def _get_frame_key(self):
+        """ Returns hashable key which identifies the current frame for the frame cache.
+        (None if the frame shouldn't be cached)
+        """
+        return None
+
+    def _render_rect(self, rect):
+        """ Redraw the sprites in the rect. Drawing is clipped to the rect, so drawing
+        all the sprites (default) is correct, and contents can skip the sprites outside.
+        """
+        self._render()
+
+    def hit_test_batch(self, positions):
+        """ Hit-test many focus positions against the sprites answered in the current
+        trial at once, such as the arrows, the answer buttons or the signs.
+
+        Same result as the contains() loop in step() of the phase showing the sprites,
+        for vectorized environments stepping many positions.
+
+        Arguments:
+          positions: Float array (N, 2), [X,Y] focus positions.
+        Returns:
+          Integer array (N,), index of the sprite hit by each position in the order
+          defined by the content. (-1 if none)
+        """
+        if self.hit_rects is None:
+            return np.full(len(positions), -1, dtype=np.int64)
+        return self.hit_rects.hit_test_batch(positions)
+
+    def get_grid_sprite(self, pos):
+        """ Returns the sprite registered on the grid containing the position.
+
+        Arguments:
+          pos:  Float Array, [X,Y] position
+        Returns:
+          Sprite object. (None if none)
+        """
+        if self.sprite_grid is None:
+            return None
+        return self.sprite_grid.get_sprite(pos)
+
+    def _set_sprite_grid(self, division, extent=1.0):
+        """ Replace the sprite grid with an empty one, and returns it. """
+        self.sprite_grid = SpriteGrid(division, extent)
+        return self.sprite_grid
+
     def _init(self):
         raise NotImplementedError()
 
@@ -201,3 +662,21 @@ class BaseContent(object):
 
     def _render(self):
         raise NotImplementedError()
+
+    def _sample_trial(self):
+        """ Randomize parameters of a new trial.
+
+        Returns:
+          Numpy structured record with `trial_dtype`.
+        """
+        raise NotImplementedError()
+
+    def _apply_trial(self, trial):
+        """ Prepare sprites of the trial. """
+        raise NotImplementedError()
+
+    def _get_state(self):
+        raise NotImplementedError()
+
+    def _set_state(self, state):
+        raise NotImplementedError()
@@ -4,9 +4,9 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import random
 
-from .base_content import BaseContent, ContentSprite
+from .base_content import BaseContent, ContentSprite, SpriteRects, \
+  SHARED_FRAME_START, SHARED_FRAME_BLANK
 
 
 PLUS_MARKER_WIDTH = 0.15  # マーカーの半分の幅 (1.0で画面いっぱい)
@@ -36,6 +36,12 @@ TargetColors = [
 YES_BUTTON_POS = [-0.9, 0.0]
 NO_BUTTON_POS = [0.9, 0.0]
 
+MAX_TARGET_NUMBER = 6
+
+CHANGE_TYPE_COLOR = 0
+CHANGE_TYPE_TEXTURE = 1
+CHANGE_TYPE_ROTATION = 2
+
 
 class AnswerBoxHit(object):
     NONE = 0
@@ -66,16 +72,34 @@ class EightSquareGrid(object):
                 grid = Grid(center, self.half_width)
                 self.grids.append(grid)
 
-    def get_random_location(self, number):
-        samples = random.sample(self.grids, k=number)
+    def get_random_location(self, number, rng):
+        indices = self.get_random_indices(number, rng)
         centers = []
-        for sample in samples:
-            centers.append(sample.center)
+        for index in indices:
+            centers.append(self.get_location(index))
         return centers
 
+    def get_random_indices(self, number, rng):
+        """ Choose grid indices without duplication. """
+        return rng.choice(len(self.grids), size=number, replace=False)
+
+    def get_location(self, index):
+        return self.grids[index].center
+
 
 class ChangeDetectionContent(BaseContent):
     difficulty_range = 5
+
+    trial_dtype = np.dtype([
+        ('target_number', np.int8),
+        ('grid_indices', np.int8, (MAX_TARGET_NUMBER,)),
+        ('tex_indices', np.int8, (MAX_TARGET_NUMBER,)),
+        ('color_indices', np.int8, (MAX_TARGET_NUMBER,)),
+        ('is_changed', np.bool_),
+        ('change_sprite_index', np.int8),
+        ('change_type', np.int8),
+        ('change_value', np.int8),
+    ])
     
     def __init__(self, difficulty=-1):
         self.quadrants = EightSquareGrid()
@@ -105,10 +129,16 @@ class ChangeDetectionContent(BaseContent):
         self._prepare_trial()
 
     def _prepare_trial(self):
-        self._prepare_target_sprites()
-        self._create_learning_and_evaluation_phase()
+        self._apply_trial(self._next_trial())
         self.current_phase = self.start_phase 
 
+    def _get_phases(self):
+        return [self.start_phase, self.learning_phase, self.interval_phase,
+                self.evaluation_phase]
+
+    def get_phase(self):
+        return self._get_phases().index(self.current_phase)
+
     def _reset(self):
         self._prepare_trial()
 
@@ -139,22 +169,76 @@ class ChangeDetectionContent(BaseContent):
             info = {}
         return reward, done, need_render, info
 
+    def _get_shared_frame_key(self):
+        if self.current_phase == self.start_phase:
+            return SHARED_FRAME_START
+        elif self.current_phase == self.interval_phase:
+            # Nothing is drawn in the interval phase.
+            return SHARED_FRAME_BLANK
+        return None
+
     def _render(self):
-        self.current_phase.render(self.common_quad_vlist)
+        self.current_phase.render(self.renderer)
+
+    def _sample_trial(self):
+        trial = np.zeros((), dtype=self.trial_dtype)
 
-    def _prepare_target_sprites(self):
         if self.difficulty == -1:
             # Choose target between 2 and 6.
-            target_number = np.random.randint(low=2, high=2+self.difficulty_range)
+            target_number = self.rng.randint(low=2, high=2+self.difficulty_range)
         else:
             target_number = 2 + self.difficulty
-        
-        centers = self.quadrants.get_random_location(target_number)
+
+        trial['target_number'] = target_number
+        grid_indices = self.quadrants.get_random_indices(target_number, self.rng)
+        trial['grid_indices'][:target_number] = grid_indices
+        trial['tex_indices'][:target_number] = self.rng.randint(len(self.textures),
+                                                                 size=target_number)
+        trial['color_indices'][:target_number] = self.rng.randint(len(TargetColors),
+                                                                   size=target_number)
+
+        # Change applied at the evaluation phase
+        if self.rng.rand() < TARGET_CHANGE_THRESHOLD:
+            trial['is_changed'] = False
+            return trial
+
+        trial['is_changed'] = True
+        sprite_index = self.rng.randint(target_number)
+        trial['change_sprite_index'] = sprite_index
+
+        if trial['tex_indices'][sprite_index] == 1:
+            # When randomimze target sprite is box texture, we cannot choose random rotaion.
+            change_type = self.rng.randint(0, 2)
+        else:
+            # When randomimze target sprite is E texture, we can choose random rotation too.
+            change_type = self.rng.randint(0, 3)
+        trial['change_type'] = change_type
+
+        if change_type == CHANGE_TYPE_COLOR:
+            color_index = trial['color_indices'][sprite_index]
+            color_candidates = [i for i in range(len(TargetColors)) if i != color_index]
+            trial['change_value'] = self.rng.choice(color_candidates)
+        elif change_type == CHANGE_TYPE_ROTATION:
+            # Target sprites are not rotated before the change.
+            trial['change_value'] = self.rng.randint(1, 4)
+        return trial
+
+    def _apply_trial(self, trial):
+        self.trial = trial
+        self._prepare_target_sprites()
+        self._create_learning_and_evaluation_phase()
+        # Hit index is 0 for YES and 1 for NO button.
+        answer_state = self.evaluation_phase.answer_state
+        self.hit_rects = SpriteRects([answer_state.yes_button, answer_state.no_button])
+
+    def _prepare_target_sprites(self):
+        target_number = int(self.trial['target_number'])
 
         self.target_sprites = []
-        for center in centers:
-            texture = random.choice(self.textures)
-            color = random.choice(TargetColors)
+        for i in range(target_number):
+            center = self.quadrants.get_location(self.trial['grid_indices'][i])
+            texture = self.textures[self.trial['tex_indices'][i]]
+            color = TargetColors[self.trial['color_indices'][i]]
 
             sprite = ContentSprite(tex=texture,
                                    pos_x=center[0],
@@ -168,7 +252,28 @@ class ChangeDetectionContent(BaseContent):
 
         e_marker_texture = self.textures[0]
         box_texture = self.textures[1]
-        self.evaluation_phase = EvaluationPhase(self.target_sprites, box_texture, e_marker_texture)
+        self.evaluation_phase = EvaluationPhase(self.target_sprites, box_texture, e_marker_texture,
+                                                self.trial)
+
+    def _get_state(self):
+        return {
+            'phase': self.get_phase(),
+            'trial': self.trial,
+            'learning_count': self.learning_phase.learning_count,
+            'interval_count': self.interval_phase.interval_count,
+            'reaction_step': self.evaluation_phase.reaction_step,
+        }
+
+    def _set_state(self, state):
+        self._apply_trial(state['trial'])
+        self.current_phase = self._get_phases()[state['phase']]
+
+        self.learning_phase.learning_count = state['learning_count']
+        self.interval_phase.interval_count = state['interval_count']
+        if self.current_phase == self.evaluation_phase:
+            # Apply the change of the target sprites again
+            self.evaluation_phase.reset()
+        self.evaluation_phase.reaction_step = state['reaction_step']
 
 
 class AbstractPhase(object):
@@ -184,7 +289,7 @@ class AbstractPhase(object):
     def reward(self):
         raise NotImplementedError()
 
-    def render(self, common_quad_vlist):
+    def render(self, renderer):
         raise NotImplementedError()
 
     def info(self):
@@ -207,8 +312,8 @@ class StartPhase(AbstractPhase):
     def reward(self):
         return 0
 
-    def render(self, common_quad_vlist):
-        self.plus_sprite.render(common_quad_vlist)
+    def render(self, renderer):
+        self.plus_sprite.render(renderer)
 
 
 class LearningPhase(AbstractPhase):
@@ -229,9 +334,9 @@ class LearningPhase(AbstractPhase):
     def reward(self):
         return 0
 
-    def render(self, common_quad_vlist):
+    def render(self, renderer):
         for sprite in self.target_sprites:  # Phase.LEARNING or Phase.EVALUATION
-            sprite.render(common_quad_vlist)
+            sprite.render(renderer)
 
 
 class IntervalPhase(AbstractPhase):
@@ -251,15 +356,16 @@ class IntervalPhase(AbstractPhase):
     def reward(self):
         return 0
 
-    def render(self, common_quad_vlist):
+    def render(self, renderer):
         pass
 
 
 class EvaluationPhase(AbstractPhase):
-    def __init__(self, target_sprites, box_texture, e_marker_texture):
+    def __init__(self, target_sprites, box_texture, e_marker_texture, trial):
         self.target_sprites = target_sprites
         self.answer_state = AnswerState(box_texture)
         self.textures = [box_texture, e_marker_texture]
+        self.trial = trial
 
         self.is_changed = False
         self.hit_type = AnswerBoxHit.NONE
@@ -270,26 +376,21 @@ class EvaluationPhase(AbstractPhase):
         self.reaction_step += 1
 
     def reset(self):
-        if np.random.rand() < TARGET_CHANGE_THRESHOLD:
+        if not self.trial['is_changed']:
             self.is_changed = False
             return
 
         self.is_changed = True
-        sprite = np.random.choice(self.target_sprites)
+        sprite = self.target_sprites[self.trial['change_sprite_index']]
 
-        if sprite.tex == self.textures[0]:
-            # When randomimze target sprite is box texture, we cannot choose random rotaion.
-            rand_num = np.random.random_integers(0, 1)
-        else:
-            # When randomimze target sprite is E texture, we can choose random rotation too.
-            rand_num = np.random.random_integers(0, 2)
-            
-        if rand_num == 0:
-            self._change_color(sprite)
-        elif rand_num == 1:
+        change_type = self.trial['change_type']
+        change_value = self.trial['change_value']
+        if change_type == CHANGE_TYPE_COLOR:
+            self._change_color(sprite, change_value)
+        elif change_type == CHANGE_TYPE_TEXTURE:
             self._change_texture(sprite)
-        elif rand_num == 2:
-            self._change_rotation(sprite)
+        elif change_type == CHANGE_TYPE_ROTATION:
+            self._change_rotation(sprite, change_value)
         self.reaction_step = 0
 
     def phase_done(self, local_focus_pos):
@@ -313,18 +414,14 @@ class EvaluationPhase(AbstractPhase):
             info['result'] = 'fail'
         return info
     
-    def render(self, common_quad_vlist):
+    def render(self, renderer):
         for sprite in self.target_sprites:  # Phase.LEARNING or Phase.EVALUATION
-            sprite.render(common_quad_vlist)
-
-        self.answer_state.render(common_quad_vlist)
+            sprite.render(renderer)
 
-    def _change_color(self, sprite):
-        next_color = random.choice(TargetColors)
-        while next_color == sprite.color:
-            next_color = random.choice(TargetColors)
+        self.answer_state.render(renderer)
 
-        sprite.color = next_color
+    def _change_color(self, sprite, color_index):
+        sprite.color = TargetColors[color_index]
 
     def _change_texture(self, sprite):
         if sprite.tex == self.textures[0]:
@@ -332,13 +429,8 @@ class EvaluationPhase(AbstractPhase):
         else:
             sprite.tex = self.textures[0]
 
-    def _change_rotation(self, sprite):
-        rot_index_candidates = []
-        for i in range(4):
-            if i != sprite.rot_index:
-                rot_index_candidates.append(i)
-        new_rot_index = random.choice(rot_index_candidates)
-        sprite.rot_index = new_rot_index
+    def _change_rotation(self, sprite, rot_index):
+        sprite.rot_index = rot_index
 
 class AnswerState(object):
     def __init__(self, texture):
@@ -353,9 +445,9 @@ class AnswerState(object):
         else:
             return AnswerBoxHit.NONE
 
-    def render(self, common_quad_vlist):
-        self.yes_button.render(common_quad_vlist)
-        self.no_button.render(common_quad_vlist)
+    def render(self, renderer):
+        self.yes_button.render(renderer)
+        self.no_button.render(renderer)
 
 
 class AnswerButtonSprite(ContentSprite):
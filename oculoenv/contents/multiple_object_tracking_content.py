@@ -45,40 +45,38 @@ MOVE_SPEED = 0.05
 
 WATCH_DOG_COUNT = 200
 
+MAX_BALL_SIZE = 7
+
 
 
 class MultipleObjectTrackingSprite(object):
-    def __init__(self, texture, is_memory_target, is_response_target):
+    def __init__(self, texture, is_memory_target, is_response_target, rng):
         self.tex = texture
         self.width = BALL_WIDTH
+        self.rng = rng
         
         self.is_memory_target = is_memory_target
         self.is_response_target = is_response_target
         
     def randomize_pos(self):
-        rate_x = np.random.uniform(low=0.0, high=1.0)
-        rate_y = np.random.uniform(low=0.0, high=1.0)
+        rate_x, rate_y = self.rng.uniform(low=0.0, high=1.0, size=2)
         
         self.pos_x = (2.0 * rate_x - 1.0) * MOVE_REGION_RATE
         self.pos_y = (2.0 * rate_y - 1.0) * MOVE_REGION_RATE
         
     def randomize_direction(self):
-        self.direction = np.random.uniform(low=-1.0, high=1.0) * np.pi
+        self.direction = self.rng.uniform(low=-1.0, high=1.0) * np.pi
 
-    def render(self, common_quad_vlist, phase, index):
+    def render(self, renderer, phase, index):
         if phase == PHASE_MEMORY and self.is_memory_target:
-            glColor3f(*BALL_MEMORY_COLOR)
+            color = BALL_MEMORY_COLOR
         elif phase == PHASE_RESPONSE and self.is_response_target:
-            glColor3f(*BALL_RESPONSE_COLOR)
+            color = BALL_RESPONSE_COLOR
         else:
-            glColor3f(*BALL_COLOR)
-            
-        glPushMatrix()
-        glTranslatef(self.pos_x, self.pos_y, 0.1 * index)
-        glScalef(self.width, self.width, self.width)
-        glBindTexture(self.tex.target, self.tex.id)
-        common_quad_vlist.draw(GL_QUADS)
-        glPopMatrix()
+            color = BALL_COLOR
+
+        renderer.draw_sprite(self.tex, self.pos_x, self.pos_y, 0.1 * index, self.width,
+                             color=color)
         
     def is_correct_target(self):
         return self.is_memory_target and self.is_response_target
@@ -158,6 +156,14 @@ class MultipleObjectTrackingSprite(object):
 
 class MultipleObjectTrackingContent(BaseContent):
     difficulty_range = 6
+    shared_start_phase = PHASE_START
+
+    trial_dtype = np.dtype([
+        ('ball_size', np.int8),
+        ('response_target_index', np.int8),
+        ('positions', np.float64, (MAX_BALL_SIZE, 2)),
+        ('directions', np.float64, (MAX_BALL_SIZE,)),
+    ])
     
     def __init__(self, difficulty=-1):
         super(MultipleObjectTrackingContent, self).__init__()
@@ -182,47 +188,72 @@ class MultipleObjectTrackingContent(BaseContent):
         
         self.phase = PHASE_START
         self.phase_count = 0
+        self.trial = None
+
+    def _sample_trial(self):
+        trial = np.zeros((), dtype=self.trial_dtype)
 
-    def _prepare_ball_sprites(self):
         if self.difficulty == -1:
-            ball_size = np.random.randint(low=2, high=2+self.difficulty_range)
+            ball_size = self.rng.randint(low=2, high=2+self.difficulty_range)
         else:
             ball_size = 2 + self.difficulty
 
-        dice = np.random.randint(2)
+        dice = self.rng.randint(2)
         is_target_correct = (dice == 1)
 
-        memory_target_index = 0
-
         if is_target_correct:
             # When memorized target is the response taret. (Answer should be YES)
             response_target_index = 0
         else:
             # When memorized target is not the response taret. (Answer should be NO)
-            response_target_index = np.random.randint(low=1, high=ball_size)
-            
+            response_target_index = self.rng.randint(low=1, high=ball_size)
+
         ball_sprites = []
 
         for i in range(ball_size):
-            ball_sprite = MultipleObjectTrackingSprite(self.ball_texture,
-                                                       i == memory_target_index,
-                                                       i == response_target_index)
-            ball_sprites.append(ball_sprite)
-        self.ball_sprites = ball_sprites
-
-        for i, ball_sprite in enumerate(self.ball_sprites):
+            ball_sprite = MultipleObjectTrackingSprite(None, False, False, self.rng)
             ball_sprite.randomize_pos()
             ball_sprite.randomize_direction()
 
             if i > 0:
                 for wd_count in range(WATCH_DOG_COUNT):
-                    if ball_sprite.is_conflict_with(self.ball_sprites[0:i]):
+                    if ball_sprite.is_conflict_with(ball_sprites):
                         ball_sprite.randomize_pos()
                     else:
                         break
                     if wd_count == WATCH_DOG_COUNT-1:
                         print("warning: watch dog reached: initial position")
-        
+            ball_sprites.append(ball_sprite)
+
+            trial['positions'][i] = (ball_sprite.pos_x, ball_sprite.pos_y)
+            trial['directions'][i] = ball_sprite.direction
+
+        trial['ball_size'] = ball_size
+        trial['response_target_index'] = response_target_index
+        return trial
+
+    def _prepare_ball_sprites(self):
+        self._apply_trial(self._next_trial())
+
+    def _apply_trial(self, trial):
+        self.trial = trial
+
+        memory_target_index = 0
+        response_target_index = trial['response_target_index']
+
+        ball_sprites = []
+
+        for i in range(trial['ball_size']):
+            ball_sprite = MultipleObjectTrackingSprite(self.ball_texture,
+                                                       i == memory_target_index,
+                                                       i == response_target_index,
+                                                       self.rng)
+            ball_sprite.pos_x = float(trial['positions'][i, 0])
+            ball_sprite.pos_y = float(trial['positions'][i, 1])
+            ball_sprite.direction = float(trial['directions'][i])
+            ball_sprites.append(ball_sprite)
+        self.ball_sprites = ball_sprites
+
     def _is_target_correct(self):
         return self.ball_sprites[0].is_correct_target()
 
@@ -234,6 +265,30 @@ class MultipleObjectTrackingContent(BaseContent):
     def _reset(self):
         self._move_to_start_phase()
 
+    def _get_state(self):
+        if self.trial is not None:
+            ball_states = [(ball_sprite.pos_x, ball_sprite.pos_y, ball_sprite.direction)
+                           for ball_sprite in self.ball_sprites]
+        else:
+            ball_states = []
+        return {
+            'phase': self.phase,
+            'phase_count': self.phase_count,
+            'trial': self.trial,
+            'ball_states': np.array(ball_states, dtype=np.float64),
+        }
+
+    def _set_state(self, state):
+        self.phase = state['phase']
+        self.phase_count = state['phase_count']
+        if state['trial'] is None:
+            self.trial = None
+            return
+
+        self._apply_trial(state['trial'])
+        for ball_sprite, ball_state in zip(self.ball_sprites, state['ball_states']):
+            ball_sprite.pos_x, ball_sprite.pos_y, ball_sprite.direction = ball_state.tolist()
+
     def _step(self, local_focus_pos):
         reward = 0
 
@@ -292,13 +347,13 @@ class MultipleObjectTrackingContent(BaseContent):
 
     def _render(self):
         if self.phase == PHASE_START:
-            self.start_sprite.render(self.common_quad_vlist)
+            self.start_sprite.render(self.renderer)
         else:
             for i, ball_sprite in enumerate(self.ball_sprites):
-                ball_sprite.render(self.common_quad_vlist, self.phase, i)
+                ball_sprite.render(self.renderer, self.phase, i)
             if self.phase == PHASE_RESPONSE:
-                self.button_sprite_no.render(self.common_quad_vlist)
-                self.button_sprite_yes.render(self.common_quad_vlist)
+                self.button_sprite_no.render(self.renderer)
+                self.button_sprite_yes.render(self.renderer)
 
     def _move_to_start_phase(self):
         """ Change phase to red plus cursor showing. """
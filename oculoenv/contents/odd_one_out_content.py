@@ -4,10 +4,9 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import random
 from pyglet.gl import *
 
-from .base_content import BaseContent, ContentSprite
+from .base_content import BaseContent, ContentSprite, SpriteRects
 
 PHASE_START = 0
 PHASE_FIND = 1
@@ -35,6 +34,8 @@ COLORS = [
 
 GRID_DIVISIONS = [3, 5, 7]
 
+MAX_SIGN_NUM = max(GRID_DIVISIONS) * max(GRID_DIVISIONS)
+
 MOTION_INTERVAL_FRAMES = 2
 
 
@@ -47,7 +48,8 @@ class OddOneOutSignSprite(object):
                  grid_division,
                  color_index,
                  has_motion,
-                 odd=False):
+                 odd=False,
+                 offset=(0.0, 0.0)):
         self.tex_index = tex_index
         self.tex = textures[tex_index]
         self.color = COLORS[color_index]
@@ -63,22 +65,16 @@ class OddOneOutSignSprite(object):
         if self.has_motion:
             self._set_motion_pos()
         else:
-            self._set_random_pos()
-
-    def render(self, common_quad_vlist):
-        glColor3f(*self.color)
+            self._set_offset_pos(offset)
 
-        glPushMatrix()
-        glTranslatef(self.pos_x, self.pos_y, 0.0)
+    def render(self, renderer):
         scaled_width = self.width * SIGN_SCALE
-        glScalef(scaled_width, scaled_width, scaled_width)
-        glBindTexture(self.tex.target, self.tex.id)
-        common_quad_vlist.draw(GL_QUADS)
-        glPopMatrix()
-
-    def _set_random_pos(self):
-        dx = np.random.uniform(-1.0, 1.0)
-        dy = np.random.uniform(-1.0, 1.0)
+        renderer.draw_sprite(self.tex, self.pos_x, self.pos_y, 0.0, scaled_width,
+                             color=self.color)
+
+    def _set_offset_pos(self, offset):
+        # Offset in [-1, 1] is drawn for each trial by the content.
+        dx, dy = offset
         rate = 0.15
         self.pos_x = self.base_pos_x + dx * rate * self.width
         self.pos_y = self.base_pos_y + dy * rate * self.width
@@ -135,12 +131,37 @@ class OddOneOutSignSprite(object):
           (py >= self.base_pos_y - scaled_width) and \
           (py <= self.base_pos_y + scaled_width)
 
+    def get_render_rect(self):
+        """ Returns (min_x, min_y, max_x, max_y) of the rendered sprite. """
+        scaled_width = self.width * SIGN_SCALE
+        return (self.pos_x - scaled_width, self.pos_y - scaled_width,
+                self.pos_x + scaled_width, self.pos_y + scaled_width)
+
+    def get_rect(self):
+        """ Returns (min_x, min_y, max_x, max_y) of the rect tested by contains(). """
+        scaled_width = self.width * SIGN_SCALE
+        return (self.base_pos_x - scaled_width, self.base_pos_y - scaled_width,
+                self.base_pos_x + scaled_width, self.base_pos_y + scaled_width)
+
 
 class OddOneOutContent(BaseContent):
     difficulty_range = 0
+    shared_start_phase = PHASE_START
+
+    trial_dtype = np.dtype([
+        ('grid_division', np.int8),
+        ('odd_index', np.int8),
+        ('main_tex_index', np.int8),
+        ('odd_tex_index', np.int8),
+        ('main_color_index', np.int8),
+        ('odd_color_index', np.int8),
+        ('has_odd_motion', np.bool_),
+        ('offsets', np.float64, (MAX_SIGN_NUM, 2)),
+    ])
     
     def __init__(self, difficulty=-1):
         assert (difficulty == -1)
+        self.difficulty = difficulty
         super(OddOneOutContent, self).__init__(bg_color=[0.0, 0.0, 0.0, 1.0])
 
     def _init(self):
@@ -170,35 +191,58 @@ class OddOneOutContent(BaseContent):
         avoid_index = (grid_division * grid_division - 1) // 2
         indices = list(range(grid_division * grid_division))
         indices.remove(avoid_index)
-        random.shuffle(indices)
+        self.rng.shuffle(indices)
         odd_index = indices[0]
         return odd_index
 
-    def _prepare_sign_sprites(self):
-        odd_type = np.random.randint(0, ODD_TYPE_MAX)
+    def _sample_trial(self):
+        trial = np.zeros((), dtype=self.trial_dtype)
+
+        odd_type = self.rng.randint(0, ODD_TYPE_MAX)
 
         out = self._get_sign_variables(odd_type)
         main_tex_index, odd_tex_index, main_color_index, odd_color_index, has_odd_motion = out
 
-        grid_division_index = np.random.randint(0, len(GRID_DIVISIONS))
+        grid_division_index = self.rng.randint(0, len(GRID_DIVISIONS))
         grid_division = GRID_DIVISIONS[grid_division_index]
+        sign_num = grid_division * grid_division
+
+        trial['grid_division'] = grid_division
+        trial['odd_index'] = self._choose_odd_index(grid_division)
+        trial['main_tex_index'] = main_tex_index
+        trial['odd_tex_index'] = odd_tex_index
+        trial['main_color_index'] = main_color_index
+        trial['odd_color_index'] = odd_color_index
+        trial['has_odd_motion'] = has_odd_motion
+        # Random position jitter of each sign
+        trial['offsets'][:sign_num] = self.rng.uniform(-1.0, 1.0, size=(sign_num, 2))
+        return trial
+
+    def _prepare_sign_sprites(self):
+        self._apply_trial(self._next_trial())
+
+    def _apply_trial(self, trial):
+        self.trial = trial
+
+        grid_division = int(trial['grid_division'])
+        odd_index = trial['odd_index']
 
         self.sign_sprites = []
+        sprite_grid = self._set_sprite_grid(grid_division)
 
         count = 0
-        odd_index = self._choose_odd_index(grid_division)
 
         for i in range(grid_division):
             for j in range(grid_division):
-                tex_index = main_tex_index
-                color_index = main_color_index
+                tex_index = int(trial['main_tex_index'])
+                color_index = int(trial['main_color_index'])
                 has_motion = False
 
                 odd = count == odd_index
                 if odd:
-                    tex_index = odd_tex_index
-                    color_index = odd_color_index
-                    if has_odd_motion:
+                    tex_index = int(trial['odd_tex_index'])
+                    color_index = int(trial['odd_color_index'])
+                    if trial['has_odd_motion']:
                         has_motion = True
 
                 sign_sprite = OddOneOutSignSprite(
@@ -209,18 +253,44 @@ class OddOneOutContent(BaseContent):
                     grid_division=grid_division,
                     color_index=color_index,
                     has_motion=has_motion,
-                    odd=odd)
+                    odd=odd,
+                    offset=trial['offsets'][count])
                 self.sign_sprites.append(sign_sprite)
+                # Hit-test rects don't move with the motion.
+                sprite_grid.register(sign_sprite, i, j)
                 count += 1
 
+        self.motion_sprites = [sign_sprite for sign_sprite in self.sign_sprites
+                               if sign_sprite.has_motion]
+        # Hit index is the index of the sign, which is odd at trial['odd_index'].
+        self.hit_rects = SpriteRects(self.sign_sprites)
+
     def _reset(self):
         self._move_to_start_phase()
 
+    def _get_state(self):
+        motion_states = [(sign_sprite.motion_count, sign_sprite.motion_pos_index)
+                         for sign_sprite in self.sign_sprites]
+        return {
+            'phase': self.phase,
+            'reaction_step': self.reaction_step,
+            'trial': self.trial,
+            'motion_states': np.array(motion_states, dtype=np.int8),
+        }
+
+    def _set_state(self, state):
+        self.phase = state['phase']
+        self.reaction_step = state['reaction_step']
+        self._apply_trial(state['trial'])
+
+        for sign_sprite, motion_state in zip(self.sign_sprites, state['motion_states']):
+            sign_sprite.motion_count, sign_sprite.motion_pos_index = motion_state.tolist()
+            if sign_sprite.has_motion:
+                sign_sprite._set_motion_pos()
+
     def _check_odd_hit(self, local_focus_pos):
-        for sign_sprite in self.sign_sprites:
-            if sign_sprite.odd and sign_sprite.contains(local_focus_pos):
-                return True
-        return False
+        sign_sprite = self.get_grid_sprite(local_focus_pos)
+        return sign_sprite is not None and sign_sprite.odd
 
     def _get_sign_variables(self, odd_type):
         """ Collect variables(color, tex and motion) for applied odd type. """
@@ -231,30 +301,30 @@ class OddOneOutContent(BaseContent):
         has_odd_motion = False
 
         if odd_type == ODD_TYPE_COLOR:
-            main_tex_index = np.random.randint(0, 4)  # 0~3
+            main_tex_index = self.rng.randint(0, 4)  # 0~3
             odd_tex_index = main_tex_index
 
             color_indices = list(range(len(COLORS)))
-            random.shuffle(color_indices)
+            self.rng.shuffle(color_indices)
             main_color_index = color_indices[0]
             odd_color_index = color_indices[1]
 
         elif odd_type == ODD_TYPE_SHAPE:
-            main_tex_index = np.random.randint(0, 2)  # 0 or 1
+            main_tex_index = self.rng.randint(0, 2)  # 0 or 1
             odd_tex_index = 1 - main_tex_index
-            main_color_index = np.random.randint(0, len(COLORS))
+            main_color_index = self.rng.randint(0, len(COLORS))
             odd_color_index = main_color_index
 
         elif odd_type == ODD_TYPE_ORIENTATION:
-            main_tex_index = np.random.randint(2, 4)  # 2 or 3
+            main_tex_index = self.rng.randint(2, 4)  # 2 or 3
             odd_tex_index = 5 - main_tex_index
-            main_color_index = np.random.randint(0, len(COLORS))
+            main_color_index = self.rng.randint(0, len(COLORS))
             odd_color_index = main_color_index
 
         elif odd_type == ODD_TYPE_MOTION:
-            main_tex_index = np.random.randint(2, 4)  # 2 or 3
+            main_tex_index = self.rng.randint(2, 4)  # 2 or 3
             odd_tex_index = main_tex_index
-            main_color_index = np.random.randint(0, len(COLORS))
+            main_color_index = self.rng.randint(0, len(COLORS))
             odd_color_index = main_color_index
             has_odd_motion = True
 
@@ -276,9 +346,16 @@ class OddOneOutContent(BaseContent):
             self.reaction_step += 1
             need_render = False
 
-            for sign_sprite in self.sign_sprites:
+            for sign_sprite in self.motion_sprites:
+                old_rect = sign_sprite.get_render_rect()
                 need_repaint = sign_sprite.step()
                 if need_repaint:
+                    # Redraw only the region of the old and new sprite positions.
+                    new_rect = sign_sprite.get_render_rect()
+                    self._add_dirty_rect((min(old_rect[0], new_rect[0]),
+                                          min(old_rect[1], new_rect[1]),
+                                          max(old_rect[2], new_rect[2]),
+                                          max(old_rect[3], new_rect[3])))
                     need_render = True
 
             found_odd = self._check_odd_hit(local_focus_pos)
@@ -297,17 +374,36 @@ class OddOneOutContent(BaseContent):
 
     def _render(self):
         if self.phase == PHASE_START:
-            self.start_sprite.render(self.common_quad_vlist)
+            self.start_sprite.render(self.renderer)
         else:
             for sign_sprite in self.sign_sprites:
-                sign_sprite.render(self.common_quad_vlist)
+                sign_sprite.render(self.renderer)
+
+    def _get_frame_key(self):
+        # Frames of the trial differ only in the positions of the motion sprite.
+        return (self.trial.tobytes(),
+                tuple(sign_sprite.motion_pos_index for sign_sprite in self.motion_sprites))
+
+    def _render_rect(self, rect):
+        if self.phase == PHASE_START:
+            self._render()
+            return
+
+        min_x, min_y, max_x, max_y = rect
+        for sign_sprite in self.sign_sprites:
+            sign_rect = sign_sprite.get_render_rect()
+            if sign_rect[0] <= max_x and sign_rect[2] >= min_x and \
+               sign_rect[1] <= max_y and sign_rect[3] >= min_y:
+                sign_sprite.render(self.renderer)
 
     def _move_to_start_phase(self):
         """ Change phase to red plus cursor showing. """
         self.phase = PHASE_START
+        self._invalidate()
 
     def _move_to_find_phase(self):
         """ Change phase to target finding. """
         self._prepare_sign_sprites()
         self.reaction_step = 0
         self.phase = PHASE_FIND
+        self._invalidate()
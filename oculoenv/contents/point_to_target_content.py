@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
-import random
-
 import numpy as np
 
 from .base_content import BaseContent, ContentSprite
@@ -26,10 +24,11 @@ class Quadrant(object):
         self.width_top = width_top
         self.width_bottom = width_bottom
 
-    def get_random_location(self, target_width):
+    def get_random_location(self, target_width, rng):
         """ Get random location in this quadrant given target size. 
         Arguments:
           target_width: Float, half width of the target
+          rng: RandomState, random state to draw from.
         Returns:
           (Float, Float) Position of the random target location in this quadrant.
         """
@@ -38,13 +37,20 @@ class Quadrant(object):
         miny = self.center[1] - self.width_bottom + target_width
         maxy = self.center[1] + self.width_top - target_width
 
-        x = np.random.uniform(low=minx, high=maxx)
-        y = np.random.uniform(low=miny, high=maxy)
+        x, y = rng.uniform(low=[minx, miny], high=[maxx, maxy])
         return (x, y)
 
 
 class PointToTargetContent(BaseContent):
     difficulty_range = 4
+    shared_start_phase = PHASE_START
+
+    trial_dtype = np.dtype([
+        ('target_width', np.float64),
+        ('lure_width', np.float64),
+        ('target_pos', np.float64, (2,)),
+        ('lure_pos', np.float64, (2,)),
+    ])
     
     def __init__(self, difficulty=-1):
         self.difficulty = difficulty
@@ -99,15 +105,15 @@ class PointToTargetContent(BaseContent):
             e_marker_texture,
             0.0, 0.0, TARGET_WIDTH_SMALL, rot_index=1, color=[0.0, 0.0, 0.0])
 
-        if self.difficulty != -1:
-            # If task difficulty is explicitly applied, keep specific target and lure sizes
-            # during entire episode. (Otherwise change size 
-            self._apply_difficulty(self.difficulty)
-            
         self.phase = PHASE_START
         self.reaction_step = 0
+        self.trial = None
 
     def _reset(self):
+        if self.difficulty != -1:
+            # If task difficulty is explicitly applied, keep specific target and lure sizes
+            # during entire episode. (Otherwise change size 
+            self._apply_difficulty(self.difficulty)
         self._move_to_start_phase()
 
     def _step(self, local_focus_pos):
@@ -141,10 +147,10 @@ class PointToTargetContent(BaseContent):
 
     def _render(self):
         if self.phase == PHASE_START:
-            self.start_sprite.render(self.common_quad_vlist)
+            self.start_sprite.render(self.renderer)
         else:
-            self.lure_sprite.render(self.common_quad_vlist)
-            self.target_sprite.render(self.common_quad_vlist)
+            self.lure_sprite.render(self.renderer)
+            self.target_sprite.render(self.renderer)
 
     def _move_to_start_phase(self):
         """ Change phase to red plus cursor showing. """
@@ -152,46 +158,84 @@ class PointToTargetContent(BaseContent):
 
     def _apply_difficulty(self, current_difficulty):
         """ Change target and lure size based on the difficulty. """
-            
+        target_width, lure_width = self._get_difficulty_widths(current_difficulty)
+        self.target_sprite.set_width(target_width)
+        self.lure_sprite.set_width(lure_width)
+
+    def _get_difficulty_widths(self, current_difficulty):
+        """ Choose target and lure size based on the difficulty.
+
+        Returns:
+          (Float, Float) Half width of the target and the lure.
+        """
         if current_difficulty == 0:
             # Target is large, lure is small
-            self.target_sprite.set_width(TARGET_WIDTH_LARGE)
-            self.lure_sprite.set_width(TARGET_WIDTH_SMALL)
+            return TARGET_WIDTH_LARGE, TARGET_WIDTH_SMALL
         elif current_difficulty == 1:
             # Target is large, lure is large or
             # Target is small, lure is small
-            if np.random.randint(0, 2) == 0:
-                self.target_sprite.set_width(TARGET_WIDTH_LARGE)
-                self.lure_sprite.set_width(TARGET_WIDTH_LARGE)
+            if self.rng.randint(0, 2) == 0:
+                return TARGET_WIDTH_LARGE, TARGET_WIDTH_LARGE
             else:
-                self.target_sprite.set_width(TARGET_WIDTH_SMALL)
-                self.lure_sprite.set_width(TARGET_WIDTH_SMALL)
+                return TARGET_WIDTH_SMALL, TARGET_WIDTH_SMALL
         elif current_difficulty == 3:
-            self.target_sprite.set_width(TARGET_WIDTH_LARGE)
-            self.lure_sprite.set_width(0)
+            return TARGET_WIDTH_LARGE, 0
         else:
             # Target is small, lure is large
-            self.target_sprite.set_width(TARGET_WIDTH_SMALL)
-            self.lure_sprite.set_width(TARGET_WIDTH_LARGE)
+            return TARGET_WIDTH_SMALL, TARGET_WIDTH_LARGE
+
+    def _sample_trial(self):
+        trial = np.zeros((), dtype=self.trial_dtype)
 
-    def _locate_targets(self):
         if self.difficulty == -1:
             # Change target and lure size randomly.
-            current_difficulty = np.random.randint(0, self.difficulty_range)
-            self._apply_difficulty(current_difficulty)
-        
+            current_difficulty = self.rng.randint(0, self.difficulty_range)
+        else:
+            current_difficulty = self.difficulty
+        target_width, lure_width = self._get_difficulty_widths(current_difficulty)
+
         indices = list(range(4))
-        random.shuffle(indices)
+        self.rng.shuffle(indices)
 
         target_quadrant_index = indices[0]
-        target_pos = self.quadrants[target_quadrant_index].get_random_location(
-            self.target_sprite.width)
-        self.target_sprite.set_pos(target_pos)
-
         lure_quadrant_index = indices[1]
-        lure_pos = self.quadrants[lure_quadrant_index].get_random_location(
-            self.lure_sprite.width)
-        self.lure_sprite.set_pos(lure_pos)
+
+        trial['target_width'] = target_width
+        trial['lure_width'] = lure_width
+        trial['target_pos'] = self.quadrants[target_quadrant_index].get_random_location(
+            target_width, self.rng)
+        trial['lure_pos'] = self.quadrants[lure_quadrant_index].get_random_location(
+            lure_width, self.rng)
+        return trial
+
+    def _apply_trial(self, trial):
+        self.trial = trial
+
+        self.target_sprite.set_width(float(trial['target_width']))
+        self.lure_sprite.set_width(float(trial['lure_width']))
+        self.target_sprite.set_pos(trial['target_pos'].tolist())
+        self.lure_sprite.set_pos(trial['lure_pos'].tolist())
+
+    def _locate_targets(self):
+        self._apply_trial(self._next_trial())
+
+    def _get_state(self):
+        return {
+            'phase': self.phase,
+            'reaction_step': self.reaction_step,
+            'trial': self.trial,
+            'sprite_widths': (self.target_sprite.width, self.lure_sprite.width),
+        }
+
+    def _set_state(self, state):
+        self.phase = state['phase']
+        self.reaction_step = state['reaction_step']
+        if state['trial'] is not None:
+            self._apply_trial(state['trial'])
+        else:
+            self.trial = None
+        self.target_sprite.set_width(state['sprite_widths'][0])
+        self.lure_sprite.set_width(state['sprite_widths'][1])
 
     def _move_to_target_phase(self):
         """ Change phase to target showing. """
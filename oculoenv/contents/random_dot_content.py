@@ -7,7 +7,7 @@ import numpy as np
 import math
 from pyglet.gl import *
 
-from .base_content import BaseContent, ContentSprite
+from .base_content import BaseContent, ContentSprite, SpriteRects
 
 PHASE_START = 0
 PHASE_RESPONSE = 1
@@ -37,30 +37,22 @@ DOT_MOVE_RANGE = 0.6
 
 
 class DotSprite(object):
-    def __init__(self, tex):
+    def __init__(self, tex, pos):
         self.tex = tex
         self.color = [1,1,1]
 
         self.is_coherent = True
         
-        self._set_random_pos()
+        self._set_pos(pos)
         self._update_color()
 
-    def render(self, common_quad_vlist, index):
-        glColor3f(*self.color)
+    def render(self, renderer, index):
+        renderer.draw_sprite(self.tex, self.pos_x, self.pos_y, -5 + 0.01 * index,
+                             DOT_HALF_WIDTH, color=self.color)
 
-        glPushMatrix()
-        glTranslatef(self.pos_x, self.pos_y, -5 + 0.01 * index)
-        glScalef(DOT_HALF_WIDTH, DOT_HALF_WIDTH, DOT_HALF_WIDTH)
-        glBindTexture(self.tex.target, self.tex.id)
-        common_quad_vlist.draw(GL_QUADS)
-        glPopMatrix()
-
-    def _set_random_pos(self):
-        x = np.random.uniform(-DOT_MOVE_RANGE, DOT_MOVE_RANGE)
-        y = np.random.uniform(-DOT_MOVE_RANGE, DOT_MOVE_RANGE)
-        self.pos_x = x
-        self.pos_y = y
+    def _set_pos(self, pos):
+        self.pos_x = pos[0]
+        self.pos_y = pos[1]
 
     def _update_color(self):
         d = math.sqrt(self.pos_x * self.pos_x + self.pos_y * self.pos_y)
@@ -68,7 +60,12 @@ class DotSprite(object):
         rate = rate * 1.1
         self.color = [rate,rate,rate]
         
-    def step(self, dx, dy):
+    def step(self, dx, dy, random_pos):
+        """
+        Arguments:
+          dx, dy:     Float, coherent movement delta.
+          random_pos: Float array, [X,Y] position used when this dot is not coherent.
+        """
         if self.is_coherent:
             self.pos_x += dx
             self.pos_y += dy
@@ -77,13 +74,19 @@ class DotSprite(object):
             if self.pos_y > DOT_MOVE_RANGE: self.pos_y -= (DOT_MOVE_RANGE * 2.0)
             if self.pos_y < -DOT_MOVE_RANGE: self.pos_y += (DOT_MOVE_RANGE * 2.0)
         else:
-            self._set_random_pos()
+            self._set_pos(random_pos)
         self._update_color()
 
     
 
 class RandomDotMotionDiscriminationContent(BaseContent):
     difficulty_range = len(COHERENT_RATES)
+    shared_start_phase = PHASE_START
+
+    trial_dtype = np.dtype([
+        ('direction_index', np.int8),
+        ('coherent_rate_index', np.int8),
+    ])
     
     def __init__(self, difficulty=-1):
         super(RandomDotMotionDiscriminationContent, self).__init__(bg_color=[0.0, 0.0, 0.0, 1.0])
@@ -100,8 +103,8 @@ class RandomDotMotionDiscriminationContent(BaseContent):
         dot_texture = self._load_texture('dot0.png')
         
         self.dot_sprites = []
-        for _ in range(DOT_NUM):
-            dot_sprite = DotSprite(dot_texture)
+        for pos in self._get_random_dot_pos():
+            dot_sprite = DotSprite(dot_texture, pos)
             self.dot_sprites.append(dot_sprite)
 
         self._prepare_arrow_sprites()
@@ -109,10 +112,34 @@ class RandomDotMotionDiscriminationContent(BaseContent):
         self.phase = PHASE_START
         self.reaction_step = 0
         self.current_direction_index = 0
+        self.trial = None
 
     def _reset(self):
+        for dot_sprite, pos in zip(self.dot_sprites, self._get_random_dot_pos()):
+            dot_sprite._set_pos(pos)
+            dot_sprite._update_color()
         self._move_to_start_phase()
 
+    def _get_state(self):
+        dot_pos = [(dot_sprite.pos_x, dot_sprite.pos_y) for dot_sprite in self.dot_sprites]
+        return {
+            'phase': self.phase,
+            'reaction_step': self.reaction_step,
+            'trial': self.trial,
+            'dot_pos': np.array(dot_pos, dtype=np.float64),
+        }
+
+    def _set_state(self, state):
+        self.phase = state['phase']
+        self.reaction_step = state['reaction_step']
+        if state['trial'] is not None:
+            self._apply_trial(state['trial'])
+        else:
+            self.trial = None
+        for dot_sprite, pos in zip(self.dot_sprites, state['dot_pos']):
+            dot_sprite._set_pos(pos.tolist())
+            dot_sprite._update_color()
+
     def _step(self, local_focus_pos):
         reward = 0
 
@@ -134,8 +161,9 @@ class RandomDotMotionDiscriminationContent(BaseContent):
             dx = math.cos(direction) * DOT_SPEED
             dy = math.sin(direction) * DOT_SPEED
 
-            for dot_sprite in self.dot_sprites:
-                dot_sprite.step(dx, dy)
+            random_dot_pos = self._get_random_dot_pos()
+            for dot_sprite, random_pos in zip(self.dot_sprites, random_dot_pos):
+                dot_sprite.step(dx, dy, random_pos)
             hit = self._check_arrow_hit(local_focus_pos)
 
             if hit == ARROW_HIT_CORRECT:
@@ -154,12 +182,16 @@ class RandomDotMotionDiscriminationContent(BaseContent):
 
     def _render(self):
         if self.phase == PHASE_START:
-            self.start_sprite.render(self.common_quad_vlist)
+            self.start_sprite.render(self.renderer)
         else:
             for i,dot_sprite in enumerate(self.dot_sprites):
-                dot_sprite.render(self.common_quad_vlist, i)
+                dot_sprite.render(self.renderer, i)
             for arrow_sprite in self.arrow_sprites:
-                arrow_sprite.render(self.common_quad_vlist)
+                arrow_sprite.render(self.renderer)
+
+    def _get_random_dot_pos(self):
+        """ Draw random positions for all the dots at once. """
+        return self.rng.uniform(-DOT_MOVE_RANGE, DOT_MOVE_RANGE, size=(DOT_NUM, 2))
 
     def _check_arrow_hit(self, local_focus_pos):
         for i,arrow_sprite in enumerate(self.arrow_sprites):
@@ -174,17 +206,27 @@ class RandomDotMotionDiscriminationContent(BaseContent):
         """ Change phase to red plus cursor showing. """
         self.phase = PHASE_START
 
-    def _move_to_response_phase(self):
-        """ Change phase to respond. """
+    def _sample_trial(self):
+        trial = np.zeros((), dtype=self.trial_dtype)
+
         # Randomize direction
-        self.current_direction_index = np.random.randint(0, 8)
-        
+        trial['direction_index'] = self.rng.randint(0, 8)
+
         # Choose coherent rate
         if self.difficulty == -1:
-            coherent_rate_index = np.random.randint(0, len(COHERENT_RATES))
+            trial['coherent_rate_index'] = self.rng.randint(0, len(COHERENT_RATES))
         else:
-            coherent_rate_index = self.difficulty
-        coherent_rate = COHERENT_RATES[coherent_rate_index]
+            trial['coherent_rate_index'] = self.difficulty
+        return trial
+
+    def _apply_trial(self, trial):
+        self.trial = trial
+
+        self.current_direction_index = int(trial['direction_index'])
+        # Hit index is the direction index of the arrow.
+        self.hit_rects = SpriteRects(self.arrow_sprites)
+
+        coherent_rate = COHERENT_RATES[trial['coherent_rate_index']]
         coherent_dot_num = int(DOT_NUM * coherent_rate)
 
         for i,dot_sprite in enumerate(self.dot_sprites):
@@ -192,6 +234,10 @@ class RandomDotMotionDiscriminationContent(BaseContent):
             # Set dot coherent flag
             dot_sprite.is_coherent = is_coherent
 
+    def _move_to_response_phase(self):
+        """ Change phase to respond. """
+        self._apply_trial(self._next_trial())
+
         self.reaction_step = 0
         # Change phase
         self.phase = PHASE_RESPONSE
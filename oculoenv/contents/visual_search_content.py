@@ -4,7 +4,6 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import random
 from pyglet.gl import *
 
 from .base_content import BaseContent, ContentSprite
@@ -36,6 +35,8 @@ COLORS = [
 GRID_DIVISION = 7
 SIGN_SCALE = 0.8
 
+MAX_SIGN_SIZE = 7
+
 MAX_STEP_COUNT = 180 * 60
 
 
@@ -56,20 +57,24 @@ class VisualSearchSignSprite(object):
 
         self.is_target = (tex_index == 0 and color_index == 0)
 
-    def render(self, common_quad_vlist):
-        glColor3f(*self.color)
-
-        glPushMatrix()
-        glTranslatef(self.pos_x, self.pos_y, 0.0)
+    def render(self, renderer):
         scaled_width = self.width * SIGN_SCALE
-        glScalef(scaled_width, scaled_width, scaled_width)
-        glBindTexture(self.tex.target, self.tex.id)
-        common_quad_vlist.draw(GL_QUADS)
-        glPopMatrix()
+        renderer.draw_sprite(self.tex, self.pos_x, self.pos_y, 0.0, scaled_width,
+                             color=self.color)
 
 
 class VisualSearchContent(BaseContent):
     difficulty_range = 6
+    shared_start_phase = PHASE_START
+
+    trial_dtype = np.dtype([
+        ('sign_size', np.int8),
+        ('has_target', np.bool_),
+        ('distraction_type', np.int8),
+        ('pos_indices', np.int8, (MAX_SIGN_SIZE,)),
+        ('tex_indices', np.int8, (MAX_SIGN_SIZE,)),
+        ('color_indices', np.int8, (MAX_SIGN_SIZE,)),
+    ])
     
     def __init__(self, difficulty=-1):
         super(VisualSearchContent, self).__init__()
@@ -100,6 +105,7 @@ class VisualSearchContent(BaseContent):
 
         self.reaction_step = 0
         self.phase = PHASE_START
+        self.trial = None
 
     def _get_sign_variables(self, pos_index, distraction_type, has_target):
         # If target is present, target should be located at the first in the array.
@@ -109,45 +115,80 @@ class VisualSearchContent(BaseContent):
         else:
             if distraction_type == DISTRACTION_TYPE_COLOR:
                 tex_index = 0
-                color_index = np.random.randint(1, len(COLORS))
+                color_index = self.rng.randint(1, len(COLORS))
             elif distraction_type == DISTRACTION_TYPE_SHAPE:
-                tex_index = np.random.randint(1, len(self.sign_textures))
+                tex_index = self.rng.randint(1, len(self.sign_textures))
                 color_index = 0
             else:
-                index = np.random.randint(
+                index = self.rng.randint(
                     1,
                     len(self.sign_textures) * len(COLORS))
                 tex_index = index // len(COLORS)
                 color_index = index % len(COLORS)
         return tex_index, color_index
 
-    def _prepare_sign_sprites(self):
+    def _sample_trial(self):
+        trial = np.zeros((), dtype=self.trial_dtype)
+
         # Choose sign size between 2 and 7.
         if self.difficulty == -1:
-            sign_size = np.random.randint(low=2, high=2+self.difficulty_range)
+            sign_size = self.rng.randint(low=2, high=2+self.difficulty_range)
         else:
             sign_size = 2 + self.difficulty
         pos_indices = list(range(GRID_DIVISION * GRID_DIVISION))
-        random.shuffle(pos_indices)
+        self.rng.shuffle(pos_indices)
         pos_indices = pos_indices[:sign_size]
-        dice = np.random.randint(2)
+        dice = self.rng.randint(2)
         has_target = (dice == 1)
 
-        distraction_type = np.random.randint(DISTRACTION_TYPE_MAX)
+        distraction_type = self.rng.randint(DISTRACTION_TYPE_MAX)
 
-        sign_sprites = []
+        trial['sign_size'] = sign_size
+        trial['has_target'] = has_target
+        trial['distraction_type'] = distraction_type
+        trial['pos_indices'][:sign_size] = pos_indices
 
         for i in range(sign_size):
             tex_index, color_index = self._get_sign_variables(
                 i, distraction_type, has_target)
-            sign_sprite = VisualSearchSignSprite(self.sign_textures, tex_index,
-                                                 pos_indices[i], color_index)
+            trial['tex_indices'][i] = tex_index
+            trial['color_indices'][i] = color_index
+        return trial
+
+    def _prepare_sign_sprites(self):
+        self._apply_trial(self._next_trial())
+
+    def _apply_trial(self, trial):
+        self.trial = trial
+
+        sign_sprites = []
+
+        for i in range(trial['sign_size']):
+            sign_sprite = VisualSearchSignSprite(self.sign_textures,
+                                                 int(trial['tex_indices'][i]),
+                                                 int(trial['pos_indices'][i]),
+                                                 int(trial['color_indices'][i]))
             sign_sprites.append(sign_sprite)
         self.sign_sprites = sign_sprites
 
     def _reset(self):
         self._move_to_start_phase()
 
+    def _get_state(self):
+        return {
+            'phase': self.phase,
+            'reaction_step': self.reaction_step,
+            'trial': self.trial,
+        }
+
+    def _set_state(self, state):
+        self.phase = state['phase']
+        self.reaction_step = state['reaction_step']
+        if state['trial'] is not None:
+            self._apply_trial(state['trial'])
+        else:
+            self.trial = None
+
     def _is_target_present(self):
         return self.sign_sprites[0].is_target
 
@@ -194,13 +235,13 @@ class VisualSearchContent(BaseContent):
 
     def _render(self):
         if self.phase == PHASE_START:
-            self.start_sprite.render(self.common_quad_vlist)
+            self.start_sprite.render(self.renderer)
         else:
-            self.button_sprite_no.render(self.common_quad_vlist)
-            self.button_sprite_yes.render(self.common_quad_vlist)
+            self.button_sprite_no.render(self.renderer)
+            self.button_sprite_yes.render(self.renderer)
 
             for sign_sprite in self.sign_sprites:
-                sign_sprite.render(self.common_quad_vlist)
+                sign_sprite.render(self.renderer)
 
     def _move_to_start_phase(self):
         """ Change phase to red plus cursor showing. """
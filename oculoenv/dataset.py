@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+""" Reader for datasets generated with oculoenv-gen.
+
+Shard files are memory-mapped, so that only the pages of the accessed steps are read
+from the disk.
+
+  dataset = ShardDataset('data')
+  frame, angle, action, reward = dataset[0]
+
+  for frames, angles, actions, rewards in dataset.iterate(batch_size=64, shuffle=True,
+                                                          seed=0, epoch=epoch, workers=4):
+      ...
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Name of the file listing the completed shards in a dataset directory
+MANIFEST_FILE_NAME = 'manifest.json'
+
+DEFAULT_FIELDS = ('frames', 'angles', 'actions', 'rewards')
+
+# Interval (sec) to check the stop request while a prefetch worker is blocked
+_PREFETCH_POLL_INTERVAL = 0.1
+
+
+class ShardDataset(object):
+    """ Random-access view over the steps of all the shards in a dataset directory.
+
+    Arguments:
+      data_dir: String, output directory of oculoenv-gen.
+      fields:   Tuple of strings, names of the .npy files to read in each shard.
+    """
+
+    def __init__(self, data_dir, fields=DEFAULT_FIELDS):
+        self.data_dir = data_dir
+        self.fields = tuple(fields)
+
+        with open(os.path.join(data_dir, MANIFEST_FILE_NAME)) as f:
+            self.manifest = json.load(f)
+
+        # Memory-mapped arrays for each shard
+        self.shards = []
+        sizes = []
+        for shard in self.manifest['shards']:
+            shard_dir = os.path.join(data_dir, shard['name'])
+            arrays = [np.load(os.path.join(shard_dir, field + '.npy'), mmap_mode='r')
+                      for field in self.fields]
+            for field, array in zip(self.fields, arrays):
+                if len(array) != shard['size']:
+                    raise ValueError("{} in {} has {} steps, but manifest says {}".format(
+                        field, shard['name'], len(array), shard['size']))
+            self.shards.append(arrays)
+            sizes.append(shard['size'])
+
+        # Global index of the first step in each shard
+        self.offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(sizes)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index):
+        """ Returns tuple of the field values of a step. """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Dataset index out of range")
+
+        shard_index = np.searchsorted(self.offsets, index, side='right') - 1
+        local_index = index - self.offsets[shard_index]
+        return tuple(array[local_index] for array in self.shards[shard_index])
+
+    def get_batch(self, indices):
+        """ Gather steps into a batch.
+
+        Arguments:
+          indices: Integer array, global step indices.
+        Returns:
+          Tuple of numpy arrays for each field, with the length of the indices.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        shard_indices = np.searchsorted(self.offsets, indices, side='right') - 1
+        local_indices = indices - self.offsets[shard_indices]
+
+        first_arrays = self.shards[0]
+        batch = tuple(
+            np.empty((len(indices),) + array.shape[1:], dtype=array.dtype)
+            for array in first_arrays)
+
+        for shard_index in np.unique(shard_indices):
+            positions = np.nonzero(shard_indices == shard_index)[0]
+            # Read in ascending order within the shard to keep the disk access sequential.
+            order = np.argsort(local_indices[positions], kind='mergesort')
+            positions = positions[order]
+            local = local_indices[positions]
+            for out, array in zip(batch, self.shards[shard_index]):
+                out[positions] = array[local]
+        return batch
+
+    def get_indices(self, shuffle=False, seed=0, epoch=0):
+        """ Returns the order of the global step indices in an epoch.
+
+        Shuffled order is a permutation across all the shards, and is determined only by
+        the seed and the epoch.
+        """
+        if not shuffle:
+            return np.arange(len(self), dtype=np.int64)
+        rng = np.random.RandomState([seed, epoch])
+        return rng.permutation(len(self)).astype(np.int64)
+
+    def iterate(self, batch_size, shuffle=False, seed=0, epoch=0, drop_last=False,
+                workers=0, prefetch=2):
+        """ Iterate batches over the dataset.
+
+        Arguments:
+          batch_size: Integer, number of steps in a batch.
+          shuffle:    Bool, whether to shuffle steps across the shards.
+          seed:       Integer, seed of the shuffle.
+          epoch:      Integer, epoch index mixed into the shuffle seed.
+          drop_last:  Bool, whether to drop the last incomplete batch.
+          workers:    Integer, number of prefetch threads. (0 to read in the caller thread)
+          prefetch:   Integer, number of batches each worker reads ahead.
+        Returns:
+          Generator of batches in the same order regardless of the number of workers.
+        """
+        indices = self.get_indices(shuffle, seed, epoch)
+        batch_indices = [indices[i:i + batch_size]
+                         for i in range(0, len(indices), batch_size)]
+        if drop_last and len(batch_indices) > 0 and len(batch_indices[-1]) < batch_size:
+            batch_indices.pop()
+
+        if workers == 0:
+            for indices in batch_indices:
+                yield self.get_batch(indices)
+        else:
+            for batch in self._iterate_prefetch(batch_indices, workers, prefetch):
+                yield batch
+
+    def _iterate_prefetch(self, batch_indices, workers, prefetch):
+        # Batches are assigned to the workers round-robin, and each worker has its own
+        # bounded output queue, so that the batches are yielded in order.
+        stop_event = threading.Event()
+        output_queues = [queue.Queue(maxsize=prefetch) for _ in range(workers)]
+
+        def run(worker_index):
+            for i in range(worker_index, len(batch_indices), workers):
+                try:
+                    item = (self.get_batch(batch_indices[i]), None)
+                except Exception as e:
+                    item = (None, e)
+                while not stop_event.is_set():
+                    try:
+                        output_queues[worker_index].put(item, timeout=_PREFETCH_POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        pass
+                if stop_event.is_set() or item[1] is not None:
+                    return
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for i in range(len(batch_indices)):
+                batch, error = output_queues[i % workers].get()
+                if error is not None:
+                    raise error
+                yield batch
+        finally:
+            # Release the workers when the iteration is stopped early.
+            stop_event.set()
+            for thread in threads:
+                thread.join()
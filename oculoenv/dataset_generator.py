@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+""" Offline dataset generator.
+
+Runs environments in parallel worker processes and writes sharded datasets.
+
+  $ oculoenv-gen --content 1 --out_dir data --shards 64 --steps_per_shard 1000
+
+Each shard is a directory with memory-mappable .npy files, where index i holds the
+result of i-th step in the shard:
+
+  frames.npy    uint8   (N, W, W, 3)  Observation image
+  angles.npy    float32 (N, 2)        Absolute camera angles after the step
+  actions.npy   float32 (N, 2)        Action of the step
+  rewards.npy   float32 (N,)          Reward of the step
+  dones.npy     bool    (N,)          Terminate flag of the step
+  focus_pos.npy float32 (N, 2)        Local focus position on the content panel
+  phases.npy    int8    (N,)          Content phase index after the step
+
+manifest.json in the output directory lists the completed shards. Shards are written
+into a temporary directory and renamed when completed, so that an interrupted run can
+be resumed with the same arguments.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import shutil
+
+import numpy as np
+
+from .environment import Environment, PLANE_DISTANCE
+from .contents import CONTENT_CLASSES
+from .dataset import MANIFEST_FILE_NAME
+
+POLICY_RANDOM = 'random'
+POLICY_SCRIPTED = 'scripted'
+
+# Distance to the fixation point regarded as reached in the scripted policy
+FIXATION_REACH_DISTANCE = 0.05
+
+
+class RandomPolicy(object):
+    """ Random saccade policy with uniform delta angles. """
+
+    def __init__(self, rng, max_delta):
+        self.rng = rng
+        self.max_delta = max_delta
+
+    def reset(self):
+        pass
+
+    def choose_action(self, env):
+        return self.rng.uniform(low=-self.max_delta, high=self.max_delta, size=2)
+
+
+class ScriptedPolicy(object):
+    """ Saccade policy which fixates the start marker in the start phase, and
+    otherwise moves to random fixation points on the content panel one by one.
+    """
+
+    def __init__(self, rng, max_delta):
+        self.rng = rng
+        self.max_delta = max_delta
+        self.fixation_pos = None
+
+    def reset(self):
+        self.fixation_pos = None
+
+    def choose_action(self, env):
+        focus_pos = env.get_local_focus_pos()
+
+        if env.content.get_phase() == 0:
+            target_pos = (0.0, 0.0)
+        else:
+            if self.fixation_pos is None or \
+               np.hypot(focus_pos[0] - self.fixation_pos[0],
+                        focus_pos[1] - self.fixation_pos[1]) < FIXATION_REACH_DISTANCE:
+                self.fixation_pos = self.rng.uniform(low=-1.0, high=1.0, size=2)
+            target_pos = self.fixation_pos
+
+        # Camera angles looking at the target position on the content panel
+        target_angle_h = math.atan(-target_pos[0] / PLANE_DISTANCE)
+        target_angle_v = math.atan(target_pos[1] * math.cos(target_angle_h) / PLANE_DISTANCE)
+
+        d_angle_h = target_angle_h - env.camera.cur_angle_h
+        d_angle_v = target_angle_v - env.camera.cur_angle_v
+        return np.clip([d_angle_h, d_angle_v], -self.max_delta, self.max_delta)
+
+
+def create_policy(policy_name, rng, max_delta):
+    if policy_name == POLICY_SCRIPTED:
+        return ScriptedPolicy(rng, max_delta)
+    else:
+        return RandomPolicy(rng, max_delta)
+
+
+def get_shard_name(shard_index):
+    return 'shard_%05d' % shard_index
+
+
+# Environment created once in each worker process
+_worker_env = None
+
+
+def _init_worker(content_index, difficulty, width):
+    global _worker_env
+    content = CONTENT_CLASSES[content_index](difficulty=difficulty)
+    _worker_env = Environment(content, off_buffer_width=width)
+
+
+def generate_shard(env, out_dir, shard_index, steps, policy_name, seed, max_delta):
+    """ Generate one shard with the environment.
+
+    Returns:
+      String, name of the shard.
+    """
+    shard_name = get_shard_name(shard_index)
+    shard_dir = os.path.join(out_dir, shard_name)
+    temp_dir = shard_dir + '.tmp'
+
+    shard_seed = seed + shard_index
+    policy = create_policy(policy_name, np.random.RandomState(shard_seed), max_delta)
+
+    width = env.frame_buffer_off.width
+    frames = np.zeros((steps, width, width, 3), dtype=np.uint8)
+    angles = np.zeros((steps, 2), dtype=np.float32)
+    actions = np.zeros((steps, 2), dtype=np.float32)
+    rewards = np.zeros((steps,), dtype=np.float32)
+    dones = np.zeros((steps,), dtype=np.bool_)
+    focus_pos = np.zeros((steps, 2), dtype=np.float32)
+    phases = np.zeros((steps,), dtype=np.int8)
+
+    env.seed(shard_seed)
+    env.reset()
+    policy.reset()
+
+    for i in range(steps):
+        action = policy.choose_action(env)
+        obs, reward, done, info = env.step(action)
+
+        frames[i] = obs['screen']
+        angles[i] = obs['angle']
+        actions[i] = action
+        rewards[i] = reward
+        dones[i] = done
+        focus_pos[i] = env.get_local_focus_pos()
+        phases[i] = env.content.get_phase()
+
+        if done:
+            env.reset()
+            policy.reset()
+
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+
+    np.save(os.path.join(temp_dir, 'frames.npy'), frames)
+    np.save(os.path.join(temp_dir, 'angles.npy'), angles)
+    np.save(os.path.join(temp_dir, 'actions.npy'), actions)
+    np.save(os.path.join(temp_dir, 'rewards.npy'), rewards)
+    np.save(os.path.join(temp_dir, 'dones.npy'), dones)
+    np.save(os.path.join(temp_dir, 'focus_pos.npy'), focus_pos)
+    np.save(os.path.join(temp_dir, 'phases.npy'), phases)
+
+    # Mark the shard as completed
+    os.rename(temp_dir, shard_dir)
+    return shard_name
+
+
+def _generate_shard_in_worker(args):
+    return generate_shard(_worker_env, *args)
+
+
+def write_manifest(out_dir, config, shard_names, steps):
+    manifest = dict(config)
+    manifest['shards'] = [{'name': shard_name, 'size': steps}
+                          for shard_name in sorted(shard_names)]
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE_NAME)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    os.rename(temp_path, manifest_path)
+
+
+def generate(out_dir, content_index, difficulty=-1, width=128, shards=1,
+             steps_per_shard=1000, policy=POLICY_RANDOM, seed=0, max_delta=0.05,
+             workers=None):
+    """ Generate sharded dataset with worker processes.
+
+    Arguments:
+      out_dir:         String, output directory.
+      content_index:   Integer, index of the content in CONTENT_CLASSES.
+      difficulty:      Integer, content difficulty.
+      width:           Integer, observation image size.
+      shards:          Integer, number of shards.
+      steps_per_shard: Integer, number of steps in one shard.
+      policy:          String, 'random' or 'scripted' saccade policy.
+      seed:            Integer, base seed. Shard i is generated with seed + i.
+      max_delta:       Float, max delta angle (radian) of an action.
+      workers:         Integer, number of worker processes. (None for all cores)
+    """
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    config = {
+        'content': CONTENT_CLASSES[content_index].__name__,
+        'difficulty': difficulty,
+        'width': width,
+        'steps_per_shard': steps_per_shard,
+        'policy': policy,
+        'seed': seed,
+        'max_delta': max_delta,
+    }
+
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for key, value in config.items():
+            if manifest.get(key) != value:
+                raise ValueError("Existing dataset in {} was generated with different {}".format(
+                    out_dir, key))
+
+    # Skip shards completed in the previous run
+    completed = [get_shard_name(i) for i in range(shards)
+                 if os.path.isdir(os.path.join(out_dir, get_shard_name(i)))]
+    remaining = [i for i in range(shards)
+                 if get_shard_name(i) not in completed]
+    if len(completed) > 0:
+        print("Resuming: {} of {} shards already completed".format(len(completed), shards))
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(remaining)))
+
+    tasks = [(out_dir, i, steps_per_shard, policy, seed, max_delta) for i in remaining]
+
+    if len(tasks) > 0:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                    initargs=(content_index, difficulty, width))
+        try:
+            for shard_name in pool.imap_unordered(_generate_shard_in_worker, tasks):
+                completed.append(shard_name)
+                write_manifest(out_dir, config, completed, steps_per_shard)
+                print("{}: done ({}/{})".format(shard_name, len(completed), shards))
+        finally:
+            pool.close()
+            pool.join()
+
+    write_manifest(out_dir, config, completed, steps_per_shard)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate oculoenv dataset shards.")
+    parser.add_argument("--content", help="\n1: Point To Target\n2: Change Detection\n"
+                        + "3: Odd One Out\n4: Visual Search\n"
+                        + "5: Multiple Object Tracking\n"
+                        + "6: Random Dot Motion Descrimination",
+                        type=int,
+                        default=1)
+    parser.add_argument("--difficulty", type=int, default=-1)
+    parser.add_argument("--out_dir", type=str, required=True)
+    parser.add_argument("--width", help="Observation image size", type=int, default=128)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--steps_per_shard", type=int, default=1000)
+    parser.add_argument("--policy", choices=[POLICY_RANDOM, POLICY_SCRIPTED],
+                        default=POLICY_RANDOM)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max_delta", help="Max delta angle (radian) of an action",
+                        type=float, default=0.05)
+    parser.add_argument("--workers", help="Number of worker processes (default: all cores)",
+                        type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.content < 1 or args.content > len(CONTENT_CLASSES):
+        parser.error("Unknown content")
+
+    generate(args.out_dir, args.content - 1, difficulty=args.difficulty,
+             width=args.width, shards=args.shards,
+             steps_per_shard=args.steps_per_shard, policy=args.policy,
+             seed=args.seed, max_delta=args.max_delta, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
+import math
 import sys
 from ctypes import POINTER
 
@@ -9,38 +10,59 @@ import numpy as np
 import pyglet
 from pyglet.gl import *
 
+from .constants import CAMERA_FOV_Y, CAMERA_INITIAL_ANGLE_V, CAMERA_VERTICAL_ANGLE_MAX, \
+  CAMERA_HORIZONTAL_ANGLE_MAX, PLANE_DISTANCE
 from .geom import Matrix4
-from .graphics import FrameBuffer, MultiSampleFrameBuffer
+from .graphics import FrameBuffer, MultiSampleFrameBuffer, FrameBufferCache, TimerQueryRing, \
+  is_timer_query_supported, ShaderRenderer, VertexArray, perspective_matrix, model_matrix, \
+  VERTEX_ATTRIBUTES, RENDERER_FIXED, RENDERER_SHADER, RENDERER_WARP
 from .objmesh import ObjMesh
+from .profiler import Profiler, STAGE_CONTENT_STEP, STAGE_CONTENT_RENDER, \
+  STAGE_RENDER_SCENE, STAGE_READ_PIXELS, STAGE_FLIP, STAGE_GPU_RENDER_SCENE
 from .utils import clamp, deg2rad, rad2deg
+from .warp import ContentWarper
 
 BG_COLOR = np.array([0.45, 0.82, 1.0, 1.0])
 WHITE_COLOR = np.array([1.0, 1.0, 1.0])
 
-# Camera vertical field of view angle (degree)
-CAMERA_FOV_Y = 50
+# Quantization step of the camera angles (radian) for the background cache key.
+# (Less than 1/50 pixel with the default observation size)
+BACKGROUND_ANGLE_STEP = 1e-4
 
-# Initial vertical angle of camera (radian)
-CAMERA_INITIAL_ANGLE_V = deg2rad(10.0)
+IDENTITY_MAT = np.identity(4, dtype=np.float32)
 
-# Max vertical angle of camera (radian)
-CAMERA_VERTICAL_ANGLE_MAX = deg2rad(45.0)
+# Half size and resolution of the scene object layer on the panel plane for the CPU warp.
+# (Covers the frame around the panel, with about the same pixel density as the content)
+WARP_LAYER_EXTENT = 1.3
+WARP_LAYER_WIDTH = 640
+
+# content_texture_width to derive the content texture size from the observation size
+CONTENT_TEXTURE_AUTO = 'auto'
 
-# Max horizontal angle of camera (radian)
-CAMERA_HORIZONTAL_ANGLE_MAX = deg2rad(45.0)
-    
 
-PLANE_DISTANCE = 3.0  # Distance to content plane
+def get_content_texture_width(off_buffer_width):
+    """ Returns power of two width of the content texture with at least one texel for
+    each observation pixel covered by the content panel in the front view.
+    """
+    panel_width = off_buffer_width / (PLANE_DISTANCE * math.tan(deg2rad(CAMERA_FOV_Y) * 0.5))
+    return 2 ** int(math.ceil(math.log(panel_width, 2)))
 
 
 class PlaneObject(object):
-    def __init__(self):
+    """ Content panel, with the vertices placed in world space.
+
+    Arguments:
+      distance: Float, distance from the origin to the panel along minus z-axis.
+    """
+
+    def __init__(self, distance=PLANE_DISTANCE):
         # TODO: グリッドをもう少し細かく分けて、TextureのSkewが軽減されるかどうか調べる
+        z = -distance
         verts = [
-            -1,  1, 0,
-            -1, -1, 0,
-             1, -1, 0,
-             1,  1, 0,
+            -1,  1, z,
+            -1, -1, z,
+             1, -1, z,
+             1,  1, z,
         ]
         texcs = [
             0, 1,
@@ -52,10 +74,23 @@ class PlaneObject(object):
         self.panel_vlist = pyglet.graphics.vertex_list(4, ('v3f', verts),
                                                        ('t2f', texcs))
 
+        # Interleaved (position, texcoord, color) vertex data for the shader pipeline
+        self.vertex_data = np.hstack([
+            np.reshape(verts, (4, 3)), np.reshape(texcs, (4, 2)), np.ones((4, 3))
+        ])
+        self.vertex_array = None
+
     def render(self, content):
         content.bind()
         self.panel_vlist.draw(GL_QUADS)
 
+    def draw(self, renderer, content):
+        """ Draw with ShaderRenderer. """
+        if self.vertex_array is None:
+            self.vertex_array = VertexArray(self.vertex_data, VERTEX_ATTRIBUTES)
+        renderer.draw(self.vertex_array, GL_TRIANGLE_FAN, IDENTITY_MAT,
+                      content.frame_buffer_off.tex)
+
 
 class SceneObject(object):
     """ A class for drawing .obj mesh object with drawing property (pos, scale etc).
@@ -74,6 +109,9 @@ class SceneObject(object):
         self.scale = scale
         self.rot = rad2deg(rot)
 
+    def get_model_mat(self):
+        return model_matrix(self.pos, self.scale, self.rot, rot_axis=1)
+
     def render(self):
         glPushMatrix()
         glTranslatef(*self.pos)
@@ -83,18 +121,93 @@ class SceneObject(object):
         glPopMatrix()
 
 
+class StaticScene(object):
+    """ Static scene objects baked into world-space vertex buffers.
+
+    Scene objects never move, so their transforms are applied to the vertices once,
+    and the objects sharing the same texture are drawn with a single call.
+
+    Arguments:
+      objects: List of SceneObject.
+    """
+
+    def __init__(self, objects):
+        # Vertex data and indices of the objects for each texture
+        batches = []
+        for obj in objects:
+            mesh = obj.mesh
+            batch = None
+            for b in batches:
+                if b['texture'] is mesh.texture:
+                    batch = b
+            if batch is None:
+                batch = {'texture': mesh.texture, 'vertex_data': [], 'indices': [],
+                         'vertex_size': 0}
+                batches.append(batch)
+
+            # Transform the positions into world space.
+            m = obj.get_model_mat()
+            vertex_data = np.array(mesh.vertex_data, dtype=np.float32)
+            vertex_data[:, :3] = vertex_data[:, :3].dot(m[:3, :3].T) + m[:3, 3]
+
+            batch['vertex_data'].append(vertex_data)
+            batch['indices'].append(mesh.indices + batch['vertex_size'])
+            batch['vertex_size'] += len(vertex_data)
+
+        self.batches = []
+        for batch in batches:
+            vertex_data = np.vstack(batch['vertex_data'])
+            indices = np.concatenate(batch['indices'])
+            vlist = pyglet.graphics.vertex_list_indexed(
+                len(vertex_data), indices.tolist(),
+                ('v3f', vertex_data[:, 0:3].reshape(-1)),
+                ('t2f', vertex_data[:, 3:5].reshape(-1)),
+                ('c3f', vertex_data[:, 5:8].reshape(-1)))
+            self.batches.append((batch['texture'], vertex_data, indices, vlist))
+
+        self.vertex_arrays = None
+
+    def render(self):
+        """ Draw with fixed-function pipeline. """
+        for texture, _, _, vlist in self.batches:
+            if texture:
+                glEnable(GL_TEXTURE_2D)
+                glBindTexture(texture.target, texture.id)
+            else:
+                glDisable(GL_TEXTURE_2D)
+            vlist.draw(GL_TRIANGLES)
+
+        glDisable(GL_TEXTURE_2D)
+
+    def draw(self, renderer):
+        """ Draw with ShaderRenderer. """
+        if self.vertex_arrays is None:
+            self.vertex_arrays = [
+                VertexArray(vertex_data, VERTEX_ATTRIBUTES, indices)
+                for _, vertex_data, indices, _ in self.batches
+            ]
+
+        for (texture, _, _, _), vertex_array in zip(self.batches, self.vertex_arrays):
+            tex_id = texture.id if texture else None
+            renderer.draw(vertex_array, GL_TRIANGLES, IDENTITY_MAT, tex_id)
+
+
 class Camera(object):
     """ 3D camera class. """
 
     def __init__(self):
+        # Matrices updated in place
+        self.m = Matrix4()
+        self.m_inv = Matrix4()
+        self.rot_h = Matrix4()
+        self.rot_v = Matrix4()
+
         self.reset()
 
     def _update_mat(self):
-        m0 = Matrix4()
-        m1 = Matrix4()
-        m0.set_rot_x(self.cur_angle_v)
-        m1.set_rot_y(self.cur_angle_h)
-        self.m = m1.mul(m0)
+        self.rot_v.set_rot_x(self.cur_angle_v)
+        self.rot_h.set_rot_y(self.cur_angle_h)
+        self.rot_h.mul(self.rot_v, out=self.m)
 
     def reset(self):
         self.cur_angle_h = 0  # Horizontal
@@ -123,14 +236,23 @@ class Camera(object):
 
         self._update_mat()
 
+    def set_angle(self, angle_h, angle_v):
+        """ Set absolute camera angles (radian). """
+        self.cur_angle_h = angle_h
+        self.cur_angle_v = angle_v
+
+        self._update_mat()
+
     def get_inv_mat(self):
         """ Get invererted camera matrix
 
+        Camera matrix is a rotation, so the inverse is the transpose. The returned matrix
+        is reused and updated in the next call.
+
         Returns:
-          numpy ndarray: inverted camera matrix
+          Matrix4: inverted camera matrix
         """
-        m_inv = self.m.invert()
-        return m_inv
+        return self.m.invert_orthonormal(out=self.m_inv)
 
 
 class Environment(object):
@@ -139,13 +261,36 @@ class Environment(object):
     # initialize metadata for gym interface
     metadata = {'render.modes': ['human', 'ansi']}
 
-    def __init__(self, content, off_buffer_width=128, on_buffer_width=640, usebrica1=False):
+    def __init__(self, content, off_buffer_width=128, on_buffer_width=640, usebrica1=False,
+                 renderer=RENDERER_FIXED, background_cache_mb=0,
+                 background_angle_step=BACKGROUND_ANGLE_STEP, content_cache_mb=0,
+                 content_texture_width=None, content_mipmap=False):
         """ Oculomotor task environment class.
 
         Arguments:
           content: (Content) object
           off_buffer_width: (int) pixel width and height size of offscreen render buffer.
           on_buffer_width: (int) pixel width and height size of display window.
+          renderer: (str) 'fixed' for fixed-function pipeline, 'shader' for shader
+                    based pipeline which uses only OpenGL core profile calls (needs GL 3.3),
+                    or 'warp' to render the observation on CPU by warping the content
+                    image with the homography of the camera rotation.
+          background_cache_mb: (float) GPU memory size (MB) of the cache of the rendered
+                    background and scene objects for each camera pose. With the cache,
+                    only the content panel is drawn in the offscreen pass when the pose
+                    was rendered before. Released by close(). (0 to disable)
+          background_angle_step: (float) quantization step (radian) of the camera angles
+                    regarded as the same pose by the background cache.
+          content_cache_mb: (float) GPU memory size (MB) of the cache of the rendered
+                    content frames. Frames the content rendered before are copied from
+                    the cache instead of drawn, and the start frame is shared by all the
+                    contents of the same class. Released by close(). (0 to disable)
+          content_texture_width: (int) width and height of the content texture, or
+                    CONTENT_TEXTURE_AUTO to derive it from off_buffer_width. (None to
+                    keep the size of the content)
+          content_mipmap: (bool) whether to sample the content texture with mipmaps,
+                    which avoids aliasing when the texture is larger than the panel in
+                    the observation.
         """
         
         # initialize spaces for gym interface
@@ -170,11 +315,49 @@ class Environment(object):
         self.window = None
 
         self.content = content
-        self.plane = PlaneObject()
+        self.plane = PlaneObject(PLANE_DISTANCE)
+
+        # Projection matrices (Matrix4) for each frame buffer size
+        self.projection_mats = {}
+
+        # Profiler while profiling is enabled
+        self.profiler = None
+        # (object, name, previous instance attribute, timed function) shadowed by the profiler
+        self.profiled_attrs = []
+        # TimerQueryRing to measure GPU time of the scene pass (None if disabled)
+        self.gpu_timer = None
+
+        if content_texture_width == CONTENT_TEXTURE_AUTO:
+            content_texture_width = get_content_texture_width(off_buffer_width)
+        if content_texture_width is not None or content_mipmap:
+            if content_texture_width is None:
+                content_texture_width = content.width
+            content.set_texture_size(content_texture_width, mipmap=content_mipmap)
 
         # Add scene objects
         self._init_scene()
 
+        # Background cache of the offscreen pass (None if disabled)
+        self.background_cache = None
+        self.background_angle_step = background_angle_step
+        if background_cache_mb > 0:
+            self.background_cache = FrameBufferCache(
+                off_buffer_width, off_buffer_width, int(background_cache_mb * 1024 * 1024))
+
+        # Whether the content frame cache was enabled by this environment
+        self.owns_content_cache = content_cache_mb > 0
+        if self.owns_content_cache:
+            content.set_frame_cache(int(content_cache_mb * 1024 * 1024))
+            self.shadow_window.switch_to()
+
+        self.renderer_type = renderer
+        self.renderer = None
+        self.warper = None
+        if renderer == RENDERER_SHADER:
+            self._init_shader_renderer()
+        elif renderer == RENDERER_WARP:
+            self._init_warper(off_buffer_width)
+
         self.reset()
 
     def _init_scene(self):
@@ -184,12 +367,75 @@ class Environment(object):
         obj = SceneObject("frame0", pos=[0.0, 0.0, -PLANE_DISTANCE], scale=2.0)
         self.objects.append(obj)
 
+        # Scene objects are drawn from the baked buffers
+        self.static_scene = StaticScene(self.objects)
+
+        # Sampling parameters of the content texture, which don't change.
+        self.shadow_window.switch_to()
+        self.content.bind()
+        min_filter = GL_LINEAR_MIPMAP_LINEAR if self.content.mipmap else GL_LINEAR
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, min_filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+
+    def _init_shader_renderer(self):
+        self.content.set_renderer(RENDERER_SHADER)
+
+        self.shadow_window.switch_to()
+        self.renderer = ShaderRenderer()
+
+    def _init_warper(self, width):
+        layer = self._render_warp_layer(WARP_LAYER_WIDTH, WARP_LAYER_EXTENT)
+        self.warper = ContentWarper(width, CAMERA_FOV_Y, PLANE_DISTANCE, BG_COLOR, layer,
+                                    WARP_LAYER_EXTENT)
+
+    def _render_warp_layer(self, width, extent):
+        """ Render the scene objects seen from the origin looking straight at the panel.
+
+        Returns:
+          Uint8 array (width, width, 4), premultiplied RGBA image covering
+          [-extent, extent] on the panel plane, bottom row first.
+        """
+        self.shadow_window.switch_to()
+        frame_buffer = FrameBuffer(width, width)
+        frame_buffer.bind()
+
+        glClearColor(0.0, 0.0, 0.0, 0.0)
+        glClearDepth(1.0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+        # Frustum through the square of the extent on the panel plane
+        near = 0.04
+        size = extent * near / PLANE_DISTANCE
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        glFrustum(-size, size, -size, size, near, 100.0)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+
+        # Content panel occludes the objects behind it, but its pixels are not in the layer.
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        self.plane.render(self.content)
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+
+        glColor3f(*WHITE_COLOR)
+        self.static_scene.render()
+
+        image = np.zeros((width, width, 4), dtype=np.uint8)
+        glReadPixels(0, 0, width, width, GL_RGBA, GL_UNSIGNED_BYTE,
+                     image.ctypes.data_as(POINTER(GLubyte)))
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+        # Cleared pixels are (0, 0, 0, 0), and the objects are opaque.
+        return image
+
     def _get_observation(self):
         # Get rendered image
         image = self._render_offscreen()
 
         # Change upside-down
-        image = np.flip(image, 0)
+        image = self._flip_image(image)
         
         # Current absolute camera angle
         angle = (self.camera.cur_angle_h, self.camera.cur_angle_v)
@@ -206,7 +452,7 @@ class Environment(object):
         image = self._render_offscreen()
 
         # Change upside-down
-        image = np.flip(image, 0)
+        image = self._flip_image(image)
         
         # flatten observation for BriCA port
         flatImage = np.ravel(image).astype(float)
@@ -229,6 +475,138 @@ class Environment(object):
         obs = self._get_observation_for_brica1() if self.usebrica1 else self._get_observation()
         return obs
 
+    def enable_profiling(self, enabled=True, gpu=False):
+        """ Enable or disable per-stage timing of step() and reset().
+
+        Timed stages are 'content_step' (content logic), 'content_render',
+        'render_scene', 'read_pixels' and 'flip'. Each stage method is replaced with a
+        timed one while enabled, and restored when disabled, so that profiling costs
+        nothing when it is disabled.
+
+        With gpu=True, GPU time of the content pass and the scene pass is measured
+        with GL timer queries as 'gpu_content_render' and 'gpu_render_scene'. Unlike
+        the CPU timings these exclude driver stalls. GPU results arrive a few frames
+        later than the CPU ones.
+
+        Arguments:
+          enabled: Bool, whether to enable profiling.
+          gpu:     Bool, whether to measure GPU time too (when timer query is supported).
+        """
+        self._delete_gpu_timers()
+        if enabled:
+            if self.profiler is None:
+                self.profiler = Profiler()
+            self._bind_profiler(self.profiler)
+            if gpu:
+                self._create_gpu_timers(self.profiler)
+        else:
+            self._unbind_profiler()
+            self.profiler = None
+
+    def get_profile_stats(self):
+        """ Returns dictionary of the timing stats for each stage. (None if disabled) """
+        if self.profiler is None:
+            return None
+        self._poll_gpu_timers()
+        return self.profiler.get_stats()
+
+    def reset_profile_stats(self):
+        if self.profiler is not None:
+            self.profiler.reset()
+
+    def _bind_profiler(self, profiler):
+        # Shadow the methods with instance attributes of the timed ones.
+        self._unbind_profiler()
+        content = self.content
+        for obj, name, stage in [(content, '_step', STAGE_CONTENT_STEP),
+                                 (content, 'render', STAGE_CONTENT_RENDER),
+                                 (self, '_render_scene', STAGE_RENDER_SCENE),
+                                 (self.frame_buffer_off, 'read', STAGE_READ_PIXELS),
+                                 (self, '_flip_image', STAGE_FLIP)]:
+            timed_func = profiler.timed(stage, getattr(obj, name))
+            self.profiled_attrs.append((obj, name, obj.__dict__.get(name), timed_func))
+            setattr(obj, name, timed_func)
+
+    def _create_gpu_timers(self, profiler):
+        # Queries are not shared between contexts, so the content pass and the scene
+        # pass have their own rings.
+        self.content.shadow_window.switch_to()
+        if not is_timer_query_supported():
+            print('GL timer query is not supported, GPU time is not measured')
+            self.shadow_window.switch_to()
+            return
+        self.content.gpu_timer = TimerQueryRing(profiler.add)
+        self.shadow_window.switch_to()
+        self.gpu_timer = TimerQueryRing(profiler.add)
+
+    def _delete_gpu_timers(self):
+        if self.gpu_timer is None:
+            return
+        self.content.shadow_window.switch_to()
+        self.content.gpu_timer.delete()
+        self.content.gpu_timer = None
+        self.shadow_window.switch_to()
+        self.gpu_timer.delete()
+        self.gpu_timer = None
+
+    def _poll_gpu_timers(self):
+        if self.gpu_timer is None:
+            return
+        self.content.shadow_window.switch_to()
+        self.content.gpu_timer.poll()
+        self.shadow_window.switch_to()
+        self.gpu_timer.poll()
+
+    def _unbind_profiler(self):
+        # Restore only the attributes set by _bind_profiler(), in the reverse order.
+        for obj, name, old_attr, timed_func in reversed(self.profiled_attrs):
+            if obj.__dict__.get(name) is not timed_func:
+                # Replaced by others after the binding
+                continue
+            if old_attr is None:
+                del obj.__dict__[name]
+            else:
+                setattr(obj, name, old_attr)
+        self.profiled_attrs = []
+
+    def get_state(self):
+        """ Get snapshot of the environment state.
+
+        Returns:
+          Dictionary of python scalars and numpy arrays (no GL objects), which can be
+          restored with set_state().
+        """
+        state = {
+            'camera_angle': (self.camera.cur_angle_h, self.camera.cur_angle_v),
+            'content': self.content.get_state()
+        }
+        return state
+
+    def set_state(self, state):
+        """ Restore the environment state taken with get_state().
+
+        Only the content image is re-rendered here, and the observation is rendered with
+        the next step().
+        """
+        self.camera.set_angle(*state['camera_angle'])
+        self.content.set_state(state['content'])
+
+    def seed(self, seed=None):
+        """ Seed random state of the content.
+
+        Arguments:
+          seed: Integer, random seed. (None to seed from OS entropy)
+        Returns:
+          List of seeds used in this environment.
+        """
+        self.content.seed(seed)
+        return [seed]
+
+    def get_local_focus_pos(self):
+        """ Get local coordinate of current view focus point on the content panel. """
+        camera_forward_v = self.camera.get_forward_vec()
+        return self._calc_local_focus_pos(camera_forward_v)
+
     def _calc_local_focus_pos(self, camera_forward_v):
         """ Calculate local coordinate of view focus point on the content panel. """
 
@@ -261,8 +639,7 @@ class Environment(object):
         
         self.camera.change_angle(d_angle_h, d_angle_v)
 
-        camera_forward_v = self.camera.get_forward_vec()
-        local_focus_pos = self._calc_local_focus_pos(camera_forward_v)
+        local_focus_pos = self.get_local_focus_pos()
         reward, done, info = self.content.step(local_focus_pos)
 
         obs = self._get_observation_for_brica1() if self.usebrica1 else self._get_observation()
@@ -270,9 +647,21 @@ class Environment(object):
         return obs, reward, done, info
 
     def close(self):
-        pass
+        """ Release the GPU memory of the background cache, and of the content frame
+        cache enabled with content_cache_mb. """
+        self.shadow_window.switch_to()
+        if self.background_cache is not None:
+            self.background_cache.clear()
+            self.background_cache = None
+
+        if self.owns_content_cache:
+            self.content.set_frame_cache(0)
+            self.owns_content_cache = False
+            self.shadow_window.switch_to()
 
     def _render_offscreen(self):
+        if self.warper is not None:
+            return self.warper.warp(self.content.get_image(), self.camera.m.m)
         return self._render_sub(self.frame_buffer_off)
 
     def render(self, mode='human', close=False):
@@ -328,48 +717,102 @@ class Environment(object):
         # Force execution of queued commands
         glFlush()
 
+    def _flip_image(self, image):
+        return np.flip(image, 0)
+
     def _render_sub(self, frame_buffer):
+        self._render_scene(frame_buffer)
+        return frame_buffer.read()
+
+    def _render_scene(self, frame_buffer):
         self.shadow_window.switch_to()
 
         frame_buffer.bind()
 
+        gpu_timer = self.gpu_timer
+        if gpu_timer is not None:
+            gpu_timer.poll()
+            gpu_timer.begin(STAGE_GPU_RENDER_SCENE)
+
+        background_cache = self.background_cache
+        if background_cache is not None and frame_buffer is self.frame_buffer_off:
+            # Background and scene objects don't change for the same camera pose.
+            key = self._get_background_key()
+            if not background_cache.restore(key, frame_buffer):
+                self._clear_frame_buffer()
+                self._draw_scene(frame_buffer, draw_plane=False)
+                background_cache.store(key, frame_buffer)
+            self._draw_scene(frame_buffer, draw_background=False)
+        else:
+            self._clear_frame_buffer()
+            self._draw_scene(frame_buffer)
+
+        if gpu_timer is not None:
+            gpu_timer.end()
+
+    def _get_background_key(self):
+        step = self.background_angle_step
+        return (int(round(self.camera.cur_angle_h / step)),
+                int(round(self.camera.cur_angle_v / step)))
+
+    def _clear_frame_buffer(self):
         # Clear the color and depth buffers
         glClearColor(*BG_COLOR)
         glClearDepth(1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
+    def _draw_scene(self, frame_buffer, draw_background=True, draw_plane=True):
+        if self.renderer is not None:
+            self._draw_scene_shader(frame_buffer, draw_background, draw_plane)
+        else:
+            self._draw_scene_fixed(frame_buffer, draw_background, draw_plane)
+
+    def _get_projection_mat(self, frame_buffer):
+        size = (frame_buffer.width, frame_buffer.height)
+        projection_mat = self.projection_mats.get(size)
+        if projection_mat is None:
+            projection_mat = Matrix4(perspective_matrix(
+                CAMERA_FOV_Y,
+                frame_buffer.width / float(frame_buffer.height),
+                0.04,  # near plane
+                100.0  # far plane
+            ))
+            self.projection_mats[size] = projection_mat
+        return projection_mat
+
+    def _draw_scene_fixed(self, frame_buffer, draw_background, draw_plane):
         # Set the projection matrix
         glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluPerspective(
-            CAMERA_FOV_Y,
-            frame_buffer.width / float(frame_buffer.height),
-            0.04,  # near plane
-            100.0  # far plane
-        )
+        glLoadMatrixf(self._get_projection_mat(frame_buffer).get_raw_gl_ptr())
 
         # Apply camera angle
         glMatrixMode(GL_MODELVIEW)
-        m = self.camera.get_inv_mat()
-        glLoadMatrixf(m.get_raw_gl().ctypes.data_as(POINTER(GLfloat)))
+        glLoadMatrixf(self.camera.get_inv_mat().get_raw_gl_ptr())
 
-        glEnable(GL_TEXTURE_2D)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        # Static scene objects
+        if draw_background:
+            glColor3f(*WHITE_COLOR)
+            self.static_scene.render()
 
-        # For each object
-        glColor3f(*WHITE_COLOR)
-        for obj in self.objects:
-            obj.render()
+        # Draw content panel
+        if draw_plane:
+            glColor3f(*WHITE_COLOR)
+            glEnable(GL_TEXTURE_2D)
+            self.plane.render(self.content)
+
+    def _draw_scene_shader(self, frame_buffer, draw_background, draw_plane):
+        projection_mat = self._get_projection_mat(frame_buffer).m
+        view_mat = self.camera.get_inv_mat().m
+
+        renderer = self.renderer
+        renderer.begin(projection_mat.dot(view_mat))
+
+        # Static scene objects
+        if draw_background:
+            self.static_scene.draw(renderer)
 
         # Draw content panel
-        glEnable(GL_TEXTURE_2D)
-        glPushMatrix()
-        glTranslatef(0.0, 0.0, -PLANE_DISTANCE)
-        glScalef(1.0, 1.0, 1.0)
-        self.plane.render(self.content)
-        glPopMatrix()
+        if draw_plane:
+            self.plane.draw(renderer, self.content)
 
-        return frame_buffer.read()
+        renderer.end()
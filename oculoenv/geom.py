@@ -4,10 +4,51 @@ from __future__ import division
 from __future__ import print_function
 
 import math
+from ctypes import c_float, POINTER
+
 import numpy as np
 
 
+def rot_yx_matrices(angles_y, angles_x):
+    """ Batched rotation matrices around y axis after x axis, Ry * Rx.
+
+    Same as the product of the matrices of Matrix4.set_rot_y(angle_y) and
+    Matrix4.set_rot_x(angle_x), which is the camera rotation with (horizontal, vertical)
+    angles.
+
+    Arguments:
+      angles_y: Float array (N,), (radian) angles around y axis.
+      angles_x: Float array (N,), (radian) angles around x axis.
+    Returns:
+      Float64 array (N, 3, 3).
+    """
+    sy = np.sin(angles_y)
+    cy = np.cos(angles_y)
+    sx = np.sin(angles_x)
+    cx = np.cos(angles_x)
+
+    m = np.empty((len(sy), 3, 3))
+    m[:, 0, 0] = cy
+    m[:, 0, 1] = sy * sx
+    m[:, 0, 2] = sy * cx
+    m[:, 1, 0] = 0.0
+    m[:, 1, 1] = cx
+    m[:, 1, 2] = -sx
+    m[:, 2, 0] = -sy
+    m[:, 2, 1] = cy * sx
+    m[:, 2, 2] = cy * cx
+    return m
+
+
 class Matrix4(object):
+    """ 4x4 matrix.
+
+    Operations write into the existing arrays instead of allocating new ones, and the
+    ones returning a matrix accept an output matrix to be reused.
+    """
+
+    __slots__ = ['m', 'raw_gl', 'raw_gl_ptr']
+
     def __init__(self, m=None):
         # numpy ndarray stores values in row major order
         if m is None:
@@ -15,14 +56,22 @@ class Matrix4(object):
         else:
             self.m = m
 
+        # Column major float32 buffer for OpenGL, allocated at the first get_raw_gl()
+        self.raw_gl = None
+        self.raw_gl_ptr = None
+
+    def set_identity(self):
+        m = self.m
+        m.fill(0.0)
+        m[0, 0] = m[1, 1] = m[2, 2] = m[3, 3] = 1.0
+
     def set_trans(self, v):
         """ Set translation element of the matrix.
         Arguments:
         v: Float array, element size should be 3 or 4.
            if the size is 4, the fourth value should be 1.0
         """
-        for i in range(len(v)):
-            self.m[i, 3] = v[i]
+        self.m[:len(v), 3] = v
 
     def transform(self, v):
         """ Set translation element of the matrix.
@@ -36,44 +85,37 @@ class Matrix4(object):
             v = (v + [1.0])
         return self.m.dot(v)
 
+    def _set_rot(self, i, j, angle):
+        # Rotation in the plane of the axes i and j
+        s = math.sin(angle)
+        c = math.cos(angle)
+        self.set_identity()
+        m = self.m
+        m[i, i] = c
+        m[i, j] = -s
+        m[j, i] = s
+        m[j, j] = c
+
     def set_rot_x(self, angle):
         """ Set matrix with rotation around x axis.
         Arguments:
           angle: Float, (radian) angle
         """
-        s = math.sin(angle)
-        c = math.cos(angle)
-        mv = [[1.0, 0.0, 0.0, 0.0],
-              [0.0,   c,  -s, 0.0],
-              [0.0,   s,   c, 0.0],
-              [0.0, 0.0, 0.0, 1.0]]
-        self.m = np.array(mv, dtype=np.float32)
+        self._set_rot(1, 2, angle)
 
     def set_rot_y(self, angle):
         """ Set matrix with rotation around y axis.
         Arguments:
           angle: Float, (radian) angle
         """
-        s = math.sin(angle)
-        c = math.cos(angle)
-        mv = [[  c, 0.0,   s, 0.0],
-              [0.0, 1.0, 0.0, 0.0],
-              [ -s, 0.0,   c, 0.0],
-              [0.0, 0.0, 0.0, 1.0]]
-        self.m = np.array(mv, dtype=np.float32)
+        self._set_rot(2, 0, angle)
 
     def set_rot_z(self, angle):
         """ Set matrix with rotation around y axis.
         Arguments:
           angle: Float, (radian) angle
         """
-        s = math.sin(angle)
-        c = math.cos(angle)
-        mv = [[  c,  -s, 0.0, 0.0],
-              [  s,   c, 0.0, 0.0],
-              [0.0, 0.0, 1.0, 0.0],
-              [0.0, 0.0, 0.0, 1.0]]
-        self.m = np.array(mv, dtype=np.float32)
+        self._set_rot(0, 1, angle)
 
     def get_axis(self, axis_index):
         """ Get specified axis of this matrix.
@@ -82,36 +124,66 @@ class Matrix4(object):
         Returns:
           Numpy float ndarray: length 3
         """
-        v = []
-        for i in range(3):
-            v.append(self.m[i, axis_index])
-        return np.array(v)
+        return self.m[:3, axis_index].copy()
 
-    def invert(self):
+    def invert(self, out=None):
         """ Returns inverted matrix.
+        Arguments:
+          out: Matrix4 to store the result. (None to allocate)
         Returns:
           Matrix4, inverted matrix
         """
-        m_inv = self.m
-        m_inv = np.linalg.inv(self.m)
-        mat = Matrix4()
-        mat.m = m_inv
-        return mat
+        if out is None:
+            out = Matrix4(np.empty_like(self.m))
+        out.m[:] = np.linalg.inv(self.m)
+        return out
 
-    def mul(self, mat):
+    def invert_orthonormal(self, out=None):
+        """ Returns inverted matrix of rotation and translation.
+
+        The inverse of the rotation is its transpose, so np.linalg.inv() is not needed.
+        Arguments:
+          out: Matrix4 to store the result. (None to allocate, should not be self)
+        Returns:
+          Matrix4, inverted matrix
+        """
+        if out is None:
+            out = Matrix4(np.empty_like(self.m))
+        m = self.m
+        m_inv = out.m
+        m_inv[:3, :3] = m[:3, :3].T
+        m_inv[:3, 3] = -m_inv[:3, :3].dot(m[:3, 3])
+        m_inv[3, :3] = 0.0
+        m_inv[3, 3] = 1.0
+        return out
+
+    def mul(self, mat, out=None):
         """ Returns multiplied matrix.
+        Arguments:
+          out: Matrix4 to store the result. (None to allocate, may be self or mat)
         Returns:
           Matrix4, multipied matrix
         """
-        m_mul = self.m.dot(mat.m)
-        mat = Matrix4()
-        mat.m = m_mul
-        return mat
+        if out is None:
+            out = Matrix4(np.empty((4, 4), dtype=np.result_type(self.m, mat.m)))
+        np.matmul(self.m, mat.m, out=out.m)
+        return out
 
     def get_raw_gl(self):
         """ Returns OpenGL compatible (column major) array representation of the matrix.
+
+        The same float32 buffer is updated and returned every call.
         Returns:
           Float array
         """
-        m_ret = np.transpose(self.m)
-        return m_ret.reshape([16])
+        if self.raw_gl is None:
+            self.raw_gl = np.empty(16, dtype=np.float32)
+        self.raw_gl.reshape(4, 4)[:] = self.m.T
+        return self.raw_gl
+
+    def get_raw_gl_ptr(self):
+        """ Returns ctypes float pointer to get_raw_gl() buffer for glLoadMatrixf(). """
+        raw_gl = self.get_raw_gl()
+        if self.raw_gl_ptr is None:
+            self.raw_gl_ptr = raw_gl.ctypes.data_as(POINTER(c_float))
+        return self.raw_gl_ptr
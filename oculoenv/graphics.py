@@ -6,11 +6,13 @@ from __future__ import print_function
 import math
 
 import os
+import weakref
+from collections import deque, OrderedDict
 import numpy as np
 
 import pyglet
 from pyglet.gl import *
-from ctypes import byref, POINTER
+from ctypes import byref, cast, create_string_buffer, pointer, POINTER
 
 from .utils import *
 
@@ -225,6 +227,26 @@ class FrameBuffer(object):
         glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
         glViewport(0, 0, self.width, self.height)
 
+    def resize(self, width, height):
+        """ Change the size, keeping the frame buffer and texture objects. """
+        self.width = width
+        self.height = height
+
+        glBindTexture(GL_TEXTURE_2D, self.tex)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA,
+                     GL_FLOAT, None)
+
+        depth_rb = GLint(0)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glGetFramebufferAttachmentParameteriv(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT,
+                                              GL_FRAMEBUFFER_ATTACHMENT_OBJECT_NAME,
+                                              byref(depth_rb))
+        glBindRenderbuffer(GL_RENDERBUFFER, depth_rb.value)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT, width, height)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+        self.img_array = np.zeros(shape=(height, width, 3), dtype=np.uint8)
+
     def blit(self):
         pass
 
@@ -236,3 +258,632 @@ class FrameBuffer(object):
         # Unbind the frame buffer
         glBindFramebuffer(GL_FRAMEBUFFER, 0)
         return self.img_array
+
+
+class FrameBufferCache(object):
+    """ LRU cache of the color and depth contents of a FrameBuffer.
+
+    Contents are copied between the frame buffers on the GPU with glBlitFramebuffer,
+    so storing and restoring don't read back pixels. The entries should be used only
+    in the context where they were created.
+
+    Arguments:
+      width:     Integer, frame buffer width
+      height:    Integer, frame buffer height
+      max_bytes: Integer, max GPU memory size of the entries.
+    """
+
+    def __init__(self, width, height, max_bytes):
+        self.width = width
+        self.height = height
+
+        self.max_bytes = max_bytes
+        # RGBA8 color and 32bit depth
+        self.entry_bytes = width * height * 8
+        self.max_entries = max_bytes // self.entry_bytes
+
+        # Key to (fbo, color renderbuffer, depth renderbuffer) in least recently used order
+        self.entries = OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def restore(self, key, frame_buffer):
+        """ Copy the cached contents into the frame buffer, and bind the frame buffer.
+
+        Returns:
+          Bool, whether the key was found.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.miss_count += 1
+            return False
+
+        self.entries[key] = entry
+        self.hit_count += 1
+        self._blit(entry[0], frame_buffer.fbo)
+        frame_buffer.bind()
+        return True
+
+    def store(self, key, frame_buffer):
+        """ Copy the contents of the frame buffer, and bind the frame buffer again. """
+        if self.max_entries == 0:
+            return
+
+        if key in self.entries:
+            entry = self.entries.pop(key)
+        elif len(self.entries) >= self.max_entries:
+            # Reuse the least recently used entry.
+            _, entry = self.entries.popitem(last=False)
+        else:
+            entry = self._create_entry()
+
+        self.entries[key] = entry
+        self._blit(frame_buffer.fbo, entry[0])
+        frame_buffer.bind()
+
+    def clear(self):
+        for fbo, color_rb, depth_rb in self.entries.values():
+            glDeleteFramebuffers(1, byref(fbo))
+            glDeleteRenderbuffers(1, byref(color_rb))
+            glDeleteRenderbuffers(1, byref(depth_rb))
+        self.entries.clear()
+
+    def _create_entry(self):
+        fbo = GLuint(0)
+        glGenFramebuffers(1, byref(fbo))
+        glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+
+        color_rb = GLuint(0)
+        glGenRenderbuffers(1, byref(color_rb))
+        glBindRenderbuffer(GL_RENDERBUFFER, color_rb)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, self.width, self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0,
+                                  GL_RENDERBUFFER, color_rb)
+
+        # Same format as the depth buffer of FrameBuffer, which is required by the blit.
+        depth_rb = GLuint(0)
+        glGenRenderbuffers(1, byref(depth_rb))
+        glBindRenderbuffer(GL_RENDERBUFFER, depth_rb)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT, self.width,
+                              self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT,
+                                  GL_RENDERBUFFER, depth_rb)
+
+        if pyglet.options['debug_gl']:
+            res = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+            assert res == GL_FRAMEBUFFER_COMPLETE
+
+        return fbo, color_rb, depth_rb
+
+    def _blit(self, src_fbo, dst_fbo):
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, src_fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, dst_fbo)
+        glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height,
+                          GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT, GL_NEAREST)
+
+
+class SharedFrameStore(object):
+    """ Color contents of FrameBuffers shared by all the contexts in the process.
+
+    Frames are kept in textures, which are shared between the contexts unlike the frame
+    buffer objects, and are copied with glBlitFramebuffer through a frame buffer object
+    of the current context. Textures are kept until the process ends.
+    """
+
+    def __init__(self):
+        # Key to texture
+        self.textures = {}
+        # Frame buffer object to access the textures for each context
+        self.fbos = weakref.WeakKeyDictionary()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def __len__(self):
+        return len(self.textures)
+
+    def restore(self, key, frame_buffer):
+        """ Copy the stored frame into the frame buffer, and bind the frame buffer.
+
+        Returns:
+          Bool, whether the key was found.
+        """
+        texture = self.textures.get(key)
+        if texture is None:
+            self.miss_count += 1
+            return False
+
+        self.hit_count += 1
+        self._blit(self._get_fbo(texture), frame_buffer.fbo, frame_buffer)
+        frame_buffer.bind()
+        return True
+
+    def store(self, key, frame_buffer):
+        """ Copy the color of the frame buffer, and bind the frame buffer again. """
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = GLuint(0)
+            glGenTextures(1, byref(texture))
+            glBindTexture(GL_TEXTURE_2D, texture)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, frame_buffer.width,
+                         frame_buffer.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            self.textures[key] = texture
+
+        self._blit(frame_buffer.fbo, self._get_fbo(texture), frame_buffer)
+        frame_buffer.bind()
+
+    def _get_fbo(self, texture):
+        # Frame buffer object of the current context with the texture attached
+        context = pyglet.gl.current_context
+        fbo = self.fbos.get(context)
+        if fbo is None:
+            fbo = GLuint(0)
+            glGenFramebuffers(1, byref(fbo))
+            self.fbos[context] = fbo
+
+        glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D,
+                               texture, 0)
+        return fbo
+
+    def _blit(self, src_fbo, dst_fbo, frame_buffer):
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, src_fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, dst_fbo)
+        glBlitFramebuffer(0, 0, frame_buffer.width, frame_buffer.height, 0, 0,
+                          frame_buffer.width, frame_buffer.height, GL_COLOR_BUFFER_BIT,
+                          GL_NEAREST)
+
+
+def is_timer_query_supported():
+    """ Returns whether GL_TIME_ELAPSED query is supported in the current context. """
+    return gl_info.have_version(3, 3) or gl_info.have_extension('GL_ARB_timer_query')
+
+
+class TimerQueryRing(object):
+    """ Ring of GL_TIME_ELAPSED queries measuring GPU time without stalling.
+
+    Results are collected with poll() only after the GPU has finished them, so that
+    the measurement doesn't wait for the GPU. When all the queries are still pending,
+    the measurement is dropped. Queries are not shared between GL contexts, so the ring
+    should be used only in the context where it was created.
+
+    Arguments:
+      callback: Function called with (tag, duration in seconds) for each result.
+      size:     Integer, number of queries in the ring.
+    """
+
+    def __init__(self, callback, size=16):
+        self.callback = callback
+        self.size = size
+        self.queries = (GLuint * size)()
+        glGenQueries(size, self.queries)
+
+        self.next_index = 0
+        # (query index, tag) of the queries waiting for the result, in issued order.
+        self.pending = deque()
+        self.active = None
+        self.dropped_count = 0
+
+    def begin(self, tag):
+        if len(self.pending) == self.size:
+            self.poll()
+            if len(self.pending) == self.size:
+                self.dropped_count += 1
+                return
+
+        glBeginQuery(GL_TIME_ELAPSED, self.queries[self.next_index])
+        self.active = (self.next_index, tag)
+        self.next_index = (self.next_index + 1) % self.size
+
+    def end(self):
+        if self.active is None:
+            return
+        glEndQuery(GL_TIME_ELAPSED)
+        self.pending.append(self.active)
+        self.active = None
+
+    def poll(self):
+        """ Collect the finished results without blocking. """
+        available = GLint(0)
+        elapsed = GLuint64(0)
+
+        # Queries finish in the issued order.
+        while len(self.pending) > 0:
+            index, tag = self.pending[0]
+            query = self.queries[index]
+            glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, byref(available))
+            if not available.value:
+                break
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, byref(elapsed))
+            self.pending.popleft()
+            self.callback(tag, elapsed.value * 1e-9)
+
+    def delete(self):
+        glDeleteQueries(self.size, self.queries)
+        self.pending.clear()
+        self.active = None
+
+
+# Rendering pipelines
+RENDERER_FIXED = 'fixed'
+RENDERER_SHADER = 'shader'
+# Observation warped on CPU (oculoenv.warp). Contents are still rendered with GL.
+RENDERER_WARP = 'warp'
+
+WHITE_COLOR = np.array([1.0, 1.0, 1.0])
+
+
+def ortho_matrix(left, right, bottom, top, near, far):
+    """ Returns the same projection matrix as glOrtho(). (Row major) """
+    m = np.identity(4, dtype=np.float32)
+    m[0, 0] = 2.0 / (right - left)
+    m[1, 1] = 2.0 / (top - bottom)
+    m[2, 2] = -2.0 / (far - near)
+    m[0, 3] = -(right + left) / (right - left)
+    m[1, 3] = -(top + bottom) / (top - bottom)
+    m[2, 3] = -(far + near) / (far - near)
+    return m
+
+
+def perspective_matrix(fov_y, aspect, near, far):
+    """ Returns the same projection matrix as gluPerspective(). (Row major)
+
+    Arguments:
+      fov_y: Float, vertical field of view angle (degree).
+    """
+    f = 1.0 / math.tan(math.radians(fov_y) / 2.0)
+    m = np.zeros((4, 4), dtype=np.float32)
+    m[0, 0] = f / aspect
+    m[1, 1] = f
+    m[2, 2] = (far + near) / (near - far)
+    m[2, 3] = 2.0 * far * near / (near - far)
+    m[3, 2] = -1.0
+    return m
+
+
+def model_matrix(pos, scale, rot_degree=0.0, rot_axis=2):
+    """ Returns the matrix of glTranslatef(pos), glScalef(scale) and glRotatef(rot_degree)
+    around x, y or z axis (rot_axis = 0, 1 or 2) applied in this order. (Row major)
+    """
+    m = np.identity(4, dtype=np.float32)
+    if rot_degree != 0.0:
+        s = math.sin(math.radians(rot_degree))
+        c = math.cos(math.radians(rot_degree))
+        i = (rot_axis + 1) % 3
+        j = (rot_axis + 2) % 3
+        m[i, i] = c
+        m[i, j] = -s
+        m[j, i] = s
+        m[j, j] = c
+    m[:3, :3] *= scale
+    m[:3, 3] = pos
+    return m
+
+
+def compile_shader(shader_type, source):
+    shader = glCreateShader(shader_type)
+    source_buffer = create_string_buffer(source.encode('utf-8'))
+    source_pointer = cast(pointer(pointer(source_buffer)), POINTER(POINTER(GLchar)))
+    glShaderSource(shader, 1, source_pointer, None)
+    glCompileShader(shader)
+
+    status = GLint(0)
+    glGetShaderiv(shader, GL_COMPILE_STATUS, byref(status))
+    if not status.value:
+        log = create_string_buffer(4096)
+        glGetShaderInfoLog(shader, 4096, None, log)
+        glDeleteShader(shader)
+        raise RuntimeError("Shader compile error: {}".format(log.value.decode('utf-8')))
+    return shader
+
+
+class ShaderProgram(object):
+    """ GLSL program object.
+
+    Arguments:
+      vertex_source:   String, vertex shader source.
+      fragment_source: String, fragment shader source.
+    """
+
+    def __init__(self, vertex_source, fragment_source):
+        vertex_shader = compile_shader(GL_VERTEX_SHADER, vertex_source)
+        fragment_shader = compile_shader(GL_FRAGMENT_SHADER, fragment_source)
+
+        self.program = glCreateProgram()
+        glAttachShader(self.program, vertex_shader)
+        glAttachShader(self.program, fragment_shader)
+        glLinkProgram(self.program)
+
+        # Shaders are kept alive by the program
+        glDeleteShader(vertex_shader)
+        glDeleteShader(fragment_shader)
+
+        status = GLint(0)
+        glGetProgramiv(self.program, GL_LINK_STATUS, byref(status))
+        if not status.value:
+            log = create_string_buffer(4096)
+            glGetProgramInfoLog(self.program, 4096, None, log)
+            raise RuntimeError("Shader link error: {}".format(log.value.decode('utf-8')))
+
+        self.uniform_locations = {}
+
+    def use(self):
+        glUseProgram(self.program)
+
+    def get_uniform_location(self, name):
+        location = self.uniform_locations.get(name)
+        if location is None:
+            location = glGetUniformLocation(self.program,
+                                            create_string_buffer(name.encode('utf-8')))
+            self.uniform_locations[name] = location
+        return location
+
+    def set_matrix(self, name, m):
+        """ Set mat4 uniform with row major numpy matrix. """
+        m = np.ascontiguousarray(m, dtype=np.float32)
+        # Transposed by GL, since GL expects column major order.
+        glUniformMatrix4fv(self.get_uniform_location(name), 1, GL_TRUE,
+                           m.ctypes.data_as(POINTER(GLfloat)))
+
+    def set_vec3(self, name, v):
+        glUniform3f(self.get_uniform_location(name), v[0], v[1], v[2])
+
+    def set_int(self, name, value):
+        glUniform1i(self.get_uniform_location(name), value)
+
+    def delete(self):
+        glDeleteProgram(self.program)
+
+
+class VertexArray(object):
+    """ Vertex array object with an interleaved float32 vertex buffer.
+
+    Vertex array objects are not shared between GL contexts, so this should be drawn
+    only in the context where it was created.
+
+    Arguments:
+      data:       Float array (vertex size, stride), interleaved vertex attributes.
+      attributes: List of (attribute location, component size) in the interleaved order.
+      indices:    Integer array, vertex indices to draw. (None to draw all the vertices)
+    """
+
+    def __init__(self, data, attributes, indices=None):
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        self.vertex_size = data.shape[0]
+        self.index_size = None
+
+        self.vao = GLuint(0)
+        glGenVertexArrays(1, byref(self.vao))
+        glBindVertexArray(self.vao)
+
+        self.vbo = GLuint(0)
+        glGenBuffers(1, byref(self.vbo))
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data.ctypes.data_as(POINTER(GLfloat)),
+                     GL_STATIC_DRAW)
+
+        stride = data.shape[1] * 4
+        offset = 0
+        for location, size in attributes:
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, offset)
+            offset += size * 4
+
+        if indices is not None:
+            indices = np.ascontiguousarray(indices, dtype=np.uint32)
+            self.index_size = len(indices)
+
+            # Element array buffer binding is stored in the vertex array object
+            self.ibo = GLuint(0)
+            glGenBuffers(1, byref(self.ibo))
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes,
+                         indices.ctypes.data_as(POINTER(GLuint)), GL_STATIC_DRAW)
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, mode):
+        glBindVertexArray(self.vao)
+        if self.index_size is not None:
+            glDrawElements(mode, self.index_size, GL_UNSIGNED_INT, None)
+        else:
+            glDrawArrays(mode, 0, self.vertex_size)
+
+    def delete(self):
+        glDeleteBuffers(1, byref(self.vbo))
+        if self.index_size is not None:
+            glDeleteBuffers(1, byref(self.ibo))
+        glDeleteVertexArrays(1, byref(self.vao))
+
+
+# Attribute locations of the shader program
+ATTRIB_POSITION = 0
+ATTRIB_TEXCOORD = 1
+ATTRIB_COLOR = 2
+
+# Attributes of the vertex data (position, texcoord, color)
+VERTEX_ATTRIBUTES = [(ATTRIB_POSITION, 3), (ATTRIB_TEXCOORD, 2), (ATTRIB_COLOR, 3)]
+
+VERTEX_SHADER_SOURCE = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec2 texcoord;
+layout(location = 2) in vec3 color;
+
+uniform mat4 mvp;
+uniform vec3 base_color;
+
+out vec2 v_texcoord;
+out vec3 v_color;
+
+void main() {
+    gl_Position = mvp * vec4(position, 1.0);
+    v_texcoord = texcoord;
+    v_color = color * base_color;
+}
+"""
+
+FRAGMENT_SHADER_SOURCE = """
+#version 330 core
+in vec2 v_texcoord;
+in vec3 v_color;
+
+uniform sampler2D tex;
+uniform int use_texture;
+
+out vec4 frag_color;
+
+void main() {
+    vec4 tex_color = use_texture != 0 ? texture(tex, v_texcoord) : vec4(1.0);
+    frag_color = tex_color * vec4(v_color, 1.0);
+}
+"""
+
+# Quad of the sprite drawn with GL_TRIANGLE_FAN (position, texcoord, color)
+QUAD_VERTEX_DATA = [
+    [-1,  1, 0, 0, 1, 1, 1, 1],
+    [-1, -1, 0, 0, 0, 1, 1, 1],
+    [ 1, -1, 0, 1, 0, 1, 1, 1],
+    [ 1,  1, 0, 1, 1, 1, 1, 1],
+]
+
+
+class FixedFunctionRenderer(object):
+    """ Sprite renderer with fixed-function pipeline. """
+
+    def __init__(self):
+        verts = [
+            -1,  1, 0,
+            -1, -1, 0,
+             1, -1, 0,
+             1,  1, 0,
+        ]
+        texcs = [
+            0, 1,
+            0, 0,
+            1, 0,
+            1, 1,
+        ]
+        self.quad_vlist = pyglet.graphics.vertex_list(4, ('v3f', verts), ('t2f', texcs))
+
+    def begin(self, projection_mat):
+        """ Start drawing sprites.
+
+        Arguments:
+          projection_mat: Numpy ndarray (4, 4), row major projection matrix.
+        """
+        glMatrixMode(GL_PROJECTION)
+        glLoadMatrixf(np.ascontiguousarray(projection_mat.T, dtype=np.float32).ctypes.data_as(
+            POINTER(GLfloat)))
+
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+
+        glEnable(GL_TEXTURE_2D)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+
+        glColor3f(*WHITE_COLOR)
+
+    def draw_sprite(self, tex, pos_x, pos_y, pos_z=0.0, width=1.0, rot_index=0,
+                    color=WHITE_COLOR):
+        """ Draw textured quad sprite.
+
+        Arguments:
+          tex:       Texture object
+          pos_x, pos_y, pos_z: Float, position of the sprite
+          width:     Float, half width of the sprite
+          rot_index: Integer, rotation angle index (0=0 degree, 1=90 degree, etc...)
+          color:     Float Array[3], color for the texture
+        """
+        glColor3f(*color)
+
+        glPushMatrix()
+        glTranslatef(pos_x, pos_y, pos_z)
+        glScalef(width, width, width)
+        if rot_index != 0:
+            glRotatef(rot_index * 90.0, 0.0, 0.0, 1.0)
+        glBindTexture(tex.target, tex.id)
+        self.quad_vlist.draw(GL_QUADS)
+        glPopMatrix()
+
+    def end(self):
+        pass
+
+
+class ShaderRenderer(object):
+    """ Renderer with a shader program and vertex array objects, using only the calls
+    available in the OpenGL core profile.
+
+    Sprites are drawn with the same interface as FixedFunctionRenderer. Meshes are drawn
+    with draw().
+    """
+
+    def __init__(self):
+        self.program = ShaderProgram(VERTEX_SHADER_SOURCE, FRAGMENT_SHADER_SOURCE)
+        self.quad = VertexArray(QUAD_VERTEX_DATA, VERTEX_ATTRIBUTES)
+        self.view_projection_mat = np.identity(4, dtype=np.float32)
+
+    def begin(self, view_projection_mat):
+        """ Start drawing.
+
+        Arguments:
+          view_projection_mat: Numpy ndarray (4, 4), row major projection * view matrix.
+        """
+        self.view_projection_mat = view_projection_mat
+        self.program.use()
+        self.program.set_int('tex', 0)
+        glActiveTexture(GL_TEXTURE0)
+
+    def draw(self, vertex_array, mode, model_mat, tex_id=None, color=WHITE_COLOR):
+        """ Draw vertex array.
+
+        Arguments:
+          vertex_array: VertexArray object with VERTEX_ATTRIBUTES.
+          mode:         GL primitive mode.
+          model_mat:    Numpy ndarray (4, 4), row major model matrix.
+          tex_id:       Integer, GL_TEXTURE_2D texture id. (None for no texture)
+          color:        Float Array[3], color multiplied to the vertex color.
+        """
+        program = self.program
+        program.set_matrix('mvp', self.view_projection_mat.dot(model_mat))
+        program.set_vec3('base_color', color)
+        if tex_id is not None:
+            glBindTexture(GL_TEXTURE_2D, tex_id)
+            program.set_int('use_texture', 1)
+        else:
+            program.set_int('use_texture', 0)
+        vertex_array.draw(mode)
+
+    def draw_sprite(self, tex, pos_x, pos_y, pos_z=0.0, width=1.0, rot_index=0,
+                    color=WHITE_COLOR):
+        """ Draw textured quad sprite. (See FixedFunctionRenderer.draw_sprite()) """
+        model_mat = model_matrix((pos_x, pos_y, pos_z), width, rot_index * 90.0)
+        self.draw(self.quad, GL_TRIANGLE_FAN, model_mat, tex.id, color)
+
+    def end(self):
+        glBindVertexArray(0)
+        glUseProgram(0)
+
+    def delete(self):
+        self.quad.delete()
+        self.program.delete()
+
+
+def create_renderer(renderer):
+    """ Create renderer for the current GL context.
+
+    Arguments:
+      renderer: String, RENDERER_FIXED or RENDERER_SHADER.
+    """
+    if renderer == RENDERER_SHADER:
+        return ShaderRenderer()
+    elif renderer == RENDERER_FIXED:
+        return FixedFunctionRenderer()
+    else:
+        raise ValueError("Unknown renderer: {}".format(renderer))
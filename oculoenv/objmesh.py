@@ -5,12 +5,218 @@ from __future__ import print_function
 
 import os
 import math
+import tempfile
 import numpy as np
 import pyglet
 from .graphics import *
 from .utils import *
 
 
+# Version of the cache format. Increment when the cached arrays change.
+CACHE_VERSION = 1
+
+CACHE_SUFFIX = '.cache.npz'
+
+
+def load_mtl(mtl_path):
+    """ Load diffuse colors of the materials in .mtl file.
+
+    Returns:
+      Dictionary of material name to dictionary with 'Kd' color.
+    """
+    materials = {}
+    cur_mtl = None
+
+    with open(mtl_path, 'r') as mtl_file:
+        for line in mtl_file:
+            tokens = line.split()
+
+            # Skip comments and empty lines
+            if len(tokens) == 0 or tokens[0].startswith('#'):
+                continue
+
+            if tokens[0] == 'newmtl':
+                cur_mtl = {}
+                materials[tokens[1]] = cur_mtl
+
+            if tokens[0] == 'Kd':
+                cur_mtl['Kd'] = np.array(tokens[1:], dtype=np.float64)
+
+    return materials
+
+
+def _parse_floats(lines, size):
+    """ Parse lines of whitespace separated values into (len(lines), size) array. """
+    if len(lines) == 0:
+        return np.zeros((0, size), dtype=np.float32)
+    values = np.array(' '.join(lines).split(), dtype=np.float32)
+    # Extra values (e.g. optional w of 'v' or 'vt') are dropped.
+    return values.reshape(len(lines), -1)[:, :size]
+
+
+def _parse_face_indices(face_lines):
+    """ Parse 'f' lines into (num_faces, 3, index size) array of 1-based indices. """
+    tokens = ' '.join(face_lines).split()
+    assert len(tokens) == 3 * len(face_lines), "only triangle faces are supported"
+
+    # 'v/t/n' has 3 indices, 'v//n' has 2 indices.
+    values = ' '.join(tokens).replace('//', '/').replace('/', ' ').split()
+    if len(values) % len(tokens) == 0:
+        index_size = len(values) // len(tokens)
+        assert index_size == 2 or index_size == 3
+        indices = np.array(values, dtype=np.int64)
+        return [indices.reshape(len(face_lines), 3, index_size)]
+
+    # Faces with different formats are parsed separately by the format.
+    indices = [np.array(token.replace('//', '/').split('/'), dtype=np.int64)
+               for token in tokens]
+    return indices
+
+
+def load_obj(file_path):
+    """ Load .obj file (and .mtl file next to it) into per-vertex arrays of the faces.
+
+    Returns:
+      Tuple of float32 arrays (3 * num_faces, N) for vertices, normals, texture
+      coordinates and colors.
+    """
+    mtl_path = os.path.splitext(file_path)[0] + '.mtl'
+    materials = load_mtl(mtl_path) if os.path.exists(mtl_path) else {}
+
+    with open(file_path, 'r') as mesh_file:
+        lines = [line.strip() for line in mesh_file]
+
+    verts = _parse_floats([l[2:] for l in lines if l.startswith('v ')], 3)
+    texs = _parse_floats([l[3:] for l in lines if l.startswith('vt ')], 2)
+    normals = _parse_floats([l[3:] for l in lines if l.startswith('vn ')], 3)
+
+    # Color of each face by the material of the last 'usemtl' before it
+    face_line_indices = []
+    face_lines = []
+    mtl_line_indices = []
+    mtl_colors = []
+    for i, line in enumerate(lines):
+        if line.startswith('f '):
+            face_line_indices.append(i)
+            face_lines.append(line[2:])
+        elif line.startswith('usemtl'):
+            mtl_name = line.split()[1]
+            mtl_line_indices.append(i)
+            mtl = materials.get(mtl_name)
+            mtl_colors.append(mtl['Kd'] if mtl else np.ones(3))
+
+    num_faces = len(face_lines)
+
+    # White for the faces before any 'usemtl'
+    colors = np.array([np.ones(3)] + mtl_colors, dtype=np.float32)
+    face_mtls = np.searchsorted(mtl_line_indices, face_line_indices)
+    list_color = np.repeat(colors[face_mtls], 3, axis=0)
+
+    list_verts = np.zeros(shape=(3 * num_faces, 3), dtype=np.float32)
+    list_norms = np.zeros(shape=(3 * num_faces, 3), dtype=np.float32)
+    list_texcs = np.zeros(shape=(3 * num_faces, 2), dtype=np.float32)
+
+    if num_faces > 0:
+        face_indices = _parse_face_indices(face_lines)
+        if len(face_indices) == 1:
+            # Note: OBJ uses 1-based indexing
+            indices = face_indices[0].reshape(3 * num_faces, -1) - 1
+            list_verts[:] = verts[indices[:, 0]]
+            list_norms[:] = normals[indices[:, -1]]
+            if indices.shape[1] == 3:
+                list_texcs[:] = texs[indices[:, 1]]
+        else:
+            for i, indices in enumerate(face_indices):
+                assert len(indices) == 2 or len(indices) == 3
+                list_verts[i] = verts[indices[0] - 1]
+                list_norms[i] = normals[indices[-1] - 1]
+                if len(indices) == 3:
+                    list_texcs[i] = texs[indices[1] - 1]
+
+    return list_verts, list_norms, list_texcs, list_color
+
+
+def get_indexed_vertices(arrays):
+    """ Deduplicate vertices with the same attributes.
+
+    Arguments:
+      arrays: List of float32 arrays (N, *), per-vertex attributes.
+    Returns:
+      List of arrays of the unique vertices, and uint32 index array (N,) into them.
+    """
+    keys = np.hstack(arrays)
+    _, first_indices, inverse = np.unique(keys, axis=0, return_index=True,
+                                          return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    # Keep the unique vertices in the order of the first appearance
+    order = np.argsort(first_indices)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    unique_indices = first_indices[order]
+    vertices = [array[unique_indices] for array in arrays]
+    return vertices, rank[inverse].astype(np.uint32)
+
+
+def _get_source_mtimes(file_path):
+    mtl_path = os.path.splitext(file_path)[0] + '.mtl'
+    mtl_mtime = os.path.getmtime(mtl_path) if os.path.exists(mtl_path) else 0.0
+    return np.array([os.path.getmtime(file_path), mtl_mtime])
+
+
+def _replace_file(src_path, dst_path):
+    if hasattr(os, 'replace'):
+        os.replace(src_path, dst_path)
+    else:
+        # Python 2 can't rename over an existing file on Windows.
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        os.rename(src_path, dst_path)
+
+
+def load_obj_cached(file_path):
+    """ Load .obj file with load_obj(), using binary cache saved next to the file.
+
+    The cache is used only when it was saved from the .obj and .mtl files with the
+    same modification times.
+    """
+    cache_path = file_path + CACHE_SUFFIX
+    mtimes = _get_source_mtimes(file_path)
+
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cache:
+                if int(cache['version']) == CACHE_VERSION and \
+                   np.array_equal(cache['mtimes'], mtimes):
+                    return cache['verts'], cache['norms'], cache['texcs'], cache['colors']
+        except Exception:
+            # Broken or truncated cache is regenerated.
+            pass
+
+    verts, norms, texcs, colors = load_obj(file_path)
+
+    try:
+        # Write into a unique temporary file and rename it, not to leave a broken
+        # cache when several processes load the same mesh.
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp',
+                                           dir=os.path.dirname(os.path.abspath(cache_path)))
+    except (IOError, OSError):
+        # The mesh directory may not be writable.
+        return verts, norms, texcs, colors
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, version=CACHE_VERSION, mtimes=mtimes,
+                     verts=verts, norms=norms, texcs=texcs, colors=colors)
+        _replace_file(temp_path, cache_path)
+    except (IOError, OSError):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return verts, norms, texcs, colors
+
+
 class ObjMesh(object):
     """
     Load and render wavefront .OBJ model files
@@ -45,123 +251,31 @@ class ObjMesh(object):
         - only triangle faces
         """
 
-        # Comments
-        # mtllib file_name
-        # o object_name
-        # v x y z
-        # vt u v
-        # vn x y z
-        # usemtl mtl_name
-        # f v0/t0/n0 v1/t1/n1 v2/t2/n2
-
-        # Attempt to load the materials library
-        materials = self._load_mtl(file_path)
-
-        mesh_file = open(file_path, 'r')
-
-        verts = []
-        texs = []
-        normals = []
-        faces = []
-        face_mtls = []
-
-        cur_mtl = None
-
-        # For each line of the input file
-        for line in mesh_file:
-            line = line.rstrip(' \r\n')
-
-            # Skip comments
-            if line.startswith('#') or line == '':
-                continue
-
-            tokens = line.split(' ')
-            tokens = map(lambda t: t.strip(' '), tokens)
-            tokens = list(filter(lambda t: t != '', tokens))
-
-            prefix = tokens[0]
-            tokens = tokens[1:]
-
-            if prefix == 'v':
-                vert = list(map(lambda v: float(v), tokens))
-                verts.append(vert)
-
-            if prefix == 'vt':
-                tc = list(map(lambda v: float(v), tokens))
-                texs.append(tc)
-
-            if prefix == 'vn':
-                normal = list(map(lambda v: float(v), tokens))
-                normals.append(normal)
-
-            if prefix == 'usemtl':
-                mtl_name = tokens[0]
-                cur_mtl = materials[
-                    mtl_name] if mtl_name in materials else None
-
-            if prefix == 'f':
-                assert len(tokens) == 3, "only triangle faces are supported"
-
-                face = []
-                for token in tokens:
-                    indices = filter(lambda t: t != '', token.split('/'))
-                    indices = list(map(lambda idx: int(idx), indices))
-                    assert len(indices) == 2 or len(indices) == 3
-                    face.append(indices)
-
-                faces.append(face)
-                face_mtls.append(cur_mtl)
-
-        mesh_file.close()
-
-        self.num_faces = len(faces)
-
-        # Create numpy arrays to store the vertex data
-        list_verts = np.zeros(shape=(3 * self.num_faces, 3), dtype=np.float32)
-        list_norms = np.zeros(shape=(3 * self.num_faces, 3), dtype=np.float32)
-        list_texcs = np.zeros(shape=(3 * self.num_faces, 2), dtype=np.float32)
-        list_color = np.zeros(shape=(3 * self.num_faces, 3), dtype=np.float32)
-
-        cur_vert_idx = 0
-
-        # For each triangle
-        for f_idx, face in enumerate(faces):
-            # Get the color for this face
-            f_mtl = face_mtls[f_idx]
-            f_color = f_mtl['Kd'] if f_mtl else np.array((1, 1, 1))
-
-            # For each tuple of indices
-            for indices in face:
-                # Note: OBJ uses 1-based indexing
-                # and texture coordinates are optional
-                if len(indices) == 3:
-                    v_idx, t_idx, n_idx = indices
-                    vert = verts[v_idx - 1]
-                    texc = texs[t_idx - 1]
-                    normal = normals[n_idx - 1]
-                else:
-                    v_idx, n_idx = indices
-                    vert = verts[v_idx - 1]
-                    normal = normals[n_idx - 1]
-                    texc = [0, 0]
-
-                list_verts[cur_vert_idx, :] = vert
-                list_texcs[cur_vert_idx, :] = texc
-                list_norms[cur_vert_idx, :] = normal
-                list_color[cur_vert_idx, :] = f_color
-
-                # Move to the next vertex
-                cur_vert_idx += 1
+        # Per-vertex arrays of the faces, loaded from the binary cache when it's valid
+        list_verts, list_norms, list_texcs, list_color = load_obj_cached(file_path)
+        self.num_faces = len(list_verts) // 3
 
         # Recompute the object extents after centering
         self.min_coords = list_verts.min(axis=0)
         self.max_coords = list_verts.max(axis=0)
 
-        # Create a vertex list to be used for rendering
-        self.vlist = pyglet.graphics.vertex_list(
-            3 * self.num_faces, ('v3f', list_verts.reshape(-1)),
-            ('t2f', list_texcs.reshape(-1)), ('n3f', list_norms.reshape(-1)),
-            ('c3f', list_color.reshape(-1)))
+        # Share the vertices with the same attributes between the faces
+        vertices, indices = get_indexed_vertices(
+            [list_verts, list_texcs, list_norms, list_color])
+        verts, texcs, norms, colors = vertices
+        self.num_vertices = len(verts)
+        self.indices = indices
+
+        # Interleaved (position, texcoord, color) vertex data for the shader pipeline
+        self.vertex_data = np.hstack([verts, texcs, colors])
+        # VertexArray objects for each GL context
+        self.vertex_arrays = {}
+
+        # Create an indexed vertex list to be used for rendering
+        self.vlist = pyglet.graphics.vertex_list_indexed(
+            self.num_vertices, indices.tolist(), ('v3f', verts.reshape(-1)),
+            ('t2f', texcs.reshape(-1)), ('n3f', norms.reshape(-1)),
+            ('c3f', colors.reshape(-1)))
 
         # Load the texture associated with this mesh
         file_name = os.path.split(file_path)[-1]
@@ -174,46 +288,14 @@ class ObjMesh(object):
         else:
             self.texture = None
 
-    def _load_mtl(self, model_path):
-        mtl_path = model_path.split('.')[0] + '.mtl'
-
-        if not os.path.exists(mtl_path):
-            return {}
-
-        #print('loading materials from "%s"' % mtl_path)
-
-        mtl_file = open(mtl_path, 'r')
-
-        materials = {}
-        cur_mtl = None
-
-        # For each line of the input file
-        for line in mtl_file:
-            line = line.rstrip(' \r\n')
-
-            # Skip comments
-            if line.startswith('#') or line == '':
-                continue
-
-            tokens = line.split(' ')
-            tokens = map(lambda t: t.strip(' '), tokens)
-            tokens = list(filter(lambda t: t != '', tokens))
-
-            prefix = tokens[0]
-            tokens = tokens[1:]
-
-            if prefix == 'newmtl':
-                cur_mtl = {}
-                materials[tokens[0]] = cur_mtl
-
-            if prefix == 'Kd':
-                vals = list(map(lambda v: float(v), tokens))
-                vals = np.array(vals)
-                cur_mtl['Kd'] = vals
-
-        mtl_file.close()
-
-        return materials
+    def get_vertex_array(self):
+        """ Returns VertexArray of the mesh for the current GL context. """
+        context = pyglet.gl.current_context
+        vertex_array = self.vertex_arrays.get(context)
+        if vertex_array is None:
+            vertex_array = VertexArray(self.vertex_data, VERTEX_ATTRIBUTES, self.indices)
+            self.vertex_arrays[context] = vertex_array
+        return vertex_array
 
     def render(self):
         if self.texture:
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import timeit
+
+import numpy as np
+
+# Stages of Environment.step() measured by the profiler
+STAGE_CONTENT_STEP = 'content_step'
+STAGE_CONTENT_RENDER = 'content_render'
+STAGE_RENDER_SCENE = 'render_scene'
+STAGE_READ_PIXELS = 'read_pixels'
+STAGE_FLIP = 'flip'
+
+STAGES = [
+    STAGE_CONTENT_STEP, STAGE_CONTENT_RENDER, STAGE_RENDER_SCENE, STAGE_READ_PIXELS,
+    STAGE_FLIP
+]
+
+# GPU time of the render passes measured with GL timer queries
+STAGE_GPU_CONTENT_RENDER = 'gpu_content_render'
+STAGE_GPU_RENDER_SCENE = 'gpu_render_scene'
+
+GPU_STAGES = [STAGE_GPU_CONTENT_RENDER, STAGE_GPU_RENDER_SCENE]
+
+# Histogram bucket i counts durations in [2^(i-1), 2^i) microseconds.
+# (The first bucket is below 1us, and the last one is above 2^30us)
+HISTOGRAM_SIZE = 32
+
+
+class StageStats(object):
+    """ Duration counters and log2 histogram of a stage. """
+
+    __slots__ = ['count', 'total', 'min', 'max', 'histogram']
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.histogram = np.zeros(HISTOGRAM_SIZE, dtype=np.int64)
+
+    def add(self, duration):
+        """ Add a duration (sec). """
+        self.count += 1
+        self.total += duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+
+        # Exponent of the duration in microseconds
+        bucket = math.frexp(duration * 1000000.0)[1]
+        self.histogram[min(max(bucket, 0), HISTOGRAM_SIZE - 1)] += 1
+
+    def to_dict(self):
+        count = self.count
+        return {
+            'count': count,
+            'total_ms': self.total * 1000.0,
+            'mean_ms': self.total * 1000.0 / count if count > 0 else 0.0,
+            'min_ms': self.min * 1000.0 if count > 0 else 0.0,
+            'max_ms': self.max * 1000.0,
+            'histogram': self.histogram.tolist(),
+        }
+
+
+class Profiler(object):
+    """ Per-stage timing of the environment.
+
+    The profiler doesn't hook anything by itself. The environment replaces the
+    methods of each stage with the ones wrapped by timed(), so that no cost is added
+    while the profiling is disabled.
+    """
+
+    def __init__(self):
+        self.stats = dict((stage, StageStats()) for stage in STAGES + GPU_STAGES)
+
+    def add(self, stage, duration):
+        """ Add a duration (sec) to the stage. """
+        self.stats[stage].add(duration)
+
+    def timed(self, stage, func):
+        """ Wrap the function to add its duration to the stage. """
+        stats = self.stats[stage]
+        timer = timeit.default_timer
+
+        def timed_func(*args, **kwargs):
+            start = timer()
+            ret = func(*args, **kwargs)
+            stats.add(timer() - start)
+            return ret
+
+        return timed_func
+
+    def get_stats(self):
+        """ Returns dictionary of the stats for each stage.
+
+        Returns:
+          Dictionary of stage name to dictionary with 'count', 'total_ms', 'mean_ms',
+          'min_ms', 'max_ms' and 'histogram' (list of counts, where bucket i counts
+          durations in [2^(i-1), 2^i) microseconds).
+        """
+        return dict((stage, stats.to_dict()) for stage, stats in self.stats.items())
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.reset()
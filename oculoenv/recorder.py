@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .environment import Environment
+from .contents import get_content_class
+
+# Max value of the episode seed
+MAX_SEED = 2**31 - 1
+
+
+class EpisodeLog(object):
+    """ Actions, rewards and info of an episode, stored in fixed size chunks.
+
+    Arguments:
+      chunk_size: Integer, number of steps stored in one chunk.
+    """
+
+    def __init__(self, chunk_size=1024):
+        self.chunk_size = chunk_size
+        self.action_chunks = []
+        self.reward_chunks = []
+        self.done_chunks = []
+        self.step_count = 0
+
+        # Step indices and JSON strings of non-empty info
+        self.info_steps = []
+        self.info_jsons = []
+
+    def append(self, action, reward, done, info):
+        index = self.step_count % self.chunk_size
+        if index == 0:
+            self.action_chunks.append(np.zeros((self.chunk_size, 2), dtype=np.float64))
+            self.reward_chunks.append(np.zeros(self.chunk_size, dtype=np.float64))
+            self.done_chunks.append(np.zeros(self.chunk_size, dtype=np.bool_))
+
+        self.action_chunks[-1][index] = action
+        self.reward_chunks[-1][index] = reward
+        self.done_chunks[-1][index] = done
+
+        if info:
+            self.info_steps.append(self.step_count)
+            self.info_jsons.append(json.dumps(info, sort_keys=True))
+
+        self.step_count += 1
+
+    def _concat(self, chunks):
+        if len(chunks) == 0:
+            return np.zeros(0)
+        return np.concatenate(chunks)[:self.step_count]
+
+    def get_arrays(self):
+        """ Returns dictionary of numpy arrays to be saved. """
+        return {
+            'actions': self._concat(self.action_chunks).reshape(-1, 2),
+            'rewards': self._concat(self.reward_chunks),
+            'dones': self._concat(self.done_chunks).astype(np.bool_),
+            'info_steps': np.array(self.info_steps, dtype=np.int32),
+            'info_jsons': np.array(self.info_jsons, dtype=np.str_),
+        }
+
+
+class EpisodeRecorder(object):
+    """ Environment wrapper which records seed, actions, rewards and info of each episode
+    into a compact .npz file, instead of rendered frames.
+
+    Each episode is seeded at reset(), so that it can be re-simulated with
+    EpisodeReplayer.
+
+    Arguments:
+      env:        Environment object to record.
+      log_dir:    String, directory to write episode files.
+      seed:       Integer, seed to draw episode seeds from. (None to seed from OS entropy)
+      chunk_size: Integer, number of steps stored in one chunk.
+    """
+
+    def __init__(self, env, log_dir, seed=None, chunk_size=1024):
+        assert env.content.trial_bank is None, "Recording with trial bank is not supported"
+
+        self.env = env
+        self.log_dir = log_dir
+        self.chunk_size = chunk_size
+        self.seed_rng = np.random.RandomState(seed)
+
+        self.episode_index = 0
+        self.episode_seed = None
+        self.log = None
+
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+    def reset(self):
+        """ Save the current episode and start a new seeded episode. """
+        self._save_episode()
+
+        self.episode_seed = int(self.seed_rng.randint(MAX_SEED))
+        self.env.seed(self.episode_seed)
+        self.log = EpisodeLog(self.chunk_size)
+        return self.env.reset()
+
+    def step(self, action):
+        if self.log is None:
+            # Episode before the first reset() can't be replayed.
+            raise RuntimeError("reset() should be called before step()")
+
+        obs, reward, done, info = self.env.step(action)
+        self.log.append(action, reward, done, info)
+        return obs, reward, done, info
+
+    def close(self):
+        self._save_episode()
+        self.env.close()
+
+    def __getattr__(self, name):
+        # Delegate other attributes (action_space, render() etc.) to the environment.
+        return getattr(self.env, name)
+
+    def get_episode_path(self, episode_index):
+        return os.path.join(self.log_dir, 'episode_%06d.npz' % episode_index)
+
+    def _save_episode(self):
+        if self.log is None:
+            return
+
+        content = self.env.content
+        np.savez_compressed(
+            self.get_episode_path(self.episode_index),
+            seed=self.episode_seed,
+            content_name=type(content).__name__,
+            difficulty=getattr(content, 'difficulty', -1),
+            off_buffer_width=self.env.frame_buffer_off.width,
+            **self.log.get_arrays())
+
+        self.episode_index += 1
+        self.log = None
+
+
+class EpisodeReplayer(object):
+    """ Re-simulate an episode recorded with EpisodeRecorder.
+
+    Arguments:
+      file_path: String, path of the episode .npz file.
+    """
+
+    def __init__(self, file_path):
+        data = np.load(file_path)
+
+        self.seed = int(data['seed'])
+        self.content_name = str(data['content_name'])
+        self.difficulty = int(data['difficulty'])
+        self.off_buffer_width = int(data['off_buffer_width'])
+        self.actions = data['actions']
+        self.rewards = data['rewards']
+        self.dones = data['dones']
+
+        self.infos = [{} for _ in range(len(self.actions))]
+        for step, info_json in zip(data['info_steps'], data['info_jsons']):
+            self.infos[step] = json.loads(str(info_json))
+
+    def create_env(self, off_buffer_width=None):
+        """ Create an environment with the recorded content.
+
+        Arguments:
+          off_buffer_width: Integer, observation size. (None to use the recorded size)
+        """
+        if off_buffer_width is None:
+            off_buffer_width = self.off_buffer_width
+
+        content_class = get_content_class(self.content_name)
+        content = content_class(difficulty=self.difficulty)
+        return Environment(content, off_buffer_width=off_buffer_width)
+
+    def replay(self, env=None, off_buffer_width=None, verify=True):
+        """ Re-simulate the episode.
+
+        Arguments:
+          env:              Environment object with the recorded content. (None to create new one)
+          off_buffer_width: Integer, observation size used when env is None.
+          verify:           Bool, whether to check rewards and info against the record.
+        Returns:
+          Generator of (obs, reward, done, info) for each step. The first item is the
+          result of reset() with (obs, 0, False, {}).
+        """
+        if env is None:
+            env = self.create_env(off_buffer_width)
+
+        env.seed(self.seed)
+        obs = env.reset()
+        yield obs, 0, False, {}
+
+        for i, action in enumerate(self.actions):
+            obs, reward, done, info = env.step(action)
+            if verify and (reward != self.rewards[i] or info != self.infos[i]):
+                raise RuntimeError("Replay diverged from the record at step {}".format(i))
+            yield obs, reward, done, info
+
+    def __len__(self):
+        return len(self.actions)
+
+
+def write_png(file_path, image):
+    """ Write RGB uint8 image (height, width, 3) into PNG file. """
+    height, width, _ = image.shape
+    # Each scanline starts with filter type byte (0 = None)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(chunk_type, data):
+        body = chunk_type + data
+        return struct.pack('>I', len(data)) + body + struct.pack(
+            '>I', zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    with open(file_path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', header))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+class FrameRecorder(object):
+    """ Record observation frames, compressing and writing them on a background thread.
+
+    Frames are copied into a ring of preallocated chunk buffers. When a chunk is full it
+    is handed to the writer thread, and add() blocks only when all the chunks are still
+    waiting to be written.
+
+    Arguments:
+      out_dir:    String, directory to write frame files.
+      chunk_size: Integer, number of frames in one chunk.
+      max_chunks: Integer, number of chunk buffers. (Bounds the memory usage)
+      image_format: String, 'npz' to write each chunk as compressed .npz file, or
+                  'png' to write each frame as .png file.
+    """
+
+    def __init__(self, out_dir, chunk_size=256, max_chunks=4, image_format='npz'):
+        assert image_format in ['npz', 'png']
+
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.image_format = image_format
+
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        # Chunk buffers are allocated with the first frame.
+        self.buffers = None
+        self.free_queue = queue.Queue()
+        self.write_queue = queue.Queue()
+        for i in range(max_chunks):
+            self.free_queue.put(i)
+
+        self.buffer_index = None
+        self.frame_pos = 0
+        self.chunk_index = 0
+        self.frame_count = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, frame):
+        """ Add a frame. Costs a copy into the chunk buffer. """
+        self._check_error()
+
+        if self.buffers is None:
+            self.buffers = [
+                np.empty((self.chunk_size,) + frame.shape, dtype=frame.dtype)
+                for _ in range(self.max_chunks)
+            ]
+        if self.buffer_index is None:
+            # Blocks when all the chunks are waiting to be written.
+            self.buffer_index = self.free_queue.get()
+
+        self.buffers[self.buffer_index][self.frame_pos] = frame
+        self.frame_pos += 1
+        self.frame_count += 1
+
+        if self.frame_pos == self.chunk_size:
+            self._submit()
+
+    def close(self):
+        """ Write remaining frames and wait for the writer thread. """
+        if self.buffer_index is not None:
+            self._submit()
+        self.write_queue.put(None)
+        self.thread.join()
+        self._check_error()
+
+    def _submit(self):
+        self.write_queue.put((self.buffer_index, self.frame_pos, self.chunk_index))
+        self.buffer_index = None
+        self.frame_pos = 0
+        self.chunk_index += 1
+
+    def _check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+
+            buffer_index, frame_size, chunk_index = item
+            frames = self.buffers[buffer_index][:frame_size]
+            try:
+                self._write_chunk(frames, chunk_index)
+            except Exception as e:
+                self.error = e
+            self.free_queue.put(buffer_index)
+
+    def _write_chunk(self, frames, chunk_index):
+        if self.image_format == 'npz':
+            file_path = os.path.join(self.out_dir, 'frames_%06d.npz' % chunk_index)
+            np.savez_compressed(file_path, frames=frames)
+        else:
+            first_frame_index = chunk_index * self.chunk_size
+            for i, frame in enumerate(frames):
+                file_path = os.path.join(self.out_dir,
+                                         'frame_%08d.png' % (first_frame_index + i))
+                write_png(file_path, frame)
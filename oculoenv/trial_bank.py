@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+class TrialBank(object):
+    """ Pre-generated trial parameters for a content.
+
+    Each trial is stored as one record of the content's `trial_dtype` structured
+    array, so that a bank of thousands of trials can be generated ahead of time,
+    saved into a .npz file and consumed sequentially by the content.
+
+    Arguments:
+      trials:       Numpy structured ndarray, trial records.
+      content_name: String, class name of the content that generated the trials.
+      difficulty:   Integer, difficulty of the content that generated the trials.
+    """
+
+    def __init__(self, trials, content_name=None, difficulty=None):
+        self.trials = trials
+        self.content_name = content_name
+        self.difficulty = difficulty
+        self.index = 0
+
+    @classmethod
+    def generate(cls, content, size, seed=None):
+        """ Generate trials with the content's own randomization.
+
+        Arguments:
+          content: (Content) object, which trial parameters are sampled from.
+          size:    Integer, number of trials to generate.
+          seed:    Integer, random seed for the generation. (None uses the content's random state)
+        Returns:
+          TrialBank
+        """
+        if content.trial_dtype is None:
+            raise ValueError("{} does not support trial bank".format(
+                type(content).__name__))
+
+        rng = content.rng
+        if seed is not None:
+            # Sample from a separate random state not to disturb the content's one.
+            content.rng = np.random.RandomState(seed)
+
+        trials = np.zeros(size, dtype=content.trial_dtype)
+        try:
+            for i in range(size):
+                trials[i] = content._sample_trial()
+        finally:
+            content.rng = rng
+        return cls(trials, type(content).__name__, content.difficulty)
+
+    @classmethod
+    def load(cls, file_path):
+        """ Load trials from .npz file saved with save(). """
+        data = np.load(file_path)
+        content_name = str(data['content_name'])
+        difficulty = int(data['difficulty']) if 'difficulty' in data.files else None
+        return cls(data['trials'], content_name, difficulty)
+
+    def save(self, file_path):
+        """ Save trials into .npz file. """
+        arrays = {}
+        if self.difficulty is not None:
+            arrays['difficulty'] = np.array(self.difficulty)
+        np.savez(file_path, trials=self.trials,
+                 content_name=np.array(self.content_name or ''), **arrays)
+
+    def next(self):
+        """ Returns next trial record. Wraps around to the first record at the end.
+
+        Returns:
+          Numpy structured record of the trial.
+        """
+        trial = self.trials[self.index]
+        self.index = (self.index + 1) % len(self.trials)
+        return trial
+
+    def rewind(self):
+        """ Move back to the first trial record. """
+        self.index = 0
+
+    def __len__(self):
+        return len(self.trials)
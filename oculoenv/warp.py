@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+""" CPU rendering of the observation image.
+
+The camera only rotates around the origin, so the observation is a homography of the
+content panel at PLANE_DISTANCE. Instead of the 3D pass on GL, the content image is
+resampled with the homography of the current camera rotation, and the scene objects
+around the panel are composited from a layer pre-rendered once.
+
+The layer is rendered from the origin looking straight at the panel, and each of its
+pixels holds the scene objects along the ray through the corresponding point on the
+panel plane. Since the rays from the origin don't depend on the camera rotation, the
+layer is valid for any camera pose.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import threading
+
+import numpy as np
+
+from .geom import rot_yx_matrices
+
+
+def _flatten(images):
+    """ Flatten images (..., height, width, channels) into rows of the pixels.
+
+    Uint8 RGBA pixels are packed into 32bit values, since np.take() of a 1D array is
+    much faster than the one of the rows.
+    """
+    if images.dtype == np.uint8 and images.shape[-1] == 4:
+        return np.ascontiguousarray(images).view(np.uint32).reshape(-1)
+    return images.reshape(-1, images.shape[-1])
+
+
+def _gather(flat, index):
+    # np.take() is much faster than the fancy indexing for gathering rows.
+    if flat.ndim == 1:
+        # Packed RGBA
+        return np.take(flat, index).view(np.uint8).reshape(-1, 4)
+    return np.take(flat, index, axis=0)
+
+
+def _sample_flat(flat, height, width, u, v, offset=0):
+    # Bilinear sampling of the flattened images, where offset is the index of the first
+    # pixel of the image for each sample.
+    u = np.clip(u, 0.0, width - 1.0).astype(np.float32)
+    v = np.clip(v, 0.0, height - 1.0).astype(np.float32)
+    u0 = np.minimum(u.astype(np.int32), width - 2)
+    v0 = np.minimum(v.astype(np.int32), height - 2)
+    fu = (u - u0)[:, np.newaxis]
+    fv = (v - v0)[:, np.newaxis]
+
+    index = v0 * width + u0 + offset
+    p00 = _gather(flat, index)
+    p01 = _gather(flat, index + 1)
+    p10 = _gather(flat, index + width)
+    p11 = _gather(flat, index + (width + 1))
+
+    # Weighted sum in float32
+    gu = 1.0 - fu
+    top = p00 * gu + p01 * fu
+    bottom = p10 * gu + p11 * fu
+    return top * (1.0 - fv) + bottom * fv
+
+
+def sample_bilinear(image, u, v):
+    """ Bilinear sampling with clamp-to-edge.
+
+    Arguments:
+      image: Numpy array (height, width, channels). Uint8 RGBA images are gathered
+             as packed 32bit values.
+      u:     Float array (N,), horizontal pixel coordinates (0 at the first pixel center).
+      v:     Float array (N,), vertical pixel coordinates.
+    Returns:
+      Float32 array (N, channels).
+    """
+    height, width = image.shape[:2]
+    return _sample_flat(_flatten(image), height, width, u, v)
+
+
+class ContentWarper(object):
+    """ Render the observation image on CPU by warping the content image.
+
+    Arguments:
+      width:          Integer, width and height of the observation image.
+      fov_y:          Float, vertical field of view angle of the camera (degree).
+      plane_distance: Float, distance from the origin to the content panel.
+      bg_color:       Float array (3,), background color (0.0~1.0).
+      layer:          Uint8 array (height, width, 4), premultiplied RGBA image of the
+                      scene objects seen from the origin, bottom row first.
+                      (None if no scene objects)
+      layer_extent:   Float, half size of the layer on the panel plane.
+    """
+
+    def __init__(self, width, fov_y, plane_distance, bg_color, layer=None,
+                 layer_extent=1.0):
+        self.width = width
+        self.plane_distance = plane_distance
+        self.bg_color = np.array(bg_color[:3], dtype=np.float32) * 255.0
+        self.layer = layer
+        self.layer_extent = layer_extent
+
+        if layer is not None:
+            # Texels whose bilinear footprint has any opaque texel. Other pixels are
+            # skipped in the compositing.
+            opaque = layer[:, :, 3] > 0
+            covered = opaque.copy()
+            covered[:-1, :] |= opaque[1:, :]
+            covered[:, :-1] |= covered[:, 1:]
+            self.layer_covered = covered.ravel()
+
+        # Ray directions of the pixel centers in the camera coordinates, bottom row
+        # first in the same order as glReadPixels().
+        tan_half_fov = math.tan(math.radians(fov_y) * 0.5)
+        ndc = (np.arange(width, dtype=np.float64) + 0.5) / width * 2.0 - 1.0
+        ndc_y, ndc_x = np.meshgrid(ndc, ndc, indexing='ij')
+        self.rays = np.stack([
+            ndc_x.ravel() * tan_half_fov,
+            ndc_y.ravel() * tan_half_fov,
+            -np.ones(width * width)
+        ]).astype(np.float32)
+
+        self.image = np.empty((width, width, 3), dtype=np.uint8)
+
+    def get_plane_pos(self, rot_mat):
+        """ Returns the positions on the panel plane hit by the rays of the pixels.
+
+        Arguments:
+          rot_mat: Numpy array (3, 3) or (4, 4), rotation matrix of the camera, or
+                   (N, 3, 3) rotation matrices of N cameras.
+        Returns:
+          (x, y, valid) where x and y are float arrays (P,) of the plane coordinates,
+          and valid is a bool array (P,) of the rays going toward the plane.
+          (Arrays are (N, P) for N cameras)
+        """
+        rot_mat = np.asarray(rot_mat)
+        if rot_mat.ndim == 2:
+            rot_mat = rot_mat[:3, :3]
+
+        # Homography from the camera rays to the plane coordinates
+        h = np.matmul(np.diag([self.plane_distance, self.plane_distance, -1.0]), rot_mat)
+        p = np.matmul(h.astype(np.float32), self.rays)
+
+        valid = p[..., 2, :] > 0.0
+        w = np.where(valid, p[..., 2, :], 1.0)
+        return p[..., 0, :] / w, p[..., 1, :] / w, valid
+
+    def warp(self, content_image, rot_mat):
+        """ Render the observation image.
+
+        Arguments:
+          content_image: Uint8 array (height, width, 3 or 4), content image bottom row
+                         first. (Alpha is ignored)
+          rot_mat:       Numpy array (3, 3) or (4, 4), rotation matrix of the camera.
+        Returns:
+          Uint8 array (width, width, 3), observation image bottom row first.
+        """
+        rot_mat = np.asarray(rot_mat)[:3, :3]
+        self._warp(content_image[np.newaxis], rot_mat[np.newaxis],
+                   self.image[np.newaxis])
+        return self.image
+
+    def warp_batch(self, content_images, angles, out=None, chunk_size=2, workers=0):
+        """ Render the observation images of many cameras at once.
+
+        Arguments:
+          content_images: Uint8 array (N, height, width, 3 or 4), content images bottom
+                          row first. (Alpha is ignored)
+          angles:         Float array (N, 2), (horizontal, vertical) camera angles (radian).
+          out:            Uint8 array (N, width, width, 3) to store the result. (None to
+                          allocate)
+          chunk_size:     Integer, number of cameras processed at once. Small chunks
+                          keep the temporary arrays and the sampled content images in
+                          the CPU cache, which is faster than large ones.
+          workers:        Integer, number of threads processing the chunks. (0 to process
+                          in the caller thread)
+        Returns:
+          Uint8 array (N, width, width, 3), observation images bottom row first.
+        """
+        angles = np.asarray(angles, dtype=np.float64).reshape(-1, 2)
+        count = len(angles)
+        shape = (count, self.width, self.width, 3)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        elif out.shape != shape or out.dtype != np.uint8:
+            raise ValueError("out should be uint8 array of shape {}, but got {} {}".format(
+                shape, out.dtype, out.shape))
+
+        rot_mats = rot_yx_matrices(angles[:, 0], angles[:, 1])
+        chunks = [(i, min(i + chunk_size, count)) for i in range(0, count, chunk_size)]
+
+        def run(chunks):
+            for begin, end in chunks:
+                self._warp(content_images[begin:end], rot_mats[begin:end], out[begin:end])
+
+        if workers == 0:
+            run(chunks)
+        else:
+            # NumPy releases GIL in the gathers and the arithmetic.
+            threads = [threading.Thread(target=run, args=(chunks[i::workers],))
+                       for i in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return out
+
+    def _warp(self, content_images, rot_mats, out):
+        x, y, valid = self.get_plane_pos(rot_mats)
+        x = x.ravel()
+        y = y.ravel()
+        valid = valid.ravel()
+
+        # Content panel covers [-1, 1] on the plane.
+        content_height, content_width = content_images.shape[1:3]
+        on_panel = np.nonzero(valid & (np.abs(x) <= 1.0) & (np.abs(y) <= 1.0))[0]
+        # Index of the first content pixel of the camera of each sample
+        offset = (on_panel // len(self.rays[0])) * (content_height * content_width)
+
+        color = np.empty((len(x), 3), dtype=np.float32)
+        color[:] = self.bg_color
+        color[on_panel] = _sample_flat(
+            _flatten(content_images), content_height, content_width,
+            (x[on_panel] + 1.0) * (0.5 * content_width) - 0.5,
+            (y[on_panel] + 1.0) * (0.5 * content_height) - 0.5, offset)[:, :3]
+
+        if self.layer is not None:
+            extent = self.layer_extent
+            layer_height, layer_width = self.layer.shape[:2]
+            on_layer = np.nonzero(valid & (np.abs(x) <= extent) & (np.abs(y) <= extent))[0]
+            layer_u = (x[on_layer] + extent) * (0.5 * layer_width / extent) - 0.5
+            layer_v = (y[on_layer] + extent) * (0.5 * layer_height / extent) - 0.5
+
+            # Skip the pixels on the transparent area.
+            texel = (np.clip(layer_v, 0, layer_height - 1).astype(np.int32) * layer_width +
+                     np.clip(layer_u, 0, layer_width - 1).astype(np.int32))
+            covered = np.take(self.layer_covered, texel)
+            on_layer = on_layer[covered]
+
+            rgba = sample_bilinear(self.layer, layer_u[covered], layer_v[covered])
+            color[on_layer] = rgba[:, :3] + color[on_layer] * (1.0 - rgba[:, 3:] / 255.0)
+
+        np.add(color, 0.5, out=color)
+        # Assigned through the view, so that strided output arrays are written too.
+        out[...] = color.reshape(out.shape)
@@ -88,11 +88,16 @@ setup(
     author_email=EMAIL,
     python_requires=REQUIRES_PYTHON,
     url=URL,
-    packages=find_packages(exclude=('tests', )),
+    packages=find_packages(exclude=('tests', 'benchmarks')),
     package_data={'oculoenv': data_pathes},
+    # Mesh caches are generated at the first load, and not distributed.
+    exclude_package_data={'oculoenv': ['data/*/*.cache.npz']},
     install_requires=REQUIRED,
     extras_require=EXTRAS,
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['oculoenv-gen=oculoenv.dataset_generator:main'],
+    },
     license='Apache 2.0',
     classifiers=[
         'License :: OSI Approved :: Apache Software License',
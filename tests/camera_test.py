@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from oculoenv.camera import CameraBatch
+from oculoenv.environment import Camera, PLANE_DISTANCE
+
+
+class TestCameraBatch(unittest.TestCase):
+    def test_reset(self):
+        cameras = CameraBatch(3)
+        camera = Camera()
+        self.assertTrue(np.allclose(cameras.angles,
+                                    [[camera.cur_angle_h, camera.cur_angle_v]] * 3))
+
+        cameras.set_angles([[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]])
+        cameras.reset([1])
+        self.assertTrue(np.allclose(cameras.angles[1], [camera.cur_angle_h,
+                                                        camera.cur_angle_v]))
+        self.assertTrue(np.allclose(cameras.angles[2], [0.5, 0.6]))
+
+    def test_geometry(self):
+        rng = np.random.RandomState(0)
+        d_angles = rng.uniform(-1.0, 1.0, size=(4, 2))
+
+        cameras = CameraBatch(4)
+        cameras.change_angles(d_angles)
+
+        rotation_mats = cameras.get_rotation_mats()
+        view_mats = cameras.get_view_mats()
+        forward_vecs = cameras.get_forward_vecs()
+        focus_pos = cameras.get_local_focus_pos()
+
+        for i in range(4):
+            camera = Camera()
+            camera.change_angle(d_angles[i, 0], d_angles[i, 1])
+
+            # Clamped in the same way
+            self.assertTrue(np.allclose(cameras.angles[i], [camera.cur_angle_h,
+                                                            camera.cur_angle_v]))
+
+            self.assertTrue(np.allclose(rotation_mats[i], camera.m.m[:3, :3], atol=1e-6))
+            self.assertTrue(np.allclose(view_mats[i], camera.get_inv_mat().m, atol=1e-6))
+            self.assertTrue(np.allclose(forward_vecs[i], camera.get_forward_vec(), atol=1e-6))
+
+            # Same calculation as Environment.get_local_focus_pos()
+            forward_vec = camera.get_forward_vec()
+            expected = forward_vec[:2] * (PLANE_DISTANCE / -forward_vec[2])
+            self.assertTrue(np.allclose(focus_pos[i], expected, atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
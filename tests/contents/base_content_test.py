@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from oculoenv.contents.base_content import ContentSprite, SpriteRects, SpriteGrid
+
+
+class TestSpriteRects(unittest.TestCase):
+    def get_first_hit(self, sprites, pos):
+        for i, sprite in enumerate(sprites):
+            if sprite.contains(pos):
+                return i
+        return -1
+
+    def test_hit_test(self):
+        rng = np.random.RandomState(0)
+        # Overlapping sprites, where the first one in the list wins.
+        sprites = [
+            ContentSprite(None, x, y, width)
+            for x, y, width in rng.uniform([-1.0, -1.0, 0.05], [1.0, 1.0, 0.3], size=(10, 3))
+        ]
+        sprite_rects = SpriteRects(sprites)
+        self.assertEqual(len(sprite_rects), 10)
+
+        positions = rng.uniform(-1.0, 1.0, size=(200, 2))
+        expected = [self.get_first_hit(sprites, pos) for pos in positions]
+        self.assertIn(-1, expected)
+
+        for pos, index in zip(positions, expected):
+            self.assertEqual(sprite_rects.hit_test(pos), index)
+
+        indices = sprite_rects.hit_test_batch(positions)
+        self.assertEqual(indices.shape, (200,))
+        self.assertEqual(indices.tolist(), expected)
+
+    def test_edge(self):
+        sprite_rects = SpriteRects([ContentSprite(None, 0.0, 0.0, 0.5)])
+        # Edges are inside like contains().
+        self.assertEqual(sprite_rects.hit_test([0.5, -0.5]), 0)
+        self.assertEqual(sprite_rects.hit_test([0.51, 0.0]), -1)
+
+    def test_empty(self):
+        sprite_rects = SpriteRects([])
+        self.assertEqual(sprite_rects.hit_test([0.0, 0.0]), -1)
+        self.assertEqual(sprite_rects.hit_test_batch([[0.0, 0.0]]).tolist(), [-1])
+
+
+class TestSpriteGrid(unittest.TestCase):
+    def test_hit_test(self):
+        division = 15
+        extent = 0.8
+        cell_half_width = extent / division
+        sprites = []
+        sprite_grid = SpriteGrid(division, extent)
+        for x_index in range(division):
+            for y_index in range(division):
+                if (x_index + y_index) % 3 == 0:
+                    # Empty cell
+                    continue
+                sprite = ContentSprite(None,
+                                       -extent + cell_half_width * (1 + 2 * x_index),
+                                       -extent + cell_half_width * (1 + 2 * y_index),
+                                       cell_half_width * 0.8)
+                index = sprite_grid.register(sprite, x_index, y_index)
+                self.assertEqual(index, len(sprites))
+                sprites.append(sprite)
+        self.assertEqual(len(sprite_grid), len(sprites))
+
+        # Same result as the linear scan
+        rng = np.random.RandomState(0)
+        positions = rng.uniform(-1.0, 1.0, size=(500, 2))
+        expected = SpriteRects(sprites).hit_test_batch(positions).tolist()
+        self.assertIn(-1, expected)
+
+        for pos, index in zip(positions, expected):
+            self.assertEqual(sprite_grid.hit_test(pos), index)
+            sprite = sprite_grid.get_sprite(pos)
+            if index < 0:
+                self.assertIsNone(sprite)
+            else:
+                self.assertIs(sprite, sprites[index])
+
+        self.assertEqual(sprite_grid.hit_test_batch(positions).tolist(), expected)
+
+    def test_boundary(self):
+        sprite_grid = SpriteGrid(2)
+        # Sprites filling the cells
+        sprite_grid.register(ContentSprite(None, -0.5, -0.5, 0.5), 0, 0)
+        sprite_grid.register(ContentSprite(None, 0.5, 0.5, 0.5), 1, 1)
+
+        self.assertEqual(sprite_grid.get_cell([1.0, 1.0]), 3)
+        self.assertEqual(sprite_grid.get_cell([1.01, 0.0]), -1)
+        self.assertEqual(sprite_grid.hit_test([-1.0, -1.0]), 0)
+        self.assertEqual(sprite_grid.hit_test([1.0, 1.0]), 1)
+        self.assertEqual(sprite_grid.hit_test([0.5, -0.5]), -1)
+        self.assertEqual(sprite_grid.hit_test_batch([[1.0, 1.0], [-1.01, 0.0]]).tolist(),
+                         [1, -1])
+
+    def test_empty(self):
+        sprite_grid = SpriteGrid(3)
+        self.assertEqual(sprite_grid.hit_test([0.0, 0.0]), -1)
+        self.assertIsNone(sprite_grid.get_sprite([0.0, 0.0]))
+        self.assertEqual(sprite_grid.hit_test_batch([[0.0, 0.0]]).tolist(), [-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,9 @@ from __future__ import print_function
 import unittest
 import numpy as np
 
-from oculoenv.contents.change_detection_content import ChangeDetectionContent
+from oculoenv.contents.base_content import _shared_frames
+from oculoenv.contents.change_detection_content import ChangeDetectionContent, \
+  YES_BUTTON_POS, NO_BUTTON_POS
 
 
 class TestChangeDetectionContent(unittest.TestCase):
@@ -40,5 +42,58 @@ class TestChangeDetectionContent(unittest.TestCase):
             local_focus_pos = [x, y]
             reward, done, info = content.step(local_focus_pos)
 
+    def test_shared_frames(self):
+        contents = [ChangeDetectionContent(), ChangeDetectionContent()]
+        for content in contents:
+            content.set_frame_cache(16 * 1024 * 1024)
+
+        for phase_name in ['start_phase', 'interval_phase']:
+            images = []
+            for content in contents:
+                content.current_phase = getattr(content, phase_name)
+                content.render()
+                images.append(content.get_image().copy())
+
+            # The second content copies the frame rendered by the first one.
+            self.assertTrue(np.array_equal(images[1], images[0]))
+            hit_count = _shared_frames.hit_count
+            contents[1].render()
+            self.assertEqual(_shared_frames.hit_count, hit_count + 1)
+            self.assertTrue(np.array_equal(contents[1].get_image(), images[0]))
+
+            # Same image as the drawn one
+            contents[1].set_frame_cache(0)
+            contents[1].render()
+            self.assertTrue(np.array_equal(contents[1].get_image(), images[0]))
+            contents[1].set_frame_cache(16 * 1024 * 1024)
+
+
+    def test_hit_test_batch(self):
+        content = ChangeDetectionContent()
+        content.seed(0)
+        content.reset()
+        # Move to evaluation phase
+        state = content.get_state()
+        state['phase'] = 3
+        content.set_state(state)
+        self.assertIs(content.current_phase, content.evaluation_phase)
+
+        positions = np.concatenate([np.random.RandomState(0).uniform(-1.0, 1.0, size=(100, 2)),
+                                    [YES_BUTTON_POS, NO_BUTTON_POS]])
+        indices = content.hit_test_batch(positions)
+        self.assertEqual(indices[100:].tolist(), [0, 1])
+
+        # Same result as the hit check of each step
+        is_changed = bool(content.trial['is_changed'])
+        for pos, index in zip(positions, indices):
+            content.set_state(state)
+            reward, done, info = content.step(pos)
+            if index < 0:
+                self.assertNotIn('result', info)
+            else:
+                # Index 0 is YES, and 1 is NO.
+                self.assertEqual(reward, int((index == 0) == is_changed))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -42,9 +42,8 @@ class TestMultipleObjectTrackingContent(unittest.TestCase):
 
     
     def test_move_ball_sprites(self):
-        np.random.seed(1)
-        
         content = MultipleObjectTrackingContent()
+        content.seed(1)
 
         for i in range(10):
             content._prepare_ball_sprites()
@@ -7,7 +7,8 @@ import unittest
 import numpy as np
 
 from oculoenv.contents.odd_one_out_content import OddOneOutSignSprite, OddOneOutContent, \
-  ODD_TYPE_COLOR, ODD_TYPE_SHAPE, ODD_TYPE_ORIENTATION, ODD_TYPE_MOTION, GRID_DIVISIONS
+  ODD_TYPE_COLOR, ODD_TYPE_SHAPE, ODD_TYPE_ORIENTATION, ODD_TYPE_MOTION, GRID_DIVISIONS, \
+  MOTION_INTERVAL_FRAMES, PHASE_FIND
 
 
 class TestOddOneOutSignSprite(unittest.TestCase):
@@ -130,5 +131,98 @@ class TestOddOneOutContent(unittest.TestCase):
                 self.assertNotEqual(odd_index, avoid_index)
                 self.assertLess(odd_index, grid_division * grid_division)
 
+    def test_check_odd_hit(self):
+        content = OddOneOutContent()
+        content.seed(0)
+
+        positions = np.random.RandomState(0).uniform(-1.0, 1.0, size=(300, 2))
+        for _ in range(5):
+            content._prepare_sign_sprites()
+            odd_sprite = [sign_sprite for sign_sprite in content.sign_sprites
+                          if sign_sprite.odd][0]
+            # Same result as testing the odd sign with contains()
+            for pos in positions:
+                self.assertEqual(content._check_odd_hit(pos), odd_sprite.contains(pos))
+            center = [odd_sprite.base_pos_x, odd_sprite.base_pos_y]
+            self.assertTrue(content._check_odd_hit(center))
+            self.assertIs(content.get_grid_sprite(center), odd_sprite)
+
+    def test_dirty_rect_render(self):
+        content = OddOneOutContent()
+        content.seed(0)
+        # Trial with the odd motion
+        while True:
+            content._move_to_find_phase()
+            if content.trial['has_odd_motion']:
+                break
+        content.render()
+        last_image = content.get_image().copy()
+
+        # Focus outside the content, so that the phase doesn't change.
+        for _ in range(4):
+            # The motion sprite toggles every MOTION_INTERVAL_FRAMES.
+            for _ in range(MOTION_INTERVAL_FRAMES):
+                content.step([2.0, 2.0])
+            self.assertEqual(content.phase, PHASE_FIND)
+            image = content.get_image().copy()
+            self.assertFalse(np.array_equal(image, last_image))
+            last_image = image
+
+            # Same image as the full render
+            content._invalidate()
+            content.render()
+            self.assertTrue(np.array_equal(content.get_image(), image))
+
+    def test_frame_cache(self):
+        content = OddOneOutContent()
+        content.seed(0)
+        content.set_frame_cache(16 * 1024 * 1024)
+        while True:
+            content._move_to_find_phase()
+            if content.trial['has_odd_motion']:
+                break
+        content.render()
+
+        images = []
+        for _ in range(4):
+            for _ in range(MOTION_INTERVAL_FRAMES):
+                content.step([2.0, 2.0])
+            images.append(content.get_image().copy())
+        # Two frames of the motion are drawn, and then copied from the cache.
+        self.assertEqual(content.frame_cache.hit_count, 3)
+        self.assertTrue(np.array_equal(images[0], images[2]))
+        self.assertTrue(np.array_equal(images[1], images[3]))
+
+        # Same image as the drawn one
+        content.set_frame_cache(0)
+        content._invalidate()
+        content.render()
+        self.assertTrue(np.array_equal(content.get_image(), images[3]))
+
+
+    def test_hit_test_batch(self):
+        content = OddOneOutContent()
+        content.seed(0)
+        content.reset()
+        # Move to find phase
+        content.step([0.0, 0.0])
+        self.assertEqual(content.phase, PHASE_FIND)
+
+        sign_centers = [[sprite.base_pos_x, sprite.base_pos_y]
+                        for sprite in content.sign_sprites]
+        positions = np.concatenate([np.random.RandomState(0).uniform(-1.0, 1.0, size=(100, 2)),
+                                    sign_centers])
+        indices = content.hit_test_batch(positions)
+        self.assertEqual(indices[100:].tolist(), list(range(len(sign_centers))))
+
+        # Same result as the hit check of each step
+        state = content.get_state()
+        odd_index = int(content.trial['odd_index'])
+        for pos, index in zip(positions, indices):
+            content.set_state(state)
+            reward, done, info = content.step(pos)
+            self.assertEqual(reward, int(index == odd_index))
+
+
 if __name__ == '__main__':
     unittest.main()
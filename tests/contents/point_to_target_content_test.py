@@ -6,7 +6,9 @@ from __future__ import print_function
 import unittest
 import numpy as np
 
-from oculoenv.contents.point_to_target_content import Quadrant, PointToTargetContent
+from oculoenv.contents.base_content import SHARED_FRAME_START, _shared_frames
+from oculoenv.contents.point_to_target_content import Quadrant, PointToTargetContent, \
+  PHASE_START
 
 
 class TestQuadrant(unittest.TestCase):
@@ -15,9 +17,10 @@ class TestQuadrant(unittest.TestCase):
         # Adding right and bottom margin
         quadrant = Quadrant([0.5, 0.5], 0.5, 0.5 - margin, 0.5, 0.5 - margin)
 
+        rng = np.random.RandomState(0)
         for _ in range(100):
             target_width = 0.1
-            p = quadrant.get_random_location(target_width)
+            p = quadrant.get_random_location(target_width, rng)
             # Check x range
             self.assertGreaterEqual(p[0], target_width)
             self.assertLessEqual(p[0], 1.0 - target_width - margin)
@@ -34,7 +37,7 @@ class TestPointToTargetContent(unittest.TestCase):
         for i in range(100):
             for j in range(4):
                 target_width = 0.1
-                pos = content.quadrants[j].get_random_location(target_width)
+                pos = content.quadrants[j].get_random_location(target_width, content.rng)
                 x = pos[0]
                 y = pos[1]
                 # Check whether random location pos is not inside the plus marker
@@ -66,6 +69,24 @@ class TestPointToTargetContent(unittest.TestCase):
         content = PointToTargetContent(difficulty=0)
         self.assertEqual(content.target_sprite.width, 0.2)
         self.assertEqual(content.lure_sprite.width, 0.1)
-        
+
+    def test_shared_frames(self):
+        contents = [PointToTargetContent(), PointToTargetContent()]
+        for content in contents:
+            content.set_frame_cache(1024 * 1024)
+            content.reset()
+        self.assertEqual(contents[0].phase, PHASE_START)
+        self.assertEqual(contents[0]._get_shared_frame_key(), SHARED_FRAME_START)
+
+        # Start frame is copied from the one rendered by the other content.
+        hit_count = _shared_frames.hit_count
+        contents[1].render()
+        self.assertEqual(_shared_frames.hit_count, hit_count + 1)
+        self.assertTrue(np.array_equal(contents[1].get_image(), contents[0].get_image()))
+
+        contents[0]._move_to_target_phase()
+        self.assertIsNone(contents[0]._get_shared_frame_key())
+
+
 if __name__ == '__main__':
     unittest.main()
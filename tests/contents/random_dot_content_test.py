@@ -90,5 +90,32 @@ class TestRandomDotMotionDiscriminationContent(unittest.TestCase):
             local_focus_pos = [x, y]
             reward, done, info = content.step(local_focus_pos)
 
+    def test_hit_test_batch(self):
+        content = RandomDotMotionDiscriminationContent()
+        content.seed(0)
+        content.reset()
+        # Move to response phase
+        content.step([0.0, 0.0])
+        self.assertEqual(content.phase, PHASE_RESPONSE)
+
+        arrow_centers = [[sprite.pos_x, sprite.pos_y] for sprite in content.arrow_sprites]
+        positions = np.concatenate([np.random.RandomState(0).uniform(-1.0, 1.0, size=(100, 2)),
+                                    arrow_centers])
+        indices = content.hit_test_batch(positions)
+        self.assertEqual(indices[100:].tolist(), list(range(8)))
+
+        # Same result as the hit check of each step
+        state = content.get_state()
+        direction_index = content.current_direction_index
+        for pos, index in zip(positions, indices):
+            content.set_state(state)
+            reward, done, info = content.step(pos)
+            if index < 0:
+                self.assertNotIn('result', info)
+            else:
+                correct = index == direction_index
+                self.assertEqual(reward, int(correct))
+                self.assertEqual(info['result'], 'success' if correct else 'fail')
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from oculoenv.environment import Environment
+from oculoenv.contents.point_to_target_content import PointToTargetContent
+from oculoenv.dataset_generator import generate, generate_shard, write_manifest, \
+  get_shard_name, ScriptedPolicy, MANIFEST_FILE_NAME, POLICY_RANDOM, POLICY_SCRIPTED
+
+
+class TestDatasetGenerator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_generate_shard(self):
+        env = Environment(PointToTargetContent(), off_buffer_width=64)
+
+        for policy in [POLICY_RANDOM, POLICY_SCRIPTED]:
+            shard_name = generate_shard(env, self.temp_dir, 0, 20, policy, 0, 0.05)
+            shard_dir = os.path.join(self.temp_dir, shard_name)
+
+            frames = np.load(os.path.join(shard_dir, 'frames.npy'), mmap_mode='r')
+            self.assertEqual(frames.shape, (20, 64, 64, 3))
+            self.assertEqual(np.load(os.path.join(shard_dir, 'angles.npy')).shape, (20, 2))
+            self.assertEqual(np.load(os.path.join(shard_dir, 'actions.npy')).shape, (20, 2))
+            self.assertEqual(np.load(os.path.join(shard_dir, 'rewards.npy')).shape, (20,))
+            self.assertEqual(np.load(os.path.join(shard_dir, 'focus_pos.npy')).shape, (20, 2))
+            self.assertEqual(np.load(os.path.join(shard_dir, 'phases.npy')).shape, (20,))
+            shutil.rmtree(shard_dir)
+
+    def test_generate_shard_deterministic(self):
+        env = Environment(PointToTargetContent(), off_buffer_width=64)
+
+        shard_name = generate_shard(env, self.temp_dir, 1, 20, POLICY_SCRIPTED, 0, 0.05)
+        shard_dir = os.path.join(self.temp_dir, shard_name)
+        actions0 = np.load(os.path.join(shard_dir, 'actions.npy'))
+        shutil.rmtree(shard_dir)
+
+        generate_shard(env, self.temp_dir, 1, 20, POLICY_SCRIPTED, 0, 0.05)
+        actions1 = np.load(os.path.join(shard_dir, 'actions.npy'))
+        self.assertTrue(np.array_equal(actions0, actions1))
+
+    def test_scripted_policy(self):
+        # Scripted policy should fixate the start marker and begin the trial.
+        env = Environment(PointToTargetContent())
+        policy = ScriptedPolicy(np.random.RandomState(0), 0.05)
+        for i in range(20):
+            env.step(policy.choose_action(env))
+        self.assertEqual(env.content.get_phase(), 1)
+
+    def test_write_manifest(self):
+        config = {'content': 'PointToTargetContent'}
+        write_manifest(self.temp_dir, config, ['shard_00001', 'shard_00000'], 10)
+
+        with open(os.path.join(self.temp_dir, MANIFEST_FILE_NAME)) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['content'], 'PointToTargetContent')
+        self.assertEqual([shard['name'] for shard in manifest['shards']],
+                         ['shard_00000', 'shard_00001'])
+
+    def generate_quietly(self, shards):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            generate(self.temp_dir, 0, width=32, shards=shards, steps_per_shard=5,
+                     workers=2)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_generate_resume(self):
+        # Generate a part of the run in the worker processes.
+        output = self.generate_quietly(2)
+        self.assertNotIn("Resuming", output)
+
+        first_shard_path = os.path.join(self.temp_dir, get_shard_name(0), 'frames.npy')
+        first_shard_mtime = os.path.getmtime(first_shard_path)
+        actions = np.load(os.path.join(self.temp_dir, get_shard_name(1), 'actions.npy'))
+
+        # Completed shards are skipped.
+        output = self.generate_quietly(3)
+        self.assertIn("Resuming: 2 of 3 shards already completed", output)
+        self.assertEqual(os.path.getmtime(first_shard_path), first_shard_mtime)
+        self.assertTrue(np.array_equal(
+            np.load(os.path.join(self.temp_dir, get_shard_name(1), 'actions.npy')), actions))
+
+        with open(os.path.join(self.temp_dir, MANIFEST_FILE_NAME)) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['content'], 'PointToTargetContent')
+        self.assertEqual(manifest['shards'],
+                         [{'name': get_shard_name(i), 'size': 5} for i in range(3)])
+        for i in range(3):
+            shard_dir = os.path.join(self.temp_dir, get_shard_name(i))
+            self.assertEqual(np.load(os.path.join(shard_dir, 'frames.npy')).shape,
+                             (5, 32, 32, 3))
+        # No temporary shard is left.
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         sorted([get_shard_name(i) for i in range(3)] + [MANIFEST_FILE_NAME]))
+
+        # Resuming with the different settings is an error.
+        with self.assertRaises(ValueError):
+            generate(self.temp_dir, 0, width=64, shards=3, steps_per_shard=5, workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
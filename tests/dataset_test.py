@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from oculoenv.dataset import ShardDataset
+from oculoenv.dataset_generator import write_manifest, get_shard_name
+
+
+class TestShardDataset(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+        # 3 shards with 10, 10, 10 steps. Each step holds its global index.
+        shard_names = []
+        for i in range(3):
+            shard_name = get_shard_name(i)
+            shard_dir = os.path.join(self.temp_dir, shard_name)
+            os.makedirs(shard_dir)
+            steps = np.arange(i * 10, (i + 1) * 10)
+            frames = np.zeros((10, 4, 4, 3), dtype=np.uint8)
+            frames[:, 0, 0, 0] = steps
+            np.save(os.path.join(shard_dir, 'frames.npy'), frames)
+            np.save(os.path.join(shard_dir, 'angles.npy'),
+                    np.stack([steps, -steps], axis=1).astype(np.float32))
+            np.save(os.path.join(shard_dir, 'actions.npy'),
+                    np.zeros((10, 2), dtype=np.float32))
+            np.save(os.path.join(shard_dir, 'rewards.npy'), steps.astype(np.float32))
+            shard_names.append(shard_name)
+        write_manifest(self.temp_dir, {}, shard_names, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_getitem(self):
+        dataset = ShardDataset(self.temp_dir)
+        self.assertEqual(len(dataset), 30)
+
+        frame, angle, action, reward = dataset[15]
+        self.assertEqual(frame.shape, (4, 4, 3))
+        self.assertEqual(frame[0, 0, 0], 15)
+        self.assertTrue(np.array_equal(angle, [15, -15]))
+        self.assertEqual(reward, 15)
+
+        self.assertEqual(dataset[-1][3], 29)
+        with self.assertRaises(IndexError):
+            dataset[30]
+
+    def test_get_batch(self):
+        dataset = ShardDataset(self.temp_dir)
+        indices = [25, 3, 11, 4, 29]
+        frames, angles, actions, rewards = dataset.get_batch(indices)
+        self.assertEqual(frames.shape, (5, 4, 4, 3))
+        self.assertTrue(np.array_equal(rewards, indices))
+        self.assertTrue(np.array_equal(frames[:, 0, 0, 0], indices))
+        self.assertTrue(np.array_equal(angles[:, 1], np.negative(indices)))
+
+    def test_iterate(self):
+        dataset = ShardDataset(self.temp_dir)
+
+        rewards = [batch[3] for batch in dataset.iterate(batch_size=8)]
+        self.assertEqual([len(r) for r in rewards], [8, 8, 8, 6])
+        self.assertTrue(np.array_equal(np.concatenate(rewards), np.arange(30)))
+
+        batches = list(dataset.iterate(batch_size=8, drop_last=True))
+        self.assertEqual(len(batches), 3)
+
+    def test_iterate_shuffle(self):
+        dataset = ShardDataset(self.temp_dir)
+
+        def get_order(seed, epoch, workers):
+            return np.concatenate([batch[3] for batch in dataset.iterate(
+                batch_size=4, shuffle=True, seed=seed, epoch=epoch, workers=workers)])
+
+        order = get_order(0, 0, 0)
+        self.assertTrue(np.array_equal(np.sort(order), np.arange(30)))
+        self.assertFalse(np.array_equal(order, np.arange(30)))
+
+        # Same order with the same seed and epoch, regardless of the workers
+        self.assertTrue(np.array_equal(order, get_order(0, 0, 0)))
+        self.assertTrue(np.array_equal(order, get_order(0, 0, 3)))
+        self.assertFalse(np.array_equal(order, get_order(0, 1, 0)))
+        self.assertFalse(np.array_equal(order, get_order(1, 0, 0)))
+
+    def test_iterate_stop(self):
+        dataset = ShardDataset(self.temp_dir)
+
+        # Workers should be released when the iteration is stopped early.
+        iterator = dataset.iterate(batch_size=1, workers=2, prefetch=1)
+        next(iterator)
+        iterator.close()
+
+    def test_fields(self):
+        dataset = ShardDataset(self.temp_dir, fields=('rewards',))
+        rewards, = dataset.get_batch([1, 2])
+        self.assertTrue(np.array_equal(rewards, [1, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,11 +4,19 @@ from __future__ import division
 from __future__ import print_function
 
 import unittest
+import pickle
 import numpy as np
 import math
 
-from oculoenv.environment import Environment
+from oculoenv.environment import Environment, CONTENT_TEXTURE_AUTO, \
+  get_content_texture_width
+from oculoenv.graphics import is_timer_query_supported, RENDERER_SHADER
 from oculoenv.contents.point_to_target_content import Quadrant, PointToTargetContent
+from oculoenv.contents.change_detection_content import ChangeDetectionContent
+from oculoenv.contents.odd_one_out_content import OddOneOutContent
+from oculoenv.contents.visual_search_content import VisualSearchContent
+from oculoenv.contents.multiple_object_tracking_content import MultipleObjectTrackingContent
+from oculoenv.contents.random_dot_content import RandomDotMotionDiscriminationContent
 
 
 class TestEnvironment(unittest.TestCase):
@@ -44,6 +52,276 @@ class TestEnvironment(unittest.TestCase):
         self.assertEqual(image.shape, (128,128,3))
         self.assertEqual(len(angle), 2)
 
+    def test_static_scene(self):
+        content = PointToTargetContent()
+        env = Environment(content)
+
+        # frame0 mesh baked in world space
+        self.assertEqual(len(env.static_scene.batches), 1)
+        obj = env.objects[0]
+        _, vertex_data, indices, _ = env.static_scene.batches[0]
+        self.assertEqual(len(vertex_data), obj.mesh.num_vertices)
+        np.testing.assert_array_equal(indices, obj.mesh.indices)
+
+        m = obj.get_model_mat()
+        pos = obj.mesh.vertex_data[:, :3].dot(m[:3, :3].T) + m[:3, 3]
+        np.testing.assert_allclose(vertex_data[:, :3], pos, atol=1e-5)
+
+    def test_profiling(self):
+        content = PointToTargetContent()
+        env = Environment(content)
+        self.assertIsNone(env.get_profile_stats())
+
+        env.enable_profiling()
+        for i in range(3):
+            env.step(np.array([0.0, 0.0]))
+
+        stats = env.get_profile_stats()
+        for stage in ['content_step', 'render_scene', 'read_pixels', 'flip']:
+            self.assertEqual(stats[stage]['count'], 3)
+
+        env.reset_profile_stats()
+        self.assertEqual(env.get_profile_stats()['flip']['count'], 0)
+
+        # Original methods should be restored.
+        env.enable_profiling(False)
+        self.assertIsNone(env.get_profile_stats())
+        self.assertNotIn('_step', content.__dict__)
+        self.assertNotIn('render', content.__dict__)
+        self.assertNotIn('_flip_image', env.__dict__)
+        env.step(np.array([0.0, 0.0]))
+
+    def test_profiling_keeps_other_attributes(self):
+        content = PointToTargetContent()
+        env = Environment(content)
+
+        # Instance attribute set before the profiling is restored.
+        render_calls = []
+        content.render = lambda: render_calls.append(1)
+        env.enable_profiling()
+        env.reset()
+        self.assertEqual(len(render_calls), 1)
+        self.assertEqual(env.get_profile_stats()['content_render']['count'], 1)
+        env.enable_profiling(False)
+        env.reset()
+        self.assertEqual(len(render_calls), 2)
+
+        # Attribute replaced after the binding is left as it is.
+        env.enable_profiling()
+        def flip_image(image):
+            return image
+        env._flip_image = flip_image
+        env.enable_profiling(False)
+        self.assertIs(env._flip_image, flip_image)
+        self.assertNotIn('_step', content.__dict__)
+
+    def test_profiling_gpu(self):
+        content = PointToTargetContent()
+        env = Environment(content)
+
+        env.shadow_window.switch_to()
+        if not is_timer_query_supported():
+            self.skipTest("GL timer query is not supported")
+
+        env.enable_profiling(gpu=True)
+        for i in range(10):
+            # Re-render the content in every step.
+            env.content.render()
+            env.step(np.array([0.0, 0.0]))
+        # Results arrive a few frames later.
+        stats = env.get_profile_stats()
+        for stage in ['gpu_render_scene', 'gpu_content_render']:
+            self.assertGreater(stats[stage]['count'], 0)
+            self.assertGreater(stats[stage]['total_ms'], 0.0)
+
+        env.enable_profiling(False)
+        self.assertIsNone(env.gpu_timer)
+        self.assertIsNone(content.gpu_timer)
+
+    def test_background_cache(self):
+        envs = []
+        for background_cache_mb in [0, 1]:
+            env = Environment(PointToTargetContent(), background_cache_mb=background_cache_mb)
+            env.seed(1)
+            env.reset()
+            envs.append(env)
+
+        background_cache = envs[1].background_cache
+        # 1MB holds 8 backgrounds of 128x128.
+        self.assertEqual(background_cache.max_entries, 8)
+
+        for i in range(20):
+            action = np.array([0.1, 0.0]) if i % 4 < 2 else np.array([-0.1, 0.0])
+            obs0, _, _, _ = envs[0].step(action)
+            obs1, _, _, _ = envs[1].step(action)
+            self.assertTrue(np.array_equal(obs0['screen'], obs1['screen']))
+
+        # Camera moves between 3 poses.
+        self.assertEqual(len(background_cache), 3)
+        self.assertGreater(background_cache.hit_count, 0)
+
+    def test_close(self):
+        content = PointToTargetContent()
+        env = Environment(content, background_cache_mb=1, content_cache_mb=1)
+        env.reset()
+        for i in range(3):
+            env.step(np.array([0.1, 0.0]))
+        background_cache = env.background_cache
+        self.assertGreater(len(background_cache), 0)
+
+        # GPU memory of the caches is released.
+        env.close()
+        self.assertEqual(len(background_cache), 0)
+        self.assertIsNone(env.background_cache)
+        self.assertIsNone(content.frame_cache)
+        env.close()
+
+        # Frame cache set on the content by the caller is left as it is.
+        content = PointToTargetContent()
+        content.set_frame_cache(1024 * 1024)
+        env = Environment(content)
+        env.close()
+        self.assertIsNotNone(content.frame_cache)
+
+    def test_content_texture_width(self):
+        self.assertEqual(get_content_texture_width(64), 64)
+        self.assertEqual(get_content_texture_width(128), 128)
+
+        screens = []
+        for content_texture_width, content_mipmap in [(None, False),
+                                                      (CONTENT_TEXTURE_AUTO, False),
+                                                      (None, True)]:
+            env = Environment(PointToTargetContent(), off_buffer_width=64,
+                              content_texture_width=content_texture_width,
+                              content_mipmap=content_mipmap)
+            env.seed(1)
+            env.reset()
+            obs, _, _, _ = env.step(np.array([0.0, 0.0]))
+            self.assertEqual(obs['screen'].shape, (64, 64, 3))
+            screens.append(obs['screen'].astype(np.float64))
+
+            content = env.content
+            self.assertEqual(content.get_image().shape, (content.height, content.width, 4))
+            if content_texture_width is None:
+                self.assertEqual(content.width, 512)
+            else:
+                self.assertEqual(content.width, 64)
+
+        # Content is sampled from the smaller texture or the mipmaps.
+        for screen in screens[1:]:
+            self.assertLess(np.mean(np.abs(screen - screens[0])), 8.0)
+
+    def test_warp_renderer(self):
+        envs = [Environment(PointToTargetContent(), renderer=renderer)
+                for renderer in ['fixed', 'warp']]
+        for env in envs:
+            env.seed(1)
+            env.reset()
+
+        for i in range(5):
+            action = np.array([0.05, -0.02])
+            obs0, _, _, _ = envs[0].step(action)
+            obs1, _, _, _ = envs[1].step(action)
+            self.assertEqual(obs1['screen'].shape, (128, 128, 3))
+
+            # Differs from GL only by the resampling.
+            diff = np.abs(obs0['screen'].astype(np.int32) - obs1['screen'])
+            self.assertLess(np.mean(diff), 2.0)
+
+    def test_shader_renderer(self):
+        content_classes = [
+            PointToTargetContent, ChangeDetectionContent, OddOneOutContent,
+            VisualSearchContent, MultipleObjectTrackingContent,
+            RandomDotMotionDiscriminationContent
+        ]
+
+        for content_class in content_classes:
+            envs = [Environment(content_class(), renderer=renderer)
+                    for renderer in ['fixed', 'shader']]
+            for env in envs:
+                env.seed(1)
+                env.reset()
+
+            for i in range(10):
+                action = np.array([0.02, -0.01]) if i % 2 == 0 else np.array([-0.01, 0.02])
+                obs0, reward0, _, _ = envs[0].step(action)
+                obs1, reward1, _, _ = envs[1].step(action)
+                self.assertEqual(reward0, reward1)
+
+                # Both pipelines agree within the last bit.
+                diff = np.abs(obs0['screen'].astype(np.int32) - obs1['screen'])
+                self.assertLessEqual(np.max(diff), 1)
+
+    def test_content_shader_renderer(self):
+        contents = [PointToTargetContent(), PointToTargetContent()]
+        contents[1].set_renderer(RENDERER_SHADER)
+        for content in contents:
+            content.seed(1)
+            content.reset()
+
+        for i in range(10):
+            pos = [0.1 * i - 0.5, 0.0]
+            contents[0].step(pos)
+            contents[1].step(pos)
+            images = [content.get_image() for content in contents]
+            diff = np.abs(images[0].astype(np.int32) - images[1])
+            self.assertLessEqual(np.max(diff), 1)
+
+    def test_seed(self):
+        envs = []
+        for i in range(2):
+            content = PointToTargetContent()
+            env = Environment(content)
+            env.seed(1)
+            env.reset()
+            envs.append(env)
+
+        for i in range(20):
+            action = np.array([0.0, 0.0]) if i % 2 == 0 else np.array([0.1, 0.1])
+            obs0, reward0, done0, info0 = envs[0].step(action)
+            obs1, reward1, done1, info1 = envs[1].step(action)
+            self.assertTrue(np.array_equal(obs0['screen'], obs1['screen']))
+            self.assertEqual(reward0, reward1)
+
+        target_sprites = [env.content.target_sprite for env in envs]
+        self.assertEqual(target_sprites[0].pos_x, target_sprites[1].pos_x)
+        self.assertEqual(target_sprites[0].pos_y, target_sprites[1].pos_y)
+
+    def test_get_set_state(self):
+        content_classes = [
+            PointToTargetContent, ChangeDetectionContent, OddOneOutContent,
+            VisualSearchContent, MultipleObjectTrackingContent,
+            RandomDotMotionDiscriminationContent
+        ]
+        rng = np.random.RandomState(0)
+        actions = rng.uniform(low=-0.2, high=0.2, size=(200, 2))
+
+        for content_class in content_classes:
+            env = Environment(content_class())
+            env.seed(1)
+            env.reset()
+
+            for action in actions[:100]:
+                env.step(action)
+
+            # Snapshot should survive serialization
+            state = pickle.loads(pickle.dumps(env.get_state()))
+
+            results0 = []
+            for action in actions[100:]:
+                obs, reward, done, info = env.step(action)
+                results0.append((obs['screen'].copy(), obs['angle'], reward, info))
+
+            env.set_state(state)
+
+            for i, action in enumerate(actions[100:]):
+                obs, reward, done, info = env.step(action)
+                screen0, angle0, reward0, info0 = results0[i]
+                self.assertTrue(np.array_equal(obs['screen'], screen0))
+                self.assertEqual(obs['angle'], angle0)
+                self.assertEqual(reward, reward0)
+                self.assertEqual(info, info0)
+
         
 if __name__ == '__main__':
     unittest.main()
@@ -7,7 +7,7 @@ import unittest
 import numpy as np
 import math
 
-from oculoenv.geom import Matrix4
+from oculoenv.geom import Matrix4, rot_yx_matrices
 
 
 class TestMatrix4(unittest.TestCase):
@@ -106,6 +106,62 @@ class TestMatrix4(unittest.TestCase):
 
         self.assertTrue(np.allclose(a, a_test))
 
+    def test_invert_orthonormal(self):
+        mat0 = Matrix4()
+        mat1 = Matrix4()
+        mat0.set_rot_y(0.7)
+        mat1.set_rot_x(-0.3)
+        mat2 = mat0.mul(mat1)
+        mat2.set_trans([1.0, 2.0, 3.0])
+
+        self.check_matrix_near(mat2.invert_orthonormal(), mat2.invert())
+
+        # Result is written into the output matrix.
+        out = Matrix4()
+        self.assertIs(mat2.invert_orthonormal(out=out), out)
+        self.assertTrue(np.allclose(out.mul(mat2).m, np.identity(4), atol=1e-6))
+
+    def test_mul_out(self):
+        mat0 = Matrix4()
+        mat1 = Matrix4()
+        mat2 = Matrix4()
+        mat0.set_rot_z(1.0)
+        mat1.set_rot_z(2.0)
+        mat2.set_rot_z(3.0)
+
+        m = mat0.m
+        # Output may be the same matrix as the input.
+        self.assertIs(mat0.mul(mat1, out=mat0), mat0)
+        self.assertIs(mat0.m, m)
+        self.check_matrix_near(mat0, mat2)
+
+    def test_get_raw_gl_buffer(self):
+        mat0 = Matrix4()
+        a = mat0.get_raw_gl()
+        ptr = mat0.get_raw_gl_ptr()
+
+        # Same buffer is updated.
+        mat0.set_trans([1, 2, 3])
+        self.assertIs(mat0.get_raw_gl(), a)
+        self.assertIs(mat0.get_raw_gl_ptr(), ptr)
+        self.assertEqual(a.dtype, np.float32)
+        self.assertTrue(np.allclose(a[12:15], [1, 2, 3]))
+        self.assertTrue(np.allclose([ptr[12], ptr[13], ptr[14]], [1, 2, 3]))
+
+    def test_rot_yx_matrices(self):
+        angles_y = np.array([0.0, 0.3, -1.2])
+        angles_x = np.array([0.5, -0.2, 0.7])
+        m = rot_yx_matrices(angles_y, angles_x)
+        self.assertEqual(m.shape, (3, 3, 3))
+
+        for i in range(3):
+            mat_y = Matrix4()
+            mat_y.set_rot_y(angles_y[i])
+            mat_x = Matrix4()
+            mat_x.set_rot_x(angles_x[i])
+            mat = mat_y.mul(mat_x)
+            self.assertTrue(np.allclose(m[i], mat.m[:3, :3], atol=1e-6))
+
 
 if __name__ == '__main__':
     unittest.main()
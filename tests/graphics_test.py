@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import math
+
+from oculoenv.geom import Matrix4
+from oculoenv.graphics import ortho_matrix, perspective_matrix, model_matrix
+
+
+class TestGraphics(unittest.TestCase):
+    def test_ortho_matrix(self):
+        m = ortho_matrix(-1.0, 1.0, -1.0, 1.0, -10.0, 10.0)
+        self.assertTrue(np.allclose(m.dot([1.0, -1.0, 10.0, 1.0]), [1.0, -1.0, -1.0, 1.0]))
+        self.assertTrue(np.allclose(m.dot([0.5, 0.5, -10.0, 1.0]), [0.5, 0.5, 1.0, 1.0]))
+
+    def test_perspective_matrix(self):
+        m = perspective_matrix(90.0, 2.0, 1.0, 100.0)
+
+        # Point on the near plane at the top edge
+        v = m.dot([0.0, 1.0, -1.0, 1.0])
+        self.assertTrue(np.allclose(v[:3] / v[3], [0.0, 1.0, -1.0]))
+
+        # Point on the far plane at the right edge
+        v = m.dot([200.0, 0.0, -100.0, 1.0])
+        self.assertTrue(np.allclose(v[:3] / v[3], [1.0, 0.0, 1.0]))
+
+    def test_model_matrix(self):
+        m = model_matrix((1.0, 2.0, 3.0), 2.0, 90.0)
+        # Rotate (1, 0, 0) to (0, 1, 0), scale and translate
+        self.assertTrue(np.allclose(m.dot([1.0, 0.0, 0.0, 1.0]), [1.0, 4.0, 3.0, 1.0]))
+
+        # Same as the rotation of Matrix4
+        angle = 0.3
+        mat = Matrix4()
+        mat.set_rot_y(math.radians(angle))
+        m = model_matrix((0.0, 0.0, 0.0), 1.0, angle, rot_axis=1)
+        self.assertTrue(np.allclose(m, mat.m, atol=1e-6))
+
+        mat.set_rot_x(math.radians(angle))
+        m = model_matrix((0.0, 0.0, 0.0), 1.0, angle, rot_axis=0)
+        self.assertTrue(np.allclose(m, mat.m, atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from oculoenv.objmesh import load_obj, load_obj_cached, get_indexed_vertices, CACHE_SUFFIX
+
+OBJ_TEXT = """# comment
+mtllib mesh.mtl
+v 0.0 0.0 0.0
+v 1.0 0.0 0.0
+v 0.0 1.0 0.0
+v 0.0 0.0 1.0
+vt 0.0 0.0
+vt 1.0 0.0
+vt 0.0 1.0
+vn 0.0 0.0 1.0
+vn 1.0 0.0 0.0
+f 1/1/1 2/2/1 3/3/1
+usemtl Red
+f 1/1/2 3/3/2 4/1/2
+"""
+
+MTL_TEXT = """newmtl Red
+Kd 1.0 0.0 0.0
+"""
+
+
+class TestObjMesh(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.obj_path = os.path.join(self.temp_dir, 'mesh.obj')
+        self._write(self.obj_path, OBJ_TEXT)
+        self._write(os.path.join(self.temp_dir, 'mesh.mtl'), MTL_TEXT)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_load_obj(self):
+        verts, norms, texcs, colors = load_obj(self.obj_path)
+        self.assertEqual(verts.shape, (6, 3))
+        self.assertEqual(norms.shape, (6, 3))
+        self.assertEqual(texcs.shape, (6, 2))
+        self.assertEqual(colors.shape, (6, 3))
+
+        self.assertTrue(np.allclose(verts[4], [0.0, 1.0, 0.0]))
+        self.assertTrue(np.allclose(verts[5], [0.0, 0.0, 1.0]))
+        self.assertTrue(np.allclose(texcs[1], [1.0, 0.0]))
+        self.assertTrue(np.allclose(norms[3], [1.0, 0.0, 0.0]))
+
+        # Faces before 'usemtl' are white.
+        self.assertTrue(np.allclose(colors[:3], 1.0))
+        self.assertTrue(np.allclose(colors[3:], [1.0, 0.0, 0.0]))
+
+    def test_load_obj_mixed_format(self):
+        self._write(self.obj_path, OBJ_TEXT.replace('f 1/1/2 3/3/2 4/1/2', 'f 1//2 3//2 4//2'))
+        verts, norms, texcs, colors = load_obj(self.obj_path)
+        self.assertTrue(np.allclose(verts[5], [0.0, 0.0, 1.0]))
+        self.assertTrue(np.allclose(norms[5], [1.0, 0.0, 0.0]))
+        self.assertTrue(np.allclose(texcs[1], [1.0, 0.0]))
+        self.assertTrue(np.allclose(texcs[5], [0.0, 0.0]))
+
+    def test_get_indexed_vertices(self):
+        arrays = load_obj(self.obj_path)
+        vertices, indices = get_indexed_vertices(arrays)
+
+        # Vertex 1 and 3 are shared between the faces, but with different normals.
+        self.assertEqual(len(vertices[0]), 6)
+        for array, unique_array in zip(arrays, vertices):
+            self.assertTrue(np.array_equal(unique_array[indices], array))
+
+        # Duplicated vertices in a face
+        verts = np.array([[0, 0, 0], [1, 0, 0], [0, 0, 0]], dtype=np.float32)
+        colors = np.ones((3, 3), dtype=np.float32)
+        vertices, indices = get_indexed_vertices([verts, colors])
+        self.assertEqual(len(vertices[0]), 2)
+        self.assertEqual(indices.tolist(), [0, 1, 0])
+
+    def test_load_obj_cached(self):
+        cache_path = self.obj_path + CACHE_SUFFIX
+
+        arrays0 = load_obj_cached(self.obj_path)
+        self.assertTrue(os.path.exists(cache_path))
+
+        arrays1 = load_obj_cached(self.obj_path)
+        for array0, array1 in zip(arrays0, arrays1):
+            self.assertTrue(np.array_equal(array0, array1))
+
+        # Cache is invalidated when the .obj file is updated.
+        self._write(self.obj_path, OBJ_TEXT.replace('v 0.0 0.0 1.0', 'v 0.0 0.0 2.0'))
+        mtime = os.path.getmtime(self.obj_path) + 10.0
+        os.utime(self.obj_path, (mtime, mtime))
+        verts = load_obj_cached(self.obj_path)[0]
+        self.assertTrue(np.allclose(verts[5], [0.0, 0.0, 2.0]))
+
+    def test_load_obj_cached_broken(self):
+        cache_path = self.obj_path + CACHE_SUFFIX
+        arrays0 = load_obj_cached(self.obj_path)
+
+        # Truncated or corrupted cache falls back to parsing the .obj file.
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        for broken_data in [data[:len(data) // 2], b'', b'broken']:
+            with open(cache_path, 'wb') as f:
+                f.write(broken_data)
+            arrays1 = load_obj_cached(self.obj_path)
+            for array0, array1 in zip(arrays0, arrays1):
+                self.assertTrue(np.array_equal(array0, array1))
+
+        # Cache is rewritten without leaving temporary files.
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ['mesh.mtl', 'mesh.obj', 'mesh.obj' + CACHE_SUFFIX])
+        with open(cache_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
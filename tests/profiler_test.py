@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+
+from oculoenv.profiler import Profiler, StageStats, STAGES, GPU_STAGES, STAGE_FLIP
+
+
+class TestStageStats(unittest.TestCase):
+    def test_add(self):
+        stats = StageStats()
+        stats.add(0.0000005)  # 0.5us
+        stats.add(0.000003)   # 3us
+        stats.add(0.002)      # 2000us
+
+        d = stats.to_dict()
+        self.assertEqual(d['count'], 3)
+        self.assertAlmostEqual(d['total_ms'], 2.0035)
+        self.assertAlmostEqual(d['min_ms'], 0.0005)
+        self.assertAlmostEqual(d['max_ms'], 2.0)
+
+        histogram = d['histogram']
+        self.assertEqual(sum(histogram), 3)
+        self.assertEqual(histogram[0], 1)   # < 1us
+        self.assertEqual(histogram[2], 1)   # [2us, 4us)
+        self.assertEqual(histogram[11], 1)  # [1024us, 2048us)
+
+    def test_reset(self):
+        stats = StageStats()
+        stats.add(0.001)
+        stats.reset()
+        d = stats.to_dict()
+        self.assertEqual(d['count'], 0)
+        self.assertEqual(d['mean_ms'], 0.0)
+        self.assertEqual(sum(d['histogram']), 0)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_timed(self):
+        profiler = Profiler()
+        func = profiler.timed(STAGE_FLIP, lambda x: x + 1)
+        self.assertEqual(func(1), 2)
+        self.assertEqual(func(2), 3)
+
+        stats = profiler.get_stats()
+        self.assertEqual(sorted(stats.keys()), sorted(STAGES + GPU_STAGES))
+        self.assertEqual(stats[STAGE_FLIP]['count'], 2)
+
+        profiler.reset()
+        self.assertEqual(profiler.get_stats()[STAGE_FLIP]['count'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
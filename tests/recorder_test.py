@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from pyglet.extlibs import png
+
+from oculoenv.environment import Environment
+from oculoenv.recorder import EpisodeLog, EpisodeRecorder, EpisodeReplayer, FrameRecorder
+from oculoenv.contents.point_to_target_content import PointToTargetContent
+from oculoenv.contents.random_dot_content import RandomDotMotionDiscriminationContent
+
+
+class TestEpisodeLog(unittest.TestCase):
+    def test_append(self):
+        log = EpisodeLog(chunk_size=4)
+        for i in range(10):
+            info = {'result': 'success'} if i == 5 else {}
+            log.append([i, -i], i * 0.5, i == 9, info)
+
+        arrays = log.get_arrays()
+        self.assertEqual(arrays['actions'].shape, (10, 2))
+        self.assertTrue(np.array_equal(arrays['actions'][:, 0], np.arange(10)))
+        self.assertTrue(np.array_equal(arrays['rewards'], np.arange(10) * 0.5))
+        self.assertEqual(arrays['dones'].sum(), 1)
+        self.assertEqual(list(arrays['info_steps']), [5])
+
+
+class TestEpisodeRecorder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_and_replay(self):
+        for content_class in [PointToTargetContent, RandomDotMotionDiscriminationContent]:
+            log_dir = os.path.join(self.temp_dir, content_class.__name__)
+            env = Environment(content_class())
+            recorder = EpisodeRecorder(env, log_dir, seed=1)
+
+            screens = []
+            obs = recorder.reset()
+            screens.append(obs['screen'].copy())
+            for i in range(50):
+                action = np.random.uniform(low=-0.1, high=0.1, size=2)
+                obs, reward, done, info = recorder.step(action)
+                screens.append(obs['screen'].copy())
+            recorder.close()
+
+            replayer = EpisodeReplayer(recorder.get_episode_path(0))
+            self.assertEqual(len(replayer), 50)
+            self.assertEqual(replayer.content_name, content_class.__name__)
+
+            for i, (obs, reward, done, info) in enumerate(replayer.replay()):
+                self.assertTrue(np.array_equal(obs['screen'], screens[i]))
+
+    def test_replay_with_different_size(self):
+        env = Environment(PointToTargetContent())
+        recorder = EpisodeRecorder(env, self.temp_dir)
+        recorder.reset()
+        for i in range(10):
+            recorder.step(np.array([0.01, 0.01]))
+        recorder.close()
+
+        replayer = EpisodeReplayer(recorder.get_episode_path(0))
+        for obs, reward, done, info in replayer.replay(off_buffer_width=64):
+            self.assertEqual(obs['screen'].shape, (64, 64, 3))
+
+
+class TestFrameRecorder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_npz(self):
+        recorder = FrameRecorder(self.temp_dir, chunk_size=4, max_chunks=2)
+        frames = np.random.randint(0, 256, size=(10, 8, 8, 3)).astype(np.uint8)
+        for frame in frames:
+            recorder.add(frame)
+        recorder.close()
+
+        file_names = sorted(os.listdir(self.temp_dir))
+        self.assertEqual(len(file_names), 3)
+
+        loaded_frames = [np.load(os.path.join(self.temp_dir, file_name))['frames']
+                         for file_name in file_names]
+        self.assertTrue(np.array_equal(np.concatenate(loaded_frames), frames))
+
+    def test_png(self):
+        recorder = FrameRecorder(self.temp_dir, chunk_size=4, image_format='png')
+        frames = np.random.randint(0, 256, size=(10, 6, 8, 3)).astype(np.uint8)
+        for frame in frames:
+            recorder.add(frame)
+        recorder.close()
+
+        file_names = sorted(os.listdir(self.temp_dir))
+        self.assertEqual(len(file_names), 10)
+        self.assertEqual(file_names[-1], 'frame_00000009.png')
+
+        # Decode with a PNG reader, and compare the pixels.
+        for i in [0, 9]:
+            reader = png.Reader(filename=os.path.join(self.temp_dir, file_names[i]))
+            width, height, rows, info = reader.read()
+            self.assertEqual((width, height, info['planes']), (8, 6, 3))
+            image = np.array([np.array(row, dtype=np.uint8) for row in rows])
+            self.assertTrue(np.array_equal(image.reshape(height, width, 3), frames[i]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from oculoenv.trial_bank import TrialBank
+from oculoenv.contents.point_to_target_content import PointToTargetContent
+from oculoenv.contents.change_detection_content import ChangeDetectionContent
+from oculoenv.contents.odd_one_out_content import OddOneOutContent
+from oculoenv.contents.visual_search_content import VisualSearchContent
+from oculoenv.contents.multiple_object_tracking_content import MultipleObjectTrackingContent
+from oculoenv.contents.random_dot_content import RandomDotMotionDiscriminationContent
+
+
+class TestTrialBank(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_generate(self):
+        content_classes = [
+            PointToTargetContent, ChangeDetectionContent, OddOneOutContent,
+            VisualSearchContent, MultipleObjectTrackingContent,
+            RandomDotMotionDiscriminationContent
+        ]
+        for content_class in content_classes:
+            content = content_class()
+            bank = TrialBank.generate(content, 10)
+            self.assertEqual(len(bank), 10)
+            self.assertEqual(bank.trials.dtype, content_class.trial_dtype)
+            self.assertEqual(bank.content_name, content_class.__name__)
+
+    def test_generate_with_seed(self):
+        content = VisualSearchContent()
+        bank0 = TrialBank.generate(content, 10, seed=1)
+        bank1 = TrialBank.generate(content, 10, seed=1)
+        self.assertTrue(np.array_equal(bank0.trials, bank1.trials))
+
+    def test_generate_fixed_difficulty(self):
+        # Both size pairs of the difficulty are sampled for each trial.
+        content = PointToTargetContent(difficulty=1)
+        bank = TrialBank.generate(content, 200, seed=1)
+        widths = set(zip(bank.trials['target_width'].tolist(),
+                         bank.trials['lure_width'].tolist()))
+        self.assertEqual(widths, set([(0.2, 0.2), (0.1, 0.1)]))
+
+    def test_save_load(self):
+        content = ChangeDetectionContent()
+        bank0 = TrialBank.generate(content, 10)
+
+        file_path = os.path.join(self.temp_dir, "bank.npz")
+        bank0.save(file_path)
+        bank1 = TrialBank.load(file_path)
+
+        self.assertTrue(np.array_equal(bank0.trials, bank1.trials))
+        self.assertEqual(bank1.content_name, "ChangeDetectionContent")
+        self.assertEqual(bank1.difficulty, -1)
+
+    def test_next(self):
+        content = PointToTargetContent()
+        bank = TrialBank.generate(content, 3)
+
+        for i in range(3):
+            self.assertEqual(bank.next(), bank.trials[i])
+        # Wraps around to the first trial
+        self.assertEqual(bank.next(), bank.trials[0])
+
+    def test_consume(self):
+        content = PointToTargetContent()
+        bank = TrialBank.generate(content, 5)
+        content.set_trial_bank(bank)
+
+        # Move to target phase
+        content.step([1.0, 1.0])
+
+        trial = bank.trials[0]
+        self.assertTrue(np.array_equal([content.target_sprite.pos_x, content.target_sprite.pos_y],
+                                        trial['target_pos']))
+        self.assertTrue(np.array_equal([content.lure_sprite.pos_x, content.lure_sprite.pos_y],
+                                        trial['lure_pos']))
+        self.assertEqual(content.target_sprite.width, trial['target_width'])
+
+
+    def test_mismatched_bank(self):
+        bank = TrialBank.generate(PointToTargetContent(difficulty=0), 5)
+        self.assertEqual(bank.difficulty, 0)
+
+        # Same trial dtype, but generated with another difficulty
+        with self.assertRaises(ValueError):
+            PointToTargetContent(difficulty=2).set_trial_bank(bank)
+
+        # Same trial dtype, but generated by another content
+        class OtherContent(PointToTargetContent):
+            pass
+        with self.assertRaises(ValueError):
+            OtherContent(difficulty=0).set_trial_bank(bank)
+
+        with self.assertRaises(ValueError):
+            VisualSearchContent().set_trial_bank(bank)
+
+        content = PointToTargetContent(difficulty=0)
+        content.set_trial_bank(bank)
+        self.assertIs(content.trial_bank, bank)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from oculoenv.geom import Matrix4
+from oculoenv.warp import sample_bilinear, ContentWarper
+
+
+class TestWarp(unittest.TestCase):
+    def test_sample_bilinear(self):
+        image = np.arange(4 * 5 * 3, dtype=np.float32).reshape(4, 5, 3)
+
+        # Pixel centers
+        values = sample_bilinear(image, np.array([0.0, 4.0, 2.0]), np.array([0.0, 3.0, 1.0]))
+        self.assertTrue(np.allclose(values, [image[0, 0], image[3, 4], image[1, 2]]))
+
+        # Between pixels
+        values = sample_bilinear(image, np.array([1.5]), np.array([2.5]))
+        expected = (image[2, 1] + image[2, 2] + image[3, 1] + image[3, 2]) / 4.0
+        self.assertTrue(np.allclose(values, [expected]))
+
+        # Clamped to the edge
+        values = sample_bilinear(image, np.array([-3.0, 10.0]), np.array([1.0, 10.0]))
+        self.assertTrue(np.allclose(values, [image[1, 0], image[3, 4]]))
+
+    def test_sample_bilinear_rgba(self):
+        rng = np.random.RandomState(0)
+        image = rng.randint(0, 256, size=(8, 8, 4)).astype(np.uint8)
+        u = rng.uniform(-1.0, 8.0, size=100)
+        v = rng.uniform(-1.0, 8.0, size=100)
+
+        # Packed gather gives the same result.
+        values = sample_bilinear(image, u, v)
+        expected = sample_bilinear(image.astype(np.float32), u, v)
+        self.assertTrue(np.allclose(values, expected, atol=1e-3))
+
+    def test_warp(self):
+        warper = ContentWarper(16, 20.0, 3.0, [0.0, 0.0, 1.0])
+
+        # Looking at the center of the panel
+        x, y, valid = warper.get_plane_pos(np.identity(3))
+        self.assertTrue(np.all(valid))
+        self.assertTrue(np.allclose(x.reshape(16, 16).mean(axis=1), 0.0, atol=1e-6))
+        self.assertTrue(np.allclose(y.reshape(16, 16).mean(axis=0), 0.0, atol=1e-6))
+        # Rows are bottom first.
+        self.assertLess(y[0], y[-1])
+
+        content_image = np.zeros((8, 8, 3), dtype=np.uint8)
+        content_image[:, :] = [255, 0, 0]
+
+        # Panel fills the whole view.
+        image = warper.warp(content_image, np.identity(3))
+        self.assertTrue(np.all(image == [255, 0, 0]))
+
+        # Panel is out of the view when turned around.
+        m = Matrix4()
+        m.set_rot_y(np.pi)
+        image = warper.warp(content_image, m.m)
+        self.assertTrue(np.all(image == [0, 0, 255]))
+
+    def test_warp_layer(self):
+        # Opaque green layer on the right half of the plane
+        layer = np.zeros((8, 8, 4), dtype=np.uint8)
+        layer[:, 4:] = [0, 255, 0, 255]
+        warper = ContentWarper(16, 20.0, 3.0, [0.0, 0.0, 1.0], layer, 1.0)
+
+        content_image = np.zeros((8, 8, 3), dtype=np.uint8)
+        content_image[:, :] = [255, 0, 0]
+
+        image = warper.warp(content_image, np.identity(3)).reshape(16, 16, 3)
+        self.assertTrue(np.all(image[:, 0] == [255, 0, 0]))
+        self.assertTrue(np.all(image[:, -1] == [0, 255, 0]))
+
+    def test_warp_batch(self):
+        rng = np.random.RandomState(0)
+        layer = np.zeros((8, 8, 4), dtype=np.uint8)
+        layer[:, 6:] = [0, 255, 0, 255]
+        warper = ContentWarper(16, 50.0, 3.0, [0.0, 0.0, 1.0], layer, 1.5)
+
+        content_images = rng.randint(0, 256, size=(5, 8, 8, 4)).astype(np.uint8)
+        angles = rng.uniform(-0.5, 0.5, size=(5, 2))
+
+        expected = []
+        for content_image, angle in zip(content_images, angles):
+            m0 = Matrix4()
+            m0.set_rot_x(angle[1])
+            m1 = Matrix4()
+            m1.set_rot_y(angle[0])
+            expected.append(warper.warp(content_image, m1.mul(m0).m).copy())
+
+        for workers in [0, 2]:
+            images = warper.warp_batch(content_images, angles, chunk_size=2,
+                                       workers=workers)
+            self.assertEqual(images.shape, (5, 16, 16, 3))
+            # Rotation in float32 of Matrix4 may round a few pixels differently.
+            self.assertLessEqual(np.max(np.abs(images.astype(np.int32) - expected)), 1)
+
+        # RGB content images
+        images = warper.warp_batch(content_images[:, :, :, :3], angles)
+        self.assertLessEqual(np.max(np.abs(images.astype(np.int32) - expected)), 1)
+
+        # Non-contiguous output views are written too.
+        buffer = np.zeros((5, 16, 16, 4), dtype=np.uint8)
+        for out in [buffer[:, :, :, :3], buffer[:, :, :, 2::-1]]:
+            images = warper.warp_batch(content_images, angles, out=out)
+            self.assertIs(images, out)
+            self.assertFalse(out.flags.c_contiguous)
+            self.assertLessEqual(np.max(np.abs(out.astype(np.int32) - expected)), 1)
+        self.assertEqual(np.max(buffer[:, :, :, 3]), 0)
+
+        # Output of wrong shape or type
+        for out in [np.zeros((4, 16, 16, 3), dtype=np.uint8),
+                    np.zeros((5, 16, 16, 3), dtype=np.float32)]:
+            with self.assertRaises(ValueError):
+                warper.warp_batch(content_images, angles, out=out)
+
+
+if __name__ == '__main__':
+    unittest.main()